@@ -0,0 +1,120 @@
+"""
+Read and write the experiment and equipment files, with no window needed.
+
+@author: agent
+@date: October 2026
+@copyright: Copyright 2020, Luke Kurlandski, all rights reserved
+
+Special thanks to Daniel Stolz, Luke Kurlandski, Matthew Van Soelen, and Dr. David McGee.
+
+Read the Program Guide for detailed information about this program.
+"""
+
+import os
+
+from exceptions import FileFormatError
+from exceptions import NoFileError
+from exceptions import UnknownError
+
+#Equipment whose settings and serial files are kept in the equipment directory.
+EQUIPMENT = ('Motor', 'Shutter', 'Laser')
+
+def read_file(file_name:str):
+    """
+    Process a file containing datas separated by a '######' and '::'.
+
+    Returns:
+        items : dict : [headings, values]
+    """
+
+    try:
+        with open(file_name, 'r') as file:
+            contents = file.read().split('####################')
+    except FileNotFoundError as e:
+        message = 'The file could not be located:\n' + file_name
+        advice = ('If loading an experiment, choose another file.\nIf this'
+            ' is a file that stores equipment data, then re-enter the data'
+            ' and save. The file will be re-created')
+        raise NoFileError(message, e, advice)
+    items = {}
+    for pair in contents:
+        data = pair.split('::')
+        try:
+            items[data[0].strip('\n')] = data[1].strip('\n')
+        except IndexError:
+            break
+    return items
+
+def write_file(file_name:str, configs:dict, mode:str='w'):
+    """
+    Write to a file containing datas separated by a '########' and '::'.
+    """
+
+    try:
+        with open(file_name, mode) as file:
+            for key in configs.keys():
+                file.write(str(key) + '::\n')
+                file.write(str(configs[key]) + '\n####################\n')
+    except Exception as e:
+        message = 'Error ocured writing to a file for unknown reasons.'
+        raise UnknownError(message, e)
+
+def strip_equipment_keys(datas:dict, equipment:str):
+    """
+    Take one equipment's entries, dropping the equipment name and 'Serial'.
+
+    Returns:
+        configs : dict : ex 'Motor Serial Port' becomes 'Port'
+    """
+
+    configs = {}
+    try:
+        for key in datas.keys():
+            if not key.startswith(equipment + ' '):
+                continue
+            new_key = key.replace(equipment, '').replace('Serial', '').lstrip()
+            configs[new_key] = datas[key]
+    except Exception as e:
+        message = 'An error occurred processing the ' + equipment + ' data.'
+        raise FileFormatError(message, e)
+    return configs
+
+def read_equipment_data(equipment:str, directory:str='Equipment'):
+    """
+    Get the equipment data from equipment files.
+
+    Returns:
+        configs : dict : settings and serial configs without their prefix
+    """
+
+    settings = read_file(os.path.join(directory, equipment+' Settings.txt'))
+    serial = read_file(os.path.join(directory, equipment+' Serial.txt'))
+    try:
+        return strip_equipment_keys({**serial, **settings}, equipment)
+    except FileFormatError as e:
+        message = ('An error occurred processing data from ' + equipment +
+            ' files:\n\t' + directory + '/' + equipment + ' Settings.txt\n\t'
+                + directory + '/' + equipment + ' Serial.txt')
+        advice = 'Delete these files.'
+        raise FileFormatError(message, e.exception, advice)
+
+def motion_configs(motor:dict, shutter:dict, laser:dict):
+    """
+    Gather the equipment settings that time the commands of an experiment.
+
+    Returns:
+        configs : dict : motor settings with shutter and laser pauses
+    """
+
+    configs = dict(motor)
+    if 'Command Pause' in shutter:
+        configs['Shutter Command Pause'] = shutter['Command Pause']
+    if 'Command Pause' in laser:
+        configs['Laser Command Pause'] = laser['Command Pause']
+    if 'Transport' in shutter:
+        configs['Shutter Transport'] = shutter['Transport']
+    if 'Transport' in laser:
+        configs['Laser Transport'] = laser['Transport']
+    if 'Power Change Pause' in laser:
+        configs['Power Change Pause'] = laser['Power Change Pause']
+    return configs
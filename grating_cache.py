@@ -0,0 +1,166 @@
+"""
+Cache generated gratings so identical configurations are only built once.
+
+@author: agent
+@date: October 2026
+@copyright: Copyright 2020, Luke Kurlandski, all rights reserved
+
+Special thanks to Daniel Stolz, Luke Kurlandski, Matthew Van Soelen, and Dr. David McGee.
+
+Read the Program Guide for detailed information about this program.
+"""
+
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import numpy as np
+
+#Grating configs that change the pixels of a generated grating.
+PATTERN_KEYS = ('g_type', 'g_angle', 'y_min', 'y_max', 'period', 'reverse',
+    'ring_period', 'center_x', 'center_y', 'g_render')
+#Changed whenever generation changes the pixels that the same configs give.
+RENDER_VERSION = 4
+
+def canonical_value(value):
+    """
+    Write equal numbers one way, so an angle of 30 and of 30.0 share a key.
+    Returns:
+        value : float for any number, other values unchanged
+    """
+
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value)
+    return value
+
+class GratingCache:
+    """
+    Least recently used cache of final grating arrays within a memory budget.
+    """
+
+    def __init__(self, configs:dict=None):
+        """
+        Create an empty cache, optionally backed by a directory of .npy files.
+        """
+
+        configs = {} if configs is None else configs
+        self.max_bytes = (int(configs['Max Bytes']) if 'Max Bytes'
+            in configs else 256 * 2**20)
+        self.directory = (configs['Directory'] if 'Directory'
+            in configs else None)
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, configs:dict, profile=None, lut_digest:str=None):
+        """
+        Hash the grating configs, SLM profile and LUT that affect the pixels.
+        Returns:
+            key : str : hex digest identifying the grating
+        """
+
+        if configs['g_type'] == 'Custom':
+            #A custom grating is its file, re-read if the file changes.
+            file_path = str(configs['file_path'])
+            canonical = {
+                'g_type':'Custom',
+                'file_path':file_path,
+                'modified':(os.path.getmtime(file_path) if
+                    os.path.isfile(file_path) else None)
+            }
+        else:
+            canonical = {key:canonical_value(configs[key]) for key 
+                in PATTERN_KEYS if key in configs}
+        canonical['version'] = RENDER_VERSION
+        if profile is not None:
+            canonical['profile'] = profile.key()
+        if lut_digest is not None:
+            canonical['lut'] = lut_digest
+        text = json.dumps(canonical, sort_keys=True, default=str)
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def get(self, key:str):
+        """
+        Look up a grating in memory, then on disk.
+        Returns:
+            array : np.ndarray : read only grating array, None if not cached
+        """
+
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        file_name = self.file_name(key)
+        if file_name is not None and os.path.isfile(file_name):
+            try:
+                array = np.load(file_name)
+            except Exception:
+                array = None
+            if array is not None:
+                self.store(key, array)
+                self.hits += 1
+                return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key:str, array:np.ndarray):
+        """
+        Add a grating to the cache and the disk tier, if there is one.
+        """
+
+        self.store(key, array)
+        file_name = self.file_name(key)
+        if file_name is None:
+            return
+        #Write to a temporary file first so readers never see half a file.
+        temp_name = file_name + '.tmp'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp_name, 'wb') as file:
+                np.save(file, self.entries[key] if key in self.entries
+                    else array)
+            os.replace(temp_name, file_name)
+        except OSError:
+            #The grating stays cached in memory, only the disk copy is lost.
+            if os.path.isfile(temp_name):
+                try:
+                    os.remove(temp_name)
+                except OSError:
+                    pass
+
+    def store(self, key:str, array:np.ndarray):
+        """
+        Keep a read only copy in memory, evicting the least recently used.
+        """
+
+        if key in self.entries:
+            self.current_bytes -= self.entries.pop(key).nbytes
+        if array.nbytes > self.max_bytes:
+            return
+        array = np.array(array, copy=True)
+        array.setflags(write=False)
+        self.entries[key] = array
+        self.current_bytes += array.nbytes
+        while self.current_bytes > self.max_bytes:
+            old_key, old_array = self.entries.popitem(last=False)
+            self.current_bytes -= old_array.nbytes
+
+    def file_name(self, key:str):
+        """
+        Get the .npy file of a key in the disk tier.
+        Returns:
+            file_name : str : path of the file, None without a disk tier
+        """
+
+        if self.directory is None:
+            return None
+        return os.path.join(self.directory, key + '.npy')
+
+    def clear(self):
+        """
+        Empty the memory tier, files on disk are kept.
+        """
+
+        self.entries.clear()
+        self.current_bytes = 0
@@ -13,6 +13,10 @@ Read the Program Guide for detailed information about this program.
 from PIL import Image
 from PIL import ImageTk
 from imageprocessing import MyImage
+from imageprocessing import GRAY_16_MODES
+from grating_cache import GratingCache
+from slm_profile import SLMProfile
+import math
 import numpy as np
 
 from exceptions import InputError
@@ -21,12 +25,15 @@ from exceptions import UnknownError
 
 
 class MyGrating:
-        def __init__(self, configs: dict):
+        def __init__(self, configs: dict, cache: GratingCache=None, 
+            profile: SLMProfile=None):
             """
             Creates an grating opject that contains PIL and tkinter images.
             """
             
             self.configs = configs.copy()
+            self.cache = cache
+            self.profile = SLMProfile() if profile is None else profile
             self.max_display_x = (configs['max_display_x'] if 'max_display_x' 
                 in configs else 200)
             self.max_display_y = (configs['max_display_y'] if 'max_display_y' 
@@ -43,10 +50,13 @@ class MyGrating:
             
             return image.crop((x_margin, y_margin, x_margin + width, y_margin + height))
             
-        def generate_pattern_array(self, height_array, width_array, configs: dict):
-            grating_array = np.zeros((height_array, width_array), dtype = np.uint16)
-            
-            reverse = 0
+        def pattern_colors(self, column_index:np.ndarray, configs: dict):
+            """
+            Compute the color of every column at once from a column index vector.
+            Returns:
+                colors : np.ndarray : float color for each column index
+            """
+
             if(configs['reverse'] == 0):
                 reverse = 1
                 y_intercept = configs['y_min']
@@ -54,72 +64,325 @@ class MyGrating:
                 reverse = -1
                 y_intercept = configs['y_max']
 
-            if(configs['g_type'] == 'SawTooth'):
-                slope = (configs['y_max'] - configs['y_min'])/configs['period']
-                for i in range(width_array):                        # for creates color for each column
-                    color = slope * reverse * (i % configs['period']) + y_intercept    # Slope intercept form: y = mx + b (y = color)
-                    grating_array[:, i] = color
+            if(configs['g_type'] == 'Triangle'):
+                period = (configs['period'] / 2)
+                slope = (configs['y_max'] - configs['y_min'])/period
+                position = column_index % period
+                #A new half period starts wherever the column lands on a multiple.
+                period_counter = np.cumsum(position == 0)
+                falling = (period_counter % 2 == configs['reverse'])
+                return np.where(falling,
+                    slope * -1 * position + configs['y_max'],
+                    slope * position + configs['y_min'])
+
+            #SawTooth, and the rings of Circle, use slope intercept form y = mx + b.
+            slope = (configs['y_max'] - configs['y_min'])/configs['period']
+            return slope * reverse * (column_index % configs['period']) + y_intercept
+
+        def pattern_values(self, coordinate:np.ndarray, configs: dict):
+            """
+            Evaluate the pattern at continuous column coordinates of any shape.
+            Returns:
+                values : np.ndarray : float color at each coordinate
+            """
 
-            elif(configs['g_type'] == 'Triangle'):
-                period_counter = 0
+            if(configs['g_type'] == 'Triangle'):
                 period = (configs['period'] / 2)
                 slope = (configs['y_max'] - configs['y_min'])/period
-                for i in range(width_array):
-                    if(i % period == 0):
-                        period_counter += 1
-
-                    if(period_counter % 2 == configs['reverse']):
-                        color = slope * -1 * (i % period) + configs['y_max']
-                    else:
-                        color = slope * (i % period) + configs['y_min']
-                    grating_array[:, i] = color
+                position = coordinate % period
+                #Count half periods directly, there is no column order to follow.
+                period_counter = np.floor(coordinate / period) + 1
+                falling = (period_counter % 2 == configs['reverse'])
+                return np.where(falling,
+                    slope * -1 * position + configs['y_max'],
+                    slope * position + configs['y_min'])
+            return self.pattern_colors(coordinate, configs)
+
+        def ring_index_array(self, height_array, width_array, configs: dict, 
+            radius:int=None):
+            """
+            Find the ring of every pixel at once from a single distance field.
+            Returns:
+                ring_index : np.ndarray : ring counted in from the edge, -1 outside
+            """
+
+            #The circle may be moved off center, its radius defaults to half the height.
+            radius = height_array //2 if radius is None else radius
+            dy = (np.arange(height_array) - height_array //2)[:, np.newaxis]
+            dx = (np.arange(width_array) - width_array //2)[np.newaxis, :]
+            return self.ring_index(dy, dx, configs, radius)
+
+        def ring_index(self, dy:np.ndarray, dx:np.ndarray, configs: dict,
+            radius:int):
+            """
+            Find the ring of pixels from their offsets to the canvas center, 
+            offsets may be continuous.
+            Returns:
+                ring_index : np.ndarray : ring counted in from the edge, -1 outside
+            """
+
+            dy = dy - (configs['center_y'] if 'center_y' in configs else 0)
+            dx = dx - (configs['center_x'] if 'center_x' in configs else 0)
+            #Smallest ring radius reaching the pixel, sqrt is exact on squares.
+            ring_radius = np.ceil(np.sqrt(dx**2 + dy**2)).astype(np.int64)
+            #Rings cover [-r, r) along each axis, so the low edge reaches one further.
+            ring_radius = np.maximum(ring_radius, np.maximum(np.floor(dy) + 1, 
+                np.ceil(-dy)))
+            ring_radius = np.maximum(ring_radius, np.maximum(np.floor(dx) + 1, 
+                np.ceil(-dx)))
+            ring_radius = np.maximum(ring_radius, 1).astype(np.int64)
+            ring_index = radius - ring_radius
+            ring_index[ring_index < 0] = -1
+            return ring_index
+
+        def ring_colors(self, configs: dict, radius:int):
+            """
+            Compute the color of every ring of a Circle grating.
+            Returns:
+                colors : np.ndarray : float color for each ring index
+            """
+
+            #Rings use the sawtooth formula with their own concentric period.
+            ring_configs = configs.copy()
+            ring_configs['period'] = (configs['ring_period'] if 'ring_period'
+                in configs else configs['period'])
+            return self.pattern_colors(np.arange(radius), ring_configs)
+
+        def generate_pattern_array(self, height_array, width_array, configs: dict):
+            grating_array = np.zeros((height_array, width_array), dtype = np.uint16)
+            colors = self.pattern_colors(np.arange(width_array), configs)
+
+            if(configs['g_type'] == 'SawTooth' or configs['g_type'] == 'Triangle'):
+                #Every row is the same, so broadcast the colors down the columns.
+                grating_array[:, :] = colors.astype(np.uint16)
             
             elif(configs['g_type'] == 'Circle'):
-                cx, cy = width_array //2, height_array //2 # The center of circle
-                radius = cy
-                slope = (configs['y_max'] - configs['y_min'])/configs['period']
-                for i in range(width_array):
-                    color = slope * reverse * (i % configs['period']) + y_intercept
-                    x, y = np.ogrid[-radius: radius, -radius: radius]
-                    index = x**2 + y**2 <= radius**2
-                    grating_array[cy-radius:cy+radius, cx-radius:cx+radius][index] = color
-                    radius -= 1
-                
-                    
+                self.fill_circle(grating_array, configs, height_array //2)
+
+            return grating_array
+
+        def fill_circle(self, grating_array:np.ndarray, configs: dict, radius:int):
+            """
+            Color the rings of a Circle grating into an array.
+            """
+
+            height_array, width_array = grating_array.shape
+            ring_index = self.ring_index_array(height_array, width_array, configs,
+                radius)
+            ring_colors = self.ring_colors(configs, radius).astype(grating_array.dtype)
+            inside = ring_index >= 0
+            grating_array[inside] = np.take(ring_colors, ring_index[inside])
+
+        def rotated_coordinates(self, canvas:int, angle:float):
+            """
+            Find where the center of every SLM pixel lies on the unrotated 
+            pattern, rotating counterclockwise about the center of the canvas.
+            Returns:
+                rows : np.ndarray : continuous canvas row of each SLM pixel
+                columns : np.ndarray : continuous canvas column of each SLM pixel
+            """
+
+            width = self.profile.width
+            height = self.profile.height
+            center = canvas / 2
+            #Offsets of the pixel centers from the canvas center.
+            x = (np.arange(width) + (canvas - width) //2 + .5 - center)[np.newaxis, :]
+            y = (np.arange(height) + (canvas - height) //2 + .5 - center)[:, np.newaxis]
+            angle = math.radians(angle % 360.0)
+            cos = round(math.cos(angle), 15)
+            sin = round(math.sin(angle), 15)
+            #Pixel centers are whole numbers, as canvas columns were.
+            columns = x * cos - y * sin + center - .5
+            rows = x * sin + y * cos + center - .5
+            return rows, columns
+
+        def canvas_coordinates(self, canvas:int, angle:float):
+            """
+            Find the canvas pixel that PIL's nearest neighbour rotate and the 
+            center crop would show at every SLM pixel, without drawing the canvas.
+            Returns:
+                rows : np.ndarray : canvas row of each SLM pixel
+                columns : np.ndarray : canvas column of each SLM pixel
+            """
+
+            width = self.profile.width
+            height = self.profile.height
+            #Fixed point sums stay within int32 unless the SLM is very large.
+            dtype = np.int32 if canvas * 65536 * 4 < 2**31 else np.int64
+            #Rows and columns broadcast against each other, [height, 1] and [1, width].
+            x = (np.arange(width, dtype=dtype) + (canvas - width) //2)[np.newaxis, :]
+            y = (np.arange(height, dtype=dtype) + (canvas - height) //2)[:, np.newaxis]
+            angle = angle % 360.0
+            #PIL copies or transposes the square canvas for quarter turns.
+            if angle == 0:
+                return y, x
+            if angle == 90:
+                return x, canvas - 1 - y
+            if angle == 180:
+                return canvas - 1 - y, canvas - 1 - x
+            if angle == 270:
+                return canvas - 1 - x, y
+            #Otherwise PIL walks its inverse affine matrix in 16.16 fixed point.
+            theta = -math.radians(angle)
+            cos = round(math.cos(theta), 15)
+            sin = round(math.sin(theta), 15)
+            center = canvas / 2
+            c = cos * -center + sin * -center + center
+            f = -sin * -center + cos * -center + center
+            fixed = lambda v: math.floor(v * 65536.0 + .5)
+            columns = ((fixed(c + cos * .5 + sin * .5) + y * fixed(sin)) 
+                + x * fixed(cos))
+            rows = (fixed(f - sin * .5 + cos * .5) + y * fixed(cos)) + x * fixed(-sin)
+            return rows >> 16, columns >> 16
+
+        def level_table(self, colors:np.ndarray):
+            """
+            Convert float colors to levels as the canvas did, truncating to 
+            uint16 and then clipping to the SLM.
+            Returns:
+                levels : np.ndarray : levels in the SLM's dtype
+            """
+
+            levels = np.maximum(colors, 0).astype(np.uint16)
+            return np.minimum(levels, self.profile.max_level).astype(
+                self.profile.dtype)
+
+        def generate_rotated_array(self, configs: dict):
+            """
+            Evaluate the rotated pattern at every SLM pixel, at the size and 
+            depth of the SLM. Fractional angles are continuous, not stepped.
+            Returns:
+                grating_array : np.ndarray : grating allocated by the SLM profile
+            """
+
+            width = self.profile.width
+            height = self.profile.height
+            #The pattern keeps the phase origin of the canvas it was drawn on.
+            canvas = int(np.ceil( np.sqrt(pow(width, 2) + pow(height, 2))))
+            rows, columns = self.rotated_coordinates(canvas, configs['g_angle'])
+            grating_array = self.profile.allocate()
+            if(configs['g_type'] == 'Circle'):
+                index = self.ring_index(rows - canvas //2, columns - canvas //2,
+                    configs, canvas //2)
+                levels = self.level_table(self.ring_colors(configs, canvas //2))
+                #Index -1, outside a circle, picks the 0 appended after the levels.
+                levels = np.append(levels, 0).astype(levels.dtype)
+                grating_array[:, :] = np.take(levels, index)
+            else:
+                grating_array[:, :] = self.level_table(self.pattern_values(
+                    columns, configs))
+            return grating_array
+
+        def generate_canvas_array(self, configs: dict):
+            """
+            Look up the rotated pattern exactly as the old canvas showed it, 
+            drawn oversized, rotated nearest neighbour by PIL and center cropped.
+            Returns:
+                grating_array : np.ndarray : grating allocated by the SLM profile
+            """
+
+            width = self.profile.width
+            height = self.profile.height
+            #Canvas the pattern was drawn on before, looked up instead of drawn.
+            canvas = int(np.ceil( np.sqrt(pow(width, 2) + pow(height, 2))))
+            rows, columns = self.canvas_coordinates(canvas, configs['g_angle'])
+            if(configs['g_type'] == 'Circle'):
+                index = self.ring_index(rows - canvas //2, columns - canvas //2,
+                    configs, canvas //2)
+                levels = self.level_table(self.ring_colors(configs, canvas //2))
+            else:
+                index = columns
+                levels = self.level_table(self.pattern_colors(np.arange(canvas),
+                    configs))
+            #Index -1, outside a circle, picks the 0 appended after the levels.
+            levels = np.append(levels, 0).astype(levels.dtype)
+            grating_array = self.profile.allocate()
+            #Coordinates are linear in x and y, so the corners bound them.
+            corners = [(array[0, 0], array[0, -1], array[-1, 0], array[-1, -1]) 
+                for array in np.broadcast_arrays(rows, columns)]
+            if min(min(corners[0]), min(corners[1])) >= 0 and max(
+                max(corners[0]), max(corners[1])) < canvas:
+                grating_array[:, :] = np.take(levels, index)
+            else:
+                #Pixels rotated in from beyond the canvas are left at 0.
+                rows, columns, index = np.broadcast_arrays(rows, columns, index)
+                inside = ((rows >= 0) & (rows < canvas) & (columns >= 0) 
+                    & (columns < canvas))
+                grating_array[inside] = levels[index[inside]]
             return grating_array
 
         def create_grating_image(self, configs: dict):
             '''
-
+            Create the calibrated grating image, reusing cached gratings.
             '''
-            width = 1920
-            height = 1152
 
-            width_array = int(np.ceil( np.sqrt(pow(width, 2) + pow(height, 2))))
-            height_array = width_array
+            #Look for the calibrated grating, then for the raw pattern.
+            calibrated = None
+            raw = None
+            cacheable = True
+            if self.cache is not None:
+                raw_key = self.cache.make_key(configs, self.profile)
+                calibrated_key = self.cache.make_key(configs, self.profile,
+                    self.profile.lut_digest)
+                calibrated = self.cache.get(calibrated_key)
+                if calibrated is None and calibrated_key != raw_key:
+                    raw = self.cache.get(raw_key)
+            if calibrated is None:
+                #Switching LUTs only re-runs the lookup, not the generation.
+                if raw is None:
+                    raw_image, cacheable = self.render_grating_image(configs)
+                    raw = np.asarray(raw_image)
+                    if self.cache is not None and cacheable:
+                        self.cache.put(raw_key, raw)
+                calibrated = self.profile.apply_lut(raw)
+                if (self.cache is not None and cacheable 
+                    and calibrated_key != raw_key):
+                    self.cache.put(calibrated_key, calibrated)
+            self.grating_image = Image.fromarray(np.ascontiguousarray(calibrated))
+            
+            display_image = self.display_image()
+            self.grating_tk = ImageTk.PhotoImage(display_image)
+            self.grating_preview_tk = self.get_grating_preview(display_image)
+
+        def display_image(self):
+            """
+            Get the grating in a mode tkinter can show.
+            Returns:
+                image : Image.Image : the grating, re-encoded if above 8 bits
+            """
+
+            if self.grating_image.mode == 'I;16':
+                return self.profile.display_image(np.asarray(self.grating_image))
+            return self.grating_image
+
+
+        def render_grating_image(self, configs: dict):
+            '''
+            Generate the grating image from its configs or file.
+            Returns:
+                grating_image : Image.Image : grating cropped to the SLM
+                cacheable : bool : False if a placeholder had to be used
+            '''
             
             if configs['g_type'] == 'Custom':
                 try:
-                    self.grating_image = Image.open(self.file_path)
+                    grating_image = Image.open(self.file_path)
+                    #Palette and color files are stored as their gray levels.
+                    if grating_image.mode not in ('L',) + GRAY_16_MODES:
+                        grating_image = grating_image.convert('L')
                 except:
-                    temp = np.zeros((height_array, width_array), dtype = np.uint16)
-                    self.grating_image = Image.fromarray(temp)
-                    self.grating_image = self.grating_image.convert('L')
-                    self.grating_image = self.center_crop(self.grating_image, width_array, height_array, width, height)
+                    grating_image = self.profile.to_image(self.profile.allocate())
                     print("Bad grating file path-%s"%self.file_path)
+                    return grating_image, False
+            elif 'g_render' in configs and configs['g_render'] == 'Canvas':
+                #Legacy output, byte for byte, of the rotated and cropped canvas.
+                self.g_array = self.generate_canvas_array(configs)
+                grating_image = self.profile.to_image(self.g_array)
             else:
-                
-                self.g_array = self.generate_pattern_array(height_array, width_array, configs)
-            
-                self.grating_image = Image.fromarray(self.g_array)
-            
-                self.grating_image = self.grating_image.convert('L')
-                self.grating_image = self.grating_image.rotate(configs['g_angle'])
-                self.grating_image = self.center_crop(self.grating_image, width_array, height_array, width, height)
+                self.g_array = self.generate_rotated_array(configs)
+                grating_image = self.profile.to_image(self.g_array)
             
-            self.grating_tk = ImageTk.PhotoImage(self.grating_image)
-            self.grating_preview_tk = self.get_grating_preview(self.grating_image)
-
+            return grating_image, True
 
         def get_grating_preview(self, image:Image.Image):
             """
@@ -190,12 +453,75 @@ class MyGrating:
             if self.configs['g_type'] == 'Custom':
                 name = "%s %s" %(self.configs['g_type'], self.configs['grating_name'])
             else:
-                name = "%s %d" %(self.configs['g_type'], self.configs['g_angle'])
+                name = "%s %g" %(self.configs['g_type'], self.configs['g_angle'])
             return name
     
         def __str__ (self):
             if self.configs['g_type'] == 'Custom':
                 name = "%s %s" %(self.configs['g_type'], self.configs['grating_name'])
             else:
-                name = "%s %d" %(self.configs['g_type'], self.configs['g_angle'])
-            return name
\ No newline at end of file
+                name = "%s %g" %(self.configs['g_type'], self.configs['g_angle'])
+            return name
+def read_grating_configs(values:dict, configs:dict):
+    """
+    Check the grating entries typed by the user and store them in configs.
+    Returns:
+        configs : dict : the same configs, updated from the entries
+    """
+
+    #Grating Type
+    val = str(values['g_type']).strip()
+    configs['g_type'] = val if val != '' else 'SawTooth'
+    if configs['g_type'] == 'Custom':
+        configs['max_display_x'] = 1920
+        configs['max_display_y'] = 1152
+        configs['grating_name'] = values['grating_name']
+        configs['file_path'] = values['file_path']
+        return configs
+    #Rotation Angle, fractions of a degree are allowed.
+    configs['g_angle'] = read_number(values['g_angle'], 0.0,
+        'Rotation angle must be a number', False, float)
+    if not math.isfinite(configs['g_angle']):
+        raise InputError('Rotation angle must be a number')
+    #Ymin and Ymax
+    configs['y_min'] = read_number(values['y_min'], 0, 'Y min must be an int')
+    configs['y_max'] = read_number(values['y_max'], 0, 'Y max must be an int')
+    #Period
+    configs['period'] = read_number(values['period'], 100,
+        'Period width (pixels) must be an int greater than 0', True)
+    configs['reverse'] = values['reverse']
+    #Circle ring period, defaults to the period width.
+    configs['ring_period'] = read_number(values['ring_period'],
+        configs['period'], 'Ring period (pixels) must be an int greater than 0',
+            True)
+    #Circle center offset from the middle of the SLM, in pixels.
+    try:
+        val = str(values['center']).strip()
+        if val != '':
+            x, y = val.strip('()').split(',')
+            configs['center_x'] = int(x)
+            configs['center_y'] = int(y)
+        else:
+            configs['center_x'] = 0
+            configs['center_y'] = 0
+    except ValueError as e:
+        message = 'Center offset must be two ints: (x,y)'
+        raise InputError(message, e)
+    return configs
+
+def read_number(val:str, default, message:str, positive:bool=False, 
+    kind:type=int):
+    """
+    Convert one entry to an int, or a float, an empty entry takes the default.
+    Returns:
+        number : int or float : the entry's value
+    """
+
+    try:
+        val = str(val).strip()
+        number = kind(val) if val != '' else default
+    except ValueError as e:
+        raise InputError(message, e)
+    if positive and number <= 0:
+        raise InputError(message)
+    return number
@@ -0,0 +1,402 @@
+"""
+Prepare experiments from their files without a window, from the command line.
+
+@author: agent
+@date: October 2026
+@copyright: Copyright 2020, Luke Kurlandski, all rights reserved
+
+Special thanks to Daniel Stolz, Luke Kurlandski, Matthew Van Soelen, and Dr. David McGee.
+
+Read the Program Guide for detailed information about this program.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import csv
+import glob
+import multiprocessing
+import ntpath
+import os
+import sys
+import numpy as np
+
+import experimentfile
+import mappings
+from exceptions import MyError
+from exceptions import InputError
+from exceptions import MissingDataError
+from exceptions import NoFileError
+from imageprocessing import MyImage
+from motionplanning import MotionModel
+from motionplanning import ExposurePlan
+from motionplanning import SCAN_STRATEGIES
+
+class HeadlessExperiment:
+    """
+    Single image experiment read from its file, processed like SingleImage.
+    """
+
+    def __init__(self, configs:dict):
+        """
+        Create an experiment from the file in configs, nothing is read yet.
+        """
+
+        if 'File Experiment' not in configs:
+            message = 'There was no experiment file given.'
+            raise MissingDataError(message)
+        self.file_experiment = configs['File Experiment']
+        self.equipment_directory = (configs['Equipment Directory'] if
+            'Equipment Directory' in configs else 'Equipment')
+        #Images are looked for here too, files often hold another PC's paths.
+        self.image_directory = (configs['Image Directory'] if
+            'Image Directory' in configs else None)
+        #Overrides the experiment's own strategy, if given.
+        self.scan_override = (configs['Scan Strategy'] if 'Scan Strategy'
+            in configs else None)
+        self.budget = float(configs['Budget']) if 'Budget' in configs else 10
+
+    def run(self):
+        """
+        Read the experiment and equipment, then map, plan and estimate.
+        Returns:
+            summary : dict : see summary
+        """
+
+        self.read_experiment()
+        self.collect_raw_data()
+        self.read_equipment()
+        self.modify_and_map()
+        self.run_time()
+        return self.summary()
+
+    def read_experiment(self):
+        """
+        Read the experiment file.
+        """
+
+        self.datas = experimentfile.read_file(self.file_experiment)
+
+    def collect_raw_data(self):
+        """
+        Pull raw data from the experiment file and save in variables.
+        """
+
+        datas = self.datas
+        if 'Image File' not in datas:
+            message = ('The experiment has no single image:\n\t'
+                + self.file_experiment)
+            advice = 'Only single image experiments can be run headless.'
+            raise MissingDataError(message, None, advice)
+        self.image = MyImage({'file_image':self.find_image(datas['Image File']),
+            'name_image':ntpath.basename(datas['Image File'])})
+        #Hologram width and height.
+        try:
+            self.hologram_width = float(datas['Hologram Width'].strip())
+            self.hologram_height = float(datas['Hologram Height'].strip())
+        except (KeyError, ValueError) as e:
+            message = 'Hologram width and height must be floating points.'
+            raise InputError(message, e)
+        #Spot size
+        try:
+            val = datas['Spot Size'].strip() if 'Spot Size' in datas else ''
+            self.spot_size = float(val) if val != '' else -1
+        except ValueError as e:
+            message = 'Spot size must be a floating point.'
+            raise InputError(message, e)
+        #Pixels horizontal and vertical, the image's own size by default.
+        try:
+            val = (datas['Pixels Horizontal'].strip() if 'Pixels Horizontal'
+                in datas else '')
+            self.pixels_x = int(val) if val != '' else self.image.original_PIL.width
+            val = (datas['Pixels Vertical'].strip() if 'Pixels Vertical'
+                in datas else '')
+            self.pixels_y = int(val) if val != '' else self.image.original_PIL.height
+        except ValueError as e:
+            message = 'Horizontal and Vertical Pixels must be ints.'
+            raise InputError(message, e)
+        self.cropping = datas['Cropping'].strip() if 'Cropping' in datas else ''
+        self.scan_strategy = (datas['Scan Strategy'].strip() if 'Scan Strategy'
+            in datas else 'Raster')
+        if self.scan_override is not None:
+            self.scan_strategy = self.scan_override
+        if self.scan_strategy not in SCAN_STRATEGIES:
+            message = 'Unknown scan strategy: ' + self.scan_strategy
+            raise InputError(message)
+        self.strings_exposure = (datas['Strings Exposure'].strip() if
+            'Strings Exposure' in datas else '')
+        self.strings_ignore = (datas['Strings Ignore'].strip() if
+            'Strings Ignore' in datas else '')
+        self.strings_laser = (datas['Strings Laser'].strip() if
+            'Strings Laser' in datas else '')
+
+    def find_image(self, file_image:str):
+        """
+        Find the image, as written or by name in the image directory.
+        Returns:
+            file_image : str : path to open
+        """
+
+        if os.path.exists(file_image) or self.image_directory is None:
+            return file_image
+        return os.path.join(self.image_directory, ntpath.basename(file_image))
+
+    def read_equipment(self):
+        """
+        Get the equipment data, from the experiment if it was consolidated.
+        """
+
+        configs = {}
+        for equipment in experimentfile.EQUIPMENT:
+            configs[equipment] = experimentfile.strip_equipment_keys(
+                self.datas, equipment)
+            if len(configs[equipment]) == 0:
+                configs[equipment] = experimentfile.read_equipment_data(
+                    equipment, self.equipment_directory)
+        self.equipment_configs_motor = configs['Motor']
+        self.equipment_configs_shutter = configs['Shutter']
+        self.equipment_configs_laser = configs['Laser']
+
+    def modify_and_map(self):
+        """
+        Process the data by modifying images, creating mappings, delta x, y.
+        """
+
+        #Modify the image.
+        self.image.reset_transforms()
+        self.image.add_grayscale()
+        self.image.add_resize((self.pixels_x, self.pixels_y))
+        self.image.add_crop(self.cropping)
+        self.image.apply_transforms()
+        #Process other data into mappings of pixel values and delta distances.
+        gradient_range = mappings.gradient_range(self.image.array_view())
+        configs_timing = {
+            'Input Exposure':self.strings_exposure,
+            'Input Ignore':self.strings_ignore,
+            'Gradient Range':gradient_range
+        }
+        configs_laser = {
+            'Input Laser':self.strings_laser,
+            'Gradient Range':gradient_range
+        }
+        self.map_timing = mappings.map_timing(configs_timing)
+        self.map_laser_power = mappings.map_laser_power(configs_laser)
+        self.delta_x = self.hologram_width / self.pixels_x
+        self.delta_y = self.hologram_height / self.pixels_y
+        #Moves are costed with the equipment settings.
+        self.model = MotionModel(experimentfile.motion_configs(
+            self.equipment_configs_motor, self.equipment_configs_shutter,
+            self.equipment_configs_laser))
+        self.plan = ExposurePlan.compile(self.image.array_view(),
+            self.map_timing, self.map_laser_power, self.delta_x,
+            self.delta_y).ordered(self.scan_strategy, self.model, self.budget)
+        self.dpi = self.image.modified_PIL.width / (39.37 * self.hologram_width)
+
+    def run_time(self):
+        """
+        Estimate the runtime with the motion model.
+        """
+
+        self.estimate = self.plan.estimate(self.model)
+
+    def summary(self):
+        """
+        Describe the processed experiment in one row.
+        Returns:
+            summary : dict : file, sizes, exposures, dpi, strategy and seconds
+        """
+
+        travel_x, travel_y = self.plan.travel()
+        return {
+            'File':self.file_experiment,
+            'Image':self.image.file_image,
+            'Width (px)':self.image.modified_PIL.width,
+            'Height (px)':self.image.modified_PIL.height,
+            'Exposed Pixels':len(self.plan),
+            'dpi':int(self.dpi),
+            'Scan Strategy':self.plan.strategy,
+            'Travel (mm)':round(travel_x + travel_y, 3),
+            'Exposure (s)':round(self.estimate['Exposure'], 3),
+            'Estimate (s)':round(self.estimate['Total'], 3)
+        }
+
+    def save(self, directory:str):
+        """
+        Write the modified image, mappings and plan next to each other.
+        Returns:
+            files : list : the files written
+        """
+
+        name = os.path.splitext(os.path.basename(self.file_experiment))[0]
+        base = os.path.join(directory, name)
+        files = [base + ' Modified.png', base + ' Mappings.csv', base + ' Plan.npz']
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self.image.modified_PIL.save(files[0])
+            levels = np.arange(len(self.map_timing))
+            np.savetxt(files[1], np.column_stack((levels, self.map_timing,
+                self.map_laser_power)), delimiter=',', fmt='%g',
+                header='Level,Exposure Time (s),Laser Power (mW)', comments='')
+        except OSError as e:
+            message = 'The outputs could not be written to:\n\t' + directory
+            raise NoFileError(message, e)
+        self.plan.save(files[2])
+        return files
+
+def describe_error(e:Exception):
+    """
+    Put an error's message and advice on one line, an unexpected error is
+    named by its type.
+    Returns:
+        text : str : message, then advice if any
+    """
+
+    if not isinstance(e, MyError):
+        return (type(e).__name__ + ': ' + str(e)).replace('\n', ' ').replace(
+            '\t', '')
+    text = str(e.message).replace('\n', ' ').replace('\t', '')
+    if e.advice is not None:
+        text += ' ' + str(e.advice).replace('\n', ' ')
+    return text
+
+def prepare_file(configs:dict):
+    """
+    Prepare one experiment, in a worker process when run as a batch.
+    Returns:
+        summary : dict : see HeadlessExperiment.summary, or the file's Error
+    """
+
+    try:
+        experiment = HeadlessExperiment(configs)
+        summary = experiment.run()
+        if 'Output Directory' in configs and configs['Output Directory'] is not None:
+            experiment.save(configs['Output Directory'])
+    except Exception as e:
+        #One bad file, whatever went wrong, must not stop the batch.
+        return {'File':configs['File Experiment'], 'Error':describe_error(e)}
+    return summary
+
+def find_experiments(paths:list):
+    """
+    Expand directories into the experiment files they hold.
+    Returns:
+        files : list : experiment files, sorted within each directory
+    """
+
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, '*.txt')))
+        else:
+            files.append(path)
+    return files
+
+def prepare_batch(configs_list:list, jobs:int=None, tasks_per_child:int=4):
+    """
+    Prepare many experiments in a pool of processes, from Python 3.11 each
+    worker is replaced after a few experiments so its memory stays bounded.
+    Returns:
+        summaries : list : one summary per experiment, in the given order
+    """
+
+    jobs = os.cpu_count() if jobs is None else jobs
+    jobs = max(1, min(jobs, len(configs_list)))
+    if jobs == 1:
+        return [prepare_file(configs) for configs in configs_list]
+    #Workers are spawned, replacing forked ones is not supported.
+    options = {'max_workers':jobs, 
+        'mp_context':multiprocessing.get_context('spawn')}
+    #Workers can only be replaced from Python 3.11, before that they live on.
+    if sys.version_info >= (3, 11):
+        options['max_tasks_per_child'] = tasks_per_child
+    with ProcessPoolExecutor(**options) as executor:
+        return list(executor.map(prepare_file, configs_list))
+
+def write_summary(file_name:str, summaries:list):
+    """
+    Write the summaries as a CSV table, one row per experiment.
+    """
+
+    columns = []
+    for summary in summaries:
+        columns += [key for key in summary.keys() if key not in columns]
+    try:
+        with open(file_name, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(summaries)
+    except OSError as e:
+        message = 'The summary could not be written to:\n\t' + file_name
+        raise NoFileError(message, e)
+
+def parse_arguments(argv:list=None):
+    """
+    Read the command line.
+    Returns:
+        arguments : argparse.Namespace : parsed arguments
+    """
+
+    parser = argparse.ArgumentParser(description='Prepare single image '
+        'experiments without a window: modified image, mappings, plan and '
+        'run time estimate.')
+    parser.add_argument('experiments', nargs='+',
+        help='experiment files as saved by the Hologram Creator, or '
+            'directories of them')
+    parser.add_argument('--output', default=None,
+        help='directory for the modified image, mappings and plan')
+    parser.add_argument('--strategy', choices=list(SCAN_STRATEGIES.keys()),
+        default=None, help="scan strategy instead of the experiment's own")
+    parser.add_argument('--equipment', default='Equipment',
+        help='equipment directory, used when an experiment has no settings')
+    parser.add_argument('--images', default=None,
+        help='directory to find images in when their path does not exist')
+    parser.add_argument('--budget', type=float, default=10,
+        help='seconds the path optimized strategy may search')
+    parser.add_argument('--jobs', type=int, default=0,
+        help='experiments prepared at once, one per core by default')
+    parser.add_argument('--tasks-per-worker', type=int, default=4,
+        help='experiments a worker prepares before it is replaced')
+    parser.add_argument('--summary', default=None,
+        help='CSV file for the table of run times, exposures and dpi')
+    return parser.parse_args(argv)
+
+def main(argv:list=None):
+    """
+    Prepare every experiment given on the command line and print a summary.
+    Returns:
+        status : int : 0 if every experiment was prepared, 1 otherwise
+    """
+
+    arguments = parse_arguments(argv)
+    configs_list = []
+    for file_experiment in find_experiments(arguments.experiments):
+        configs = {
+            'File Experiment':file_experiment,
+            'Equipment Directory':arguments.equipment,
+            'Image Directory':arguments.images,
+            'Output Directory':arguments.output,
+            'Budget':arguments.budget
+        }
+        if arguments.strategy is not None:
+            configs['Scan Strategy'] = arguments.strategy
+        configs_list.append(configs)
+    summaries = prepare_batch(configs_list, 
+        None if arguments.jobs == 0 else arguments.jobs, 
+        arguments.tasks_per_worker)
+    status = 0
+    for summary in summaries:
+        if 'Error' in summary:
+            print(summary['File'] + ': ' + summary['Error'], file=sys.stderr)
+            status = 1
+        else:
+            print(', '.join(key + ': ' + str(value) for key, value 
+                in summary.items()))
+    if arguments.summary is not None:
+        try:
+            write_summary(arguments.summary, summaries)
+        except NoFileError as e:
+            print(describe_error(e), file=sys.stderr)
+            status = 1
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
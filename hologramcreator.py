@@ -20,7 +20,20 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from pandas import DataFrame
 
 from app import App
+import experimentfile
+import mappings
 from imageprocessing import MyImage
+from slm_profile import SLMProfile
+from slm_profile import DISPLAY_ENCODINGS
+from motionplanning import MotionModel
+from serialcontrol import TRANSPORTS
+from serialcontrol import MOTOR_TRANSPORTS
+from serialcontrol import INTERPOLATIONS
+from serialsimulator import SIMULATED_PORT
+from motionplanning import ExposurePlan
+from motionplanning import SCAN_STRATEGIES
+from exceptions import InputError
+from exceptions import FileFormatError
 from exceptions import NoFileError
 from exceptions import UnknownError
 
@@ -88,6 +101,32 @@ class HologramCreator(App):
         tk.Label(frame, text='Cropping (opt)').pack()
         self.entry_crop = tk.Entry(frame, width = 15)
         self.entry_crop.pack()
+        #Preview the resize and crop while they are typed.
+        for entry in (self.entry_pixel_x, self.entry_pixel_y, self.entry_crop):
+            entry.bind('<KeyRelease>', self.preview_transforms)
+
+    def preview_transforms(self, event=None):
+        """
+        Show a low resolution preview of the typed resize and crop.
+        """
+
+        image = getattr(self, 'image', None)
+        if image is None:
+            return
+        #Half typed inputs keep the last good preview.
+        try:
+            val = self.entry_pixel_x.get().strip()
+            pixels_x = int(val) if val != '' else image.original_PIL.width
+            val = self.entry_pixel_y.get().strip()
+            pixels_y = int(val) if val != '' else image.original_PIL.height
+            image.reset_transforms()
+            image.add_grayscale()
+            image.add_resize((pixels_x, pixels_y))
+            image.add_crop(self.entry_crop.get().strip())
+            preview = image.preview_tkinter()
+        except (ValueError, InputError):
+            return
+        self.label_imagemod.configure(image=preview)
 
     def setup_initialize_experiment(self, frame:tk.Frame):
         """
@@ -95,11 +134,17 @@ class HologramCreator(App):
         """
 
         tk.Label(frame, text='Initialize Experiment', font="bold").pack()
+        tk.Label(frame, text='Scan Strategy').pack()
+        self.scan_var = tk.StringVar(frame)
+        self.scan_var.set('Raster')
+        tk.OptionMenu(frame, self.scan_var, *SCAN_STRATEGIES.keys()).pack()
         self.button_update = tk.Button(frame, text='Process and Save', 
             command=self.prepare_for_experiment)
         self.button_update.pack()
         self.label_dpi = tk.Label(frame, text='Image Resolution (dpi)')
         self.label_dpi.pack()
+        self.label_travel = tk.Label(frame, text='Travel Saved (mm)')
+        self.label_travel.pack()
         self.button_run = tk.Button(frame, text = 'Run Experiment', 
             command=self.run_experiment)
         self.button_run.pack()
@@ -157,9 +202,17 @@ class HologramCreator(App):
 
         self.g_reverse = tk.IntVar()
         tk.Checkbutton(frame, text = 'Reverse Grating', variable = self.g_reverse).grid(row=5, column=1)
+
+        tk.Label(frame, text='Ring Period (Circle)', font='bold').grid(row=6, column=0)
+        self.entry_ring_period = tk.Entry(frame, width = 15)
+        self.entry_ring_period.grid(row=7, column = 0)
+
+        tk.Label(frame, text='Center Offset (x,y)', font='bold').grid(row=6, column=1)
+        self.entry_center = tk.Entry(frame, width = 15)
+        self.entry_center.grid(row=7, column = 1)
         
         selection_frame = tk.Frame(frame, borderwidth=2, relief=tk.SOLID, pady=4)
-        selection_frame.grid(row=6, column=0, columnspan=2)
+        selection_frame.grid(row=8, column=0, columnspan=2)
         tk.Label(selection_frame, text='Grating Selection', font='bold').grid(row=0, column=0)
         self.button_image = tk.Button(selection_frame, text='Select a Grating', 
             command=self.grating_select)
@@ -232,6 +285,11 @@ class HologramCreator(App):
         self.text_grating_color = super().text_apply_scrollbars(self.root, text_configs)
         self.text_grating_color.configure(width=20, height=10)
         self.text_grating_color.grid(row=1, column=0)
+        tk.Label(sub_frame, text='Grating Tiling').grid(row=3, column=0)
+        self.tiling_var = tk.StringVar(sub_frame)
+        self.tiling_var.set('Color')
+        tk.OptionMenu(sub_frame, self.tiling_var, *mappings.TILINGS).grid(row=4, 
+            column=0)
         
     def setup_image_array(self, frame:tk.Frame):
         """
@@ -287,129 +345,40 @@ class HologramCreator(App):
             data : list[float]
         """
 
-        #Data from arguments.
-        gradient_range = (configs['Gradient Range'] if 'Gradient Range' 
-            in configs else 256)   
-        #Process the input string based upon comman and bracket location.
-        data = [-1] * gradient_range
-        for line in user_lines.splitlines():
-            comma = line.find(',')
-            bracket = line.find(']')
-            start = int(line[1:comma])
-            end = int(line[comma+1:bracket])
-            x = line.find('x')
-            #If 'x' exists, use a linear mapping for the data values.
-            if x >= 0:
-                factor = float(line[bracket+2:x])
-                for i in range(start,end):
-                    data[i] = round(factor*i,2)
-            #If 'x' does not exist, populate data range with a constant.
-            elif x == -1:
-                if ':' in line:
-                    value = float(line[bracket+2:len(line)])
-                else:
-                    value = 0
-                for i in range(start, end):
-                    data[i] = value
-        return data
+        return mappings.process_user_string(user_lines, configs)
 
     def map_timing(self, configs:dict):
         """
         Generate the array which maps a (pixel) value to an exposure length.
         """
 
-        #Data from arguments.
-        gradient_range = (configs['Gradient Range'] if 'Gradient Range' 
-            in configs else 256)
-        input_ignore = (configs['Input Ignore'] if 'Input Ignore' 
-            in configs else [-1] * gradient_range)
-        input_exposure = (configs['Input Exposure'] if 'Input Exposure' 
-            in configs else [1] * gradient_range)
-        #Process exposure input and override with ignore input.
-        try:
-            map_timing = self.process_user_string(input_exposure, 
-                {'Gradient Range':gradient_range})
-        except Exception as e:
-            raise e #Exception('Error: exposure string is improperly formatted.')
-        try:
-            ignore_override = self.process_user_string(input_ignore, 
-                {'Gradient Range':gradient_range})
-        except Exception:
-            raise Exception('Error: ignore string is improperly formatted.')
-        for i in range(0, gradient_range):
-            if ignore_override[i] == 0:
-                map_timing[i] = 0
-        return map_timing
+        return mappings.map_timing(configs)
 
     def map_laser_power(self, configs:dict):
         """
         Generate the array which maps a (pixel) value to a laser power.
         """
 
-        #Data from arguments.
-        gradient_range = (configs['Gradient Range'] if 'Gradient Range' 
-            in configs else 256)
-        input_laser = (configs['Input Laser'] if 'Input Laser' 
-            in configs else [0] * gradient_range)
-        try:
-            map_laser_power = self.process_user_string(input_laser, 
-                {'Gradient Range':gradient_range})
-        except Exception:
-            raise Exception('Error: laser string is improperly formatted.')
-        return map_laser_power
+        return mappings.map_laser_power(configs)
     
     def map_gratings(self, configs:dict):
-        def cycle_image( j, i):
-            if j % 2 == 0 and i % 2 == 0:
-                return 0
-            elif j % 2 == 0 and i % 2 == 1:
-                return 1
-            elif j % 2 == 1 and i % 2 == 0:
-                return 2
-            elif j % 2 == 1 and i % 2 == 1:
-                return 3
-            else:
-                return -1
-        
+        """
+        Generate the array which maps every pixel of the image to a grating item.
+
+        Returns:
+            grating_map : np.ndarray : item index of every pixel, [row, column]
+        """
+
         gradient_range = (configs['Gradient Range'] if 'Gradient Range' 
             in configs else 256)
         grating_color = (configs['Input Grating Color'] if 'Input Grating Color' 
-            in configs else [-1] * gradient_range)
-        
-        try:
-            grating_color_map = self.process_user_string(grating_color, 
-                {'Gradient Range':gradient_range})
-        except Exception:
-            raise Exception('Error: Grating by Color string is improperly formatted')
-        
-        y_after_crop = self.image.modified_PIL.height
-        x_after_crop = self.image.modified_PIL.width
-    
-        grating_map = np.zeros((y_after_crop,x_after_crop), dtype=np.uint16)
-        grating_map = np.transpose(grating_map)
-        
-        temp_image_array = np.transpose(self.image.modified_array)
-        
-        if self.item_list and len(self.item_list) > 3:
-              
-            self.final_array = grating_map
-            
-           
-            for i in range(0, y_after_crop):
-                for j in range(0, x_after_crop):
-                    #grating_map[j][i] = cycle_image(j,i)
-                
-                    current_color = temp_image_array[j][i]
-                    #self.final_array[j][i] = current_color
-                    grating_option = grating_color_map[current_color]
-                    if grating_option != -1:
-                        grating_map[j][i]= grating_option
-                    else:
-                        grating_map[j][i]= 0
-                    
-            print(grating_map)
-            #print(self.final_array)
-        return grating_map
+            in configs else '')
+        tiling = configs['Tiling'] if 'Tiling' in configs else 'Color'
+        items = configs['Items'] if 'Items' in configs else len(self.item_list)
+        grating_color_map = mappings.process_user_string(grating_color, 
+            {'Gradient Range':gradient_range})
+        return mappings.map_gratings(self.image.array_view(), 
+            grating_color_map, tiling, items)
 
 ##############################################################################
 #Data Display
@@ -438,8 +407,8 @@ class HologramCreator(App):
         """
         
         super().clear_wigits([text])
-        image_as_array = np.transpose(image.modified_array)
-        for i in image_as_array:
+        #Each line of text is one column of the image.
+        for i in image.array_view().T:
             for j in i:
                 if j <= 9:
                     spaces = '   '
@@ -477,23 +446,7 @@ class HologramCreator(App):
             items : dict : [headings, values]
         """
         
-        try:
-            with open(file_name, 'r') as file:
-                contents = file.read().split('####################')
-        except FileNotFoundError as e:
-            message = 'The file could not be located:\n' + file_name
-            advice = ('If loading an experiment, choose another file.\nIf this'
-                ' is a file that stores equipment data, then re-enter the data'
-                ' and save. The file will be re-created')
-            raise NoFileError(message, e, advice)
-        items = {}
-        for pair in contents:
-            data = pair.split('::')
-            try:
-                items[data[0].strip('\n')] = data[1].strip('\n')
-            except IndexError: 
-                break 
-        return items
+        return experimentfile.read_file(file_name)
 
     def write_file(self, file_name:str, configs:dict, mode:str='w'):
         """
@@ -501,13 +454,9 @@ class HologramCreator(App):
         """
         
         try:
-            with open(file_name, mode) as file:
-                for key in configs.keys():
-                    file.write(str(key) + '::\n')
-                    file.write(str(configs[key]) + '\n####################\n')
-        except Exception as e:
-            message = 'Error ocured writing to a file for unknown reasons.'
-            super().error_window(UnknownError(message,e))
+            experimentfile.write_file(file_name, configs, mode)
+        except UnknownError as e:
+            super().error_window(e)
 
 ##############################################################################
 #Serial Ports
@@ -558,6 +507,7 @@ class HologramCreator(App):
         comlist = serial.tools.list_ports.comports()
         for i in comlist:
             ports.append(i.device)
+        ports.append(SIMULATED_PORT)
         baudrates = ['150','300','600','1200','2400','4800','9600','19200']
         timeouts = ['.1','.5','1','1.5','2']
         stopbits = ['1','1.5','2']
@@ -615,6 +565,9 @@ class HologramCreator(App):
                 equipment_configs[key] = entries[key].get()
             self.write_file(file_name, equipment_configs) 
             window.destroy()
+            #Gratings made after this use the new SLM profile.
+            if equipment_name.upper() == 'SLM':
+                self.slm_profile = self.read_slm_profile()
 
         #Call the correct configuration-window-creator method.
         if equipment_name.upper() == 'MOTOR':
@@ -623,6 +576,8 @@ class HologramCreator(App):
             equipment_things =  self.set_shutter_settings(file_name)
         elif equipment_name.upper() == 'LASER':
             equipment_things =  self.set_laser_settings(file_name)
+        elif equipment_name.upper() == 'SLM':
+            equipment_things =  self.set_slm_settings(file_name)
         else:
             raise Exception('Error: equipment name not recognized.')
         next_row = equipment_things['Next Row']
@@ -643,7 +598,7 @@ class HologramCreator(App):
         window_configs = {
             'Window Title':'Motor Settings',
             'Window Width':240,
-            'Window Height':170
+            'Window Height':315
         }
         window = super().popup_window(self.root, window_configs)
         super().close_help_menu(window, 'Help/Motor Settings.txt')
@@ -652,11 +607,22 @@ class HologramCreator(App):
         tk.Label(window, text = 'Motor Speed (mm/s):').grid(row=1)
         tk.Label(window, text = 'Acceleration (mm/s^2):').grid(row=2)
         tk.Label(window, text = 'Decceleration (mm/s^2):').grid(row=3)
+        tk.Label(window, text = 'Motion done poll time (s):').grid(row=4)
+        tk.Label(window, text = 'Poll before move end (s):').grid(row=5)
+        tk.Label(window, text = 'Command transport:').grid(row=6)
+        tk.Label(window, text = 'Acknowledge query:').grid(row=7)
+        tk.Label(window, text = 'XY interpolation:').grid(row=8)
         entries = {
             'Motor Command Pause':tk.Entry(window, width=10),
             'Motor Velocity':tk.Entry(window, width=10),
             'Motor Acceleration':tk.Entry(window, width=10),
             'Motor Decceleration':tk.Entry(window, width=10),
+            'Motor Poll Period':tk.Entry(window, width=10),
+            'Motor Poll Margin':tk.Entry(window, width=10),
+            'Motor Transport':ttk.Combobox(window, values=MOTOR_TRANSPORTS, width=8),
+            'Motor Acknowledge Query':tk.Entry(window, width=10),
+            'Motor Interpolation':ttk.Combobox(window, values=INTERPOLATIONS, 
+                width=8),
         }
         row = 0
         for key in entries.keys():
@@ -688,16 +654,20 @@ class HologramCreator(App):
         window_configs = {
             'Window Title':'Shutter Settings',
             'Window Width':240,
-            'Window Height':120
+            'Window Height':180
         }
         window = super().popup_window(self.root, window_configs)
         super().close_help_menu(window, 'Help/Shutter Settings.txt')
         #Create labels, entry wigits, alter size of window.
         tk.Label(window, text = 'Serial port pause time (s):').grid(row=0)
         tk.Label(window, text = 'Operating Mode:').grid(row=1)
+        tk.Label(window, text = 'Command transport:').grid(row=2)
+        tk.Label(window, text = 'Acknowledge query:').grid(row=3)
         entries = {
             'Shutter Command Pause':tk.Entry(window, width=10),
             'Shutter Operating Mode':tk.Entry(window, width=10),
+            'Shutter Transport':ttk.Combobox(window, values=TRANSPORTS, width=8),
+            'Shutter Acknowledge Query':tk.Entry(window, width=10),
         }
         row = 0
         for key in entries.keys():
@@ -729,7 +699,7 @@ class HologramCreator(App):
         window_configs = {
             'Window Title':'Laser Settings',
             'Window Width':250,
-            'Window Height':145
+            'Window Height':205
         }
         window = super().popup_window(self.root, window_configs)
         super().close_help_menu(window, 'Help/Laser Settings.txt')
@@ -737,10 +707,62 @@ class HologramCreator(App):
         tk.Label(window, text = 'Serial port pause time (s):').grid(row=0)
         tk.Label(window, text = 'Maximum Laser Power (mW):').grid(row=1)
         tk.Label(window, text = 'Power-Change Pause (s):').grid(row=2)
+        tk.Label(window, text = 'Command transport:').grid(row=3)
+        tk.Label(window, text = 'Acknowledge query:').grid(row=4)
         entries = {
             'Laser Command Pause':tk.Entry(window, width=10),
             'Laser Max Power':tk.Entry(window, width=10),
-            'Laser Power Change Pause':tk.Entry(window, width=10)
+            'Laser Power Change Pause':tk.Entry(window, width=10),
+            'Laser Transport':ttk.Combobox(window, values=TRANSPORTS, width=8),
+            'Laser Acknowledge Query':tk.Entry(window, width=10)
+        }
+        row = 0
+        for key in entries.keys():
+            entries[key].grid(row=row, column=1, pady=5, padx=10, sticky=tk.W)
+            row += 1
+        #Fill with previous data
+        try:
+            previous_items = self.read_file(file_name)
+        except NoFileError as e:
+            super().error_window(e)
+            previous_items = {}
+        for key in previous_items.keys():
+            if key in entries:
+                entries[key].insert(0, previous_items[key])
+        #dict to return.
+        equipment_things = {
+            'Next Row':row,
+            'Window':window,
+            'Entries':entries
+        }
+        return equipment_things
+
+    def set_slm_settings(self, file_name:str):
+        """
+        Create a window for user to enter SLM configs.
+        """
+        
+        #Create a equipment confiugrations window
+        window_configs = {
+            'Window Title':'SLM Settings',
+            'Window Width':250,
+            'Window Height':200
+        }
+        window = super().popup_window(self.root, window_configs)
+        super().close_help_menu(window, 'Help/SLM Settings.txt')
+        #Create labels, entry wigits, alter size of window.
+        tk.Label(window, text = 'Width (pixels):').grid(row=0)
+        tk.Label(window, text = 'Height (pixels):').grid(row=1)
+        tk.Label(window, text = 'Bit Depth:').grid(row=2)
+        tk.Label(window, text = 'Display Encoding:').grid(row=3)
+        tk.Label(window, text = 'Phase LUT File:').grid(row=4)
+        entries = {
+            'SLM Width':tk.Entry(window, width=10),
+            'SLM Height':tk.Entry(window, width=10),
+            'SLM Bit Depth':tk.Entry(window, width=10),
+            'SLM Display Encoding':ttk.Combobox(window, values=DISPLAY_ENCODINGS,
+                width=8),
+            'SLM LUT File':tk.Entry(window, width=10)
         }
         row = 0
         for key in entries.keys():
@@ -762,6 +784,59 @@ class HologramCreator(App):
             'Entries':entries
         }
         return equipment_things
+
+    def read_slm_profile(self):
+        """
+        Get the SLM profile from the SLM settings file.
+        Returns:
+            profile : SLMProfile : resolution and bit depth of the SLM
+        """
+
+        try:
+            settings = self.read_file('Equipment/SLM Settings.txt')
+        except NoFileError:
+            settings = {}
+        configs = {}
+        for key in settings.keys():
+            configs[key.replace('SLM', '').lstrip()] = settings[key]
+        try:
+            return SLMProfile(configs)
+        except (InputError, NoFileError, FileFormatError) as e:
+            super().error_window(e)
+            return SLMProfile()
+
+    def order_plan(self, plan:ExposurePlan):
+        """
+        Order a plan with the selected scan strategy, show the travel saved.
+        Returns:
+            plan : ExposurePlan : plan in scan order
+        """
+
+        #Moves are costed with the equipment settings once they are read.
+        model = None
+        if hasattr(self, 'equipment_configs_motor'):
+            try:
+                model = MotionModel(self.collect_motion_configs())
+            except InputError:
+                model = None
+        ordered = plan.ordered(self.scan_strategy, model)
+        saved = sum(plan.ordered('Raster').travel()) - sum(ordered.travel())
+        if self.scan_strategy == 'Auto':
+            self.label_travel.configure(text='Travel Saved (mm): %.1f, %s'
+                %(saved, ordered.strategy))
+        else:
+            self.label_travel.configure(text='Travel Saved (mm): %.1f'%(saved))
+        return ordered
+
+    def collect_motion_configs(self):
+        """
+        Gather the equipment settings that time the commands of an experiment.
+        Returns:
+            configs : dict : motor settings with shutter and laser pauses
+        """
+
+        return experimentfile.motion_configs(self.equipment_configs_motor,
+            self.equipment_configs_shutter, self.equipment_configs_laser)
         
 ##############################################################################
 #Other
@@ -19,6 +19,9 @@ from exceptions import InputError
 from exceptions import NoFileError
 from exceptions import UnknownError
 
+#Modes already holding 16 bit gray levels, kept as they are by grayscale.
+GRAY_16_MODES = ('I;16', 'I;16L', 'I;16B')
+
 class MyImage:
 
     def __init__(self, configs: dict):
@@ -34,6 +37,11 @@ class MyImage:
             in configs else None)
         self.name_image = (configs['name_image'] if 'name_image' 
             in configs else 'Some Image')
+        #Tkinter images are only built once a Label needs them.
+        self._original_tkinter = None
+        self._modified_tkinter = None
+        self._preview_tkinter = None
+        self.transforms = []
         self.get_images()
 
     def get_images(self):
@@ -47,13 +55,39 @@ class MyImage:
         except IOError as e: 
             message = 'The image could not be found:\n\t' + self.file_image
             raise NoFileError(message, e)
-        self.modified_PIL = self.original_PIL.convert('L')
-        #Downsize tkinter images as needed for display on the main window.
-        self.original_tkinter = self.get_window_image(self.original_PIL)
-        self.modified_tkinter = self.get_window_image(self.modified_PIL)
+        self._original_tkinter = None
         #Get the array representations of the image.
         self.original_array = self.image_as_array(self.original_PIL)
-        self.modified_array = self.image_as_array(self.modified_PIL)
+        self.set_modified(self.original_PIL.convert('L'))
+
+    @property
+    def original_tkinter(self):
+        """
+        Tkinter image of the original, built the first time it is displayed.
+        """
+
+        if self._original_tkinter is None:
+            self._original_tkinter = self.get_window_image(self.original_PIL)
+        return self._original_tkinter
+
+    @property
+    def modified_tkinter(self):
+        """
+        Tkinter image of the modified image, built the first time it is displayed.
+        """
+
+        if self._modified_tkinter is None:
+            self._modified_tkinter = self.get_window_image(self.modified_PIL)
+        return self._modified_tkinter
+
+    def set_modified(self, image:Image.Image):
+        """
+        Replace the modified image, its array, and drop its stale tkinter image.
+        """
+
+        self.modified_PIL = image
+        self.modified_array = self.image_as_array(image)
+        self._modified_tkinter = None
 
     def get_window_image(self, image:Image.Image):
         """
@@ -84,7 +118,7 @@ class MyImage:
         else:
             image_for_window = image
         #Convert to a tkinter PhotoImage and return.
-        image_tk = ImageTk.PhotoImage(image_for_window)
+        image_tk = ImageTk.PhotoImage(self.displayable(image_for_window))
         return image_tk
 
     def downsize_image(self, new_xy:tuple, image_to_mod:Image.Image=None):
@@ -115,9 +149,7 @@ class MyImage:
             raise UnknownError(message, e)
         #Update data members if nessecary.
         if image_to_mod is None:
-            self.modified_PIL = image
-            self.modified_tkinter = self.get_window_image(image)
-            self.modified_array = self.image_as_array(image)
+            self.set_modified(image)
         return image
 
     def crop_image(self, cropping:str, image_to_mod:Image.Image=None):
@@ -131,6 +163,25 @@ class MyImage:
         #Process the cropping string for x and y coordinates
         if cropping == '': 
             return
+        x1, y1, x2, y2 = self.parse_cropping(cropping, image.size)
+        #Crop the image
+        try:
+            image = image.crop((x1,y1,x2,y2))
+        except Exception as e:
+            message = 'Unknown error occurred cropping the image.'
+            raise UnknownError(message, e)
+        #Update data members if nessecary.
+        if image_to_mod is None:
+            self.set_modified(image)
+        return image
+
+    def parse_cropping(self, cropping:str, size:tuple):
+        """
+        Read a cropping string of the form (x1,y1),(x2,y2) within an image size.
+        Returns:
+            box : tuple : x1, y1, x2, y2 of the crop
+        """
+
         try:
             comma = cropping.find(',')
             brace = cropping.find(')')
@@ -146,33 +197,163 @@ class MyImage:
             advice = 'Ensure the format is correct.'
             raise InputError(message, e, advice)
         #Raise exception if input is out of image bounds
-        if x1<0 or y1<0 or x1>x2 or y1>y2 or x2>image.width or y2>image.height: 
+        if x1<0 or y1<0 or x1>x2 or y1>y2 or x2>size[0] or y2>size[1]: 
             message = 'The cropping dimentions are invalid.'
             advice = 'Ensure the dimentions are inside image bounds.'
             raise InputError(message, None, advice)
-        #Crop the image
+        return (x1, y1, x2, y2)
+
+    def reset_transforms(self):
+        """
+        Forget the recorded transforms, the next render is the original image.
+        """
+
+        self.transforms = []
+
+    def add_grayscale(self):
+        """
+        Record a conversion to 8 bit grayscale.
+        """
+
+        self.transforms.append(('grayscale', None))
+
+    def add_resize(self, new_xy:tuple):
+        """
+        Record a downsize to new_xy, checked when the transforms are planned.
+        """
+
+        if not isinstance(new_xy[0], int) or not isinstance(new_xy[1], int):
+            message = 'Attempting to downsize image with non int dimentions.'
+            raise InputError(message)
+        self.transforms.append(('resize', tuple(new_xy)))
+
+    def add_crop(self, cropping:str):
+        """
+        Record a crop given as (x1,y1),(x2,y2), an empty string is no crop.
+        """
+
+        if cropping != '':
+            self.transforms.append(('crop', cropping))
+
+    def plan_transforms(self):
+        """
+        Fold the recorded transforms into a single resample of the original.
+        Returns:
+            plan : tuple : grayscale flag, box in the original, output size
+        """
+
+        grayscale = False
+        box = (0.0, 0.0, float(self.original_PIL.width), 
+            float(self.original_PIL.height))
+        size = self.original_PIL.size
+        for kind, value in self.transforms:
+            if kind == 'grayscale':
+                grayscale = True
+            elif kind == 'resize':
+                #Check the ensure the dimentions are within the image size
+                if value[0] > size[0]: 
+                    message = 'Attempting to "upsize" the image horizontally.'
+                    raise InputError(message) 
+                if value[1] > size[1]: 
+                    message = 'Attempting to "upsize" the image vertically.'
+                    raise InputError(message) 
+                size = value
+            elif kind == 'crop':
+                #Map the crop, in current pixels, back onto the original.
+                x1, y1, x2, y2 = self.parse_cropping(value, size)
+                scale_x = (box[2] - box[0]) / size[0]
+                scale_y = (box[3] - box[1]) / size[1]
+                box = (box[0] + x1*scale_x, box[1] + y1*scale_y,
+                    box[0] + x2*scale_x, box[1] + y2*scale_y)
+                size = (x2 - x1, y2 - y1)
+        return grayscale, box, size
+
+    def render_transforms(self, preview:bool=False):
+        """
+        Run the recorded transforms, or a display sized preview in one pass.
+        Returns:
+            image : Image.Image : transformed image
+        """
+
+        grayscale, box, size = self.plan_transforms()
+        image = self.original_PIL
+        if grayscale and image.mode not in GRAY_16_MODES:
+            image = image.convert('L')
         try:
-            image = image.crop((x1,y1,x2,y2))
+            if preview:
+                #Render straight to the window size, the full image is not needed.
+                ratio = min(1, self.max_display_x / max(size[0], 1),
+                    self.max_display_y / max(size[1], 1))
+                size = (max(int(size[0] * ratio), 1), max(int(size[1] * ratio), 1))
+                return image.resize(size, Image.BILINEAR, box=box, 
+                    reducing_gap=2.0)
+            #Full resolution keeps each step, a resize folded into a later crop
+            #can differ from it by a level where the filter meets the box.
+            for kind, value in self.transforms:
+                if kind == 'resize':
+                    image = image.resize(value, Image.BICUBIC)
+                elif kind == 'crop':
+                    image = image.crop(self.parse_cropping(value, image.size))
         except Exception as e:
-            message = 'Unknown error occurred cropping the image.'
+            message = 'Unknown error occured transforming image.'
             raise UnknownError(message, e)
-        #Update data members if nessecary.
-        if image_to_mod is None:
-            self.modified_PIL = image
-            self.modified_tkinter = self.get_window_image(image)
-            self.modified_array = self.image_as_array(image)
         return image
 
+    def apply_transforms(self):
+        """
+        Materialize the recorded transforms at full resolution as the modified.
+        Returns:
+            image : Image.Image : PIL image transformed
+        """
+
+        image = self.render_transforms()
+        self.set_modified(image)
+        return image
+
+    def preview_tkinter(self):
+        """
+        Tkinter image of the recorded transforms, sized for the main window.
+        Returns:
+            image_tk : tk.PhotoImage : low resolution preview
+        """
+
+        self._preview_tkinter = ImageTk.PhotoImage(self.displayable(
+            self.render_transforms(True)))
+        return self._preview_tkinter
+
+    def displayable(self, image:Image.Image):
+        """
+        Get an image tkinter can show, 16 bit gray is shown by its top 8 bits.
+        Returns:
+            image : Image.Image : the image, or an 8 bit copy of it
+        """
+
+        if image.mode not in GRAY_16_MODES:
+            return image
+        return Image.fromarray((np.array(image) >> 8).astype(np.uint8))
+
     def image_as_array(self, image:Image.Image):
         """
-        Create an array representation from an image.
+        Create a compact, read only array representation from an image.
+        Returns:
+            image_array : np.ndarray : numeric representation of image, [row, column]
+        """
+
+        image_array = np.array(image)
+        image_array.setflags(write=False)
+        return image_array
+
+    def array_view(self, modified:bool=True):
+        """
+        Get a read only view of the modified, or original, pixel data.
         Returns:
-            image_list : list[list[int]] : numeric representation of image
+            view : np.ndarray : pixel values indexed [row, column]
         """
 
-        image_array = np.asarray(image)
-        image_list = image_array.tolist()
-        return image_list
+        image_array = self.modified_array if modified else self.original_array
+        view = image_array.view()
+        view.setflags(write=False)
+        return view
 
 
 
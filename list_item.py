@@ -13,7 +13,7 @@ class ListItem():
         self.image = image
         self.grating = grating
         self.item_details = item_details
-        self.image_as_array = []
+        self.image_as_array = None
         self.map_timing = item_details['map_timing']
         self.map_laser_power = item_details['map_laser_power']
 
@@ -0,0 +1,233 @@
+"""
+Map pixel values to exposure times and laser powers from the user's strings.
+
+@author: agent
+@date: October 2026
+@copyright: Copyright 2020, Luke Kurlandski, all rights reserved
+
+Special thanks to Daniel Stolz, Luke Kurlandski, Matthew Van Soelen, and Dr. David McGee.
+
+Read the Program Guide for detailed information about this program.
+"""
+
+from functools import lru_cache
+import numpy as np
+
+from exceptions import InputError
+
+#Value of pixel levels no line of a user string covers.
+UNMAPPED = -1
+
+class CompiledMapping:
+    """
+    User string of [start,end]:value and [start,end]:factor x lines, parsed
+    once into segments and built into an array of every pixel level.
+    """
+
+    def __init__(self, user_lines:str, gradient_range:int=256):
+        """
+        Parse the user string and build its array.
+        """
+
+        self.user_lines = user_lines
+        self.gradient_range = gradient_range
+        self.segments = self.parse(user_lines)
+        self.array = self.build(gradient_range)
+
+    def parse(self, user_lines:str):
+        """
+        Split the user string into segments, without building anything yet.
+        Returns:
+            segments : list : (start, end, factor, value) for every line
+        """
+
+        segments = []
+        for line in user_lines.splitlines():
+            line = line.strip()
+            if line == '':
+                continue
+            comma = line.find(',')
+            bracket = line.find(']')
+            try:
+                start = int(line[1:comma])
+                end = int(line[comma+1:bracket])
+                x = line.find('x')
+                #If 'x' exists, use a linear mapping for the data values.
+                if x >= 0:
+                    segments.append((start, end, float(line[bracket+2:x]), None))
+                #If 'x' does not exist, populate data range with a constant.
+                elif ':' in line:
+                    segments.append((start, end, None, float(line[bracket+2:])))
+                else:
+                    segments.append((start, end, None, 0.0))
+            except ValueError as e:
+                message = 'This line cannot be processed:\n\t' + line
+                advice = 'Use [start,end]:value or [start,end]:factor x.'
+                raise InputError(message, e, advice)
+        return segments
+
+    def build(self, gradient_range:int):
+        """
+        Fill an array for every pixel level, later lines override earlier.
+        Returns:
+            array : np.ndarray : read only float values, UNMAPPED if uncovered
+        """
+
+        array = np.full(gradient_range, UNMAPPED, dtype=float)
+        for start, end, factor, value in self.segments:
+            if start < 0 or end > gradient_range:
+                message = ('The range [%d,%d] is outside the pixel levels '
+                    '[0,%d].'%(start, end, gradient_range))
+                raise InputError(message)
+            if start >= end:
+                continue
+            if factor is None:
+                array[start:end] = value
+            else:
+                array[start:end] = round_hundredths(
+                    factor * np.arange(start, end, dtype=float))
+        array.setflags(write=False)
+        return array
+
+def round_hundredths(values:np.ndarray):
+    """
+    Round to two decimals exactly as Python's round does, ties included.
+    Returns:
+        rounded : np.ndarray : rounded values
+    """
+
+    rounded = np.round(values, 2)
+    #Scaling by 100 can land on a tie the exact value is not, recheck those.
+    scaled = values * 100
+    near = np.nonzero(np.abs(scaled - np.floor(scaled) - .5) < 1e-6)[0]
+    rounded[near] = [round(value, 2) for value in values[near].tolist()]
+    return rounded
+
+@lru_cache(maxsize=128)
+def compile_mapping(user_lines:str, gradient_range:int=256):
+    """
+    Compile a user string, reusing the result for a string seen before.
+    Returns:
+        mapping : CompiledMapping : parsed segments and built array
+    """
+
+    return CompiledMapping(user_lines, gradient_range)
+
+def gradient_range(image_array:np.ndarray):
+    """
+    Number of pixel levels an image's array can hold.
+    Returns:
+        gradient_range : int : 256 for 8 bit images, 65536 for 16 bit
+    """
+
+    if np.issubdtype(image_array.dtype, np.integer):
+        return int(np.iinfo(image_array.dtype).max) + 1
+    return 256
+
+def process_user_string(user_lines:str, configs:dict):
+    """
+    Process raw user string input into usful data arrays.
+
+    Returns:
+        data : np.ndarray : read only value of every pixel level
+    """
+
+    #Data from arguments.
+    gradient_range = (configs['Gradient Range'] if 'Gradient Range'
+        in configs else 256)
+    return compile_mapping(user_lines, gradient_range).array
+
+@lru_cache(maxsize=128)
+def compile_timing(input_exposure:str, input_ignore:str, gradient_range:int):
+    """
+    Build the exposure times with the ignored levels set to zero, once per
+    combination of strings.
+    Returns:
+        map_timing : np.ndarray : read only seconds for every pixel value
+    """
+
+    timing = compile_mapping(input_exposure, gradient_range).array.copy()
+    ignore_override = compile_mapping(input_ignore, gradient_range).array
+    timing[ignore_override == 0] = 0
+    timing.setflags(write=False)
+    return timing
+
+def map_timing(configs:dict):
+    """
+    Generate the array which maps a (pixel) value to an exposure length.
+
+    Returns:
+        map_timing : np.ndarray : read only seconds for every pixel value
+    """
+
+    #Data from arguments.
+    gradient_range = (configs['Gradient Range'] if 'Gradient Range'
+        in configs else 256)
+    input_ignore = (configs['Input Ignore'] if 'Input Ignore'
+        in configs else '')
+    input_exposure = (configs['Input Exposure'] if 'Input Exposure'
+        in configs else '[0,%d]:1'%(gradient_range))
+    #Process exposure input and override with ignore input.
+    try:
+        return compile_timing(input_exposure, input_ignore, gradient_range)
+    except InputError as e:
+        e.message = 'The exposure or ignore string is improperly formatted:\n' + e.message
+        raise e
+
+def map_laser_power(configs:dict):
+    """
+    Generate the array which maps a (pixel) value to a laser power.
+
+    Returns:
+        map_laser_power : np.ndarray : read only laser power for every value
+    """
+
+    #Data from arguments.
+    gradient_range = (configs['Gradient Range'] if 'Gradient Range'
+        in configs else 256)
+    input_laser = (configs['Input Laser'] if 'Input Laser'
+        in configs else '[0,%d]:0'%(gradient_range))
+    try:
+        return compile_mapping(input_laser, gradient_range).array
+    except InputError as e:
+        e.message = 'The laser string is improperly formatted:\n' + e.message
+        raise e
+
+#Ways to choose the grating item of every pixel, see map_gratings.
+TILINGS = ('Color', 'Checkerboard', 'Stripes', 'Cycle')
+
+def map_gratings(image_array:np.ndarray, grating_color_map:np.ndarray,
+    tiling:str='Color', items:int=1):
+    """
+    Choose the grating item of every pixel at once: by the pixel's level, as 
+    a checkerboard, as vertical stripes, or cycling through a 2x2 tile.
+    Returns:
+        grating_map : np.ndarray : item index of every pixel, [row, column]
+    """
+
+    items = max(items, 1)
+    rows, columns = image_array.shape[:2]
+    if tiling == 'Color':
+        #Levels no line covers use the first item.
+        grating_map = np.take(np.maximum(np.asarray(grating_color_map), 0),
+            image_array).astype(np.intp)
+        if grating_map.size > 0 and grating_map.max() >= items:
+            message = ('Gratings by Color chooses item %d, but there are only '
+                '%d items.'%(grating_map.max(), items))
+            advice = 'Add more items, or number items from 0.'
+            raise InputError(message, None, advice)
+        return grating_map
+    y = np.arange(rows, dtype=np.intp)[:, np.newaxis]
+    x = np.arange(columns, dtype=np.intp)[np.newaxis, :]
+    if tiling == 'Checkerboard':
+        grating_map = (x + y) % 2
+    elif tiling == 'Stripes':
+        grating_map = np.broadcast_to(x, (rows, columns))
+    elif tiling == 'Cycle':
+        grating_map = 2*(x % 2) + (y % 2)
+    else:
+        message = 'Unknown grating tiling: ' + str(tiling)
+        advice = 'Use one of: ' + ', '.join(TILINGS)
+        raise InputError(message, None, advice)
+    #Patterns repeat over however many items there are.
+    return np.ascontiguousarray(grating_map % items)
@@ -0,0 +1,706 @@
+"""
+Plan the exposures of an experiment and model how long they take to run.
+
+@author: agent
+@date: October 2026
+@copyright: Copyright 2020, Luke Kurlandski, all rights reserved
+
+Special thanks to Daniel Stolz, Luke Kurlandski, Matthew Van Soelen, and Dr. David McGee.
+
+Read the Program Guide for detailed information about this program.
+"""
+
+import numpy as np
+import time
+
+from exceptions import InputError
+from exceptions import NoFileError
+from exceptions import FileFormatError
+
+#Typical seconds for a command and its acknowledgement at 19200 baud.
+ACKNOWLEDGE_TIME = .02
+
+#One exposure: pixel position, level, laser power, seconds and grating item.
+PLAN_DTYPE = np.dtype([('x', np.int32), ('y', np.int32), ('pixel', np.int32),
+    ('power', np.float64), ('duration', np.float64), ('item', np.int32)])
+
+def order_raster(steps:np.ndarray, cost:'PathCost'=None):
+    """
+    Order exposures row by row, each row left to right.
+    Returns:
+        order : np.ndarray : indices of steps in scan order
+    """
+
+    return np.lexsort((steps['x'], steps['y']))
+
+def order_serpentine(steps:np.ndarray, cost:'PathCost'=None):
+    """
+    Order exposures row by row, alternating direction on every visited row.
+    Returns:
+        order : np.ndarray : indices of steps in scan order
+    """
+
+    rows, rank = np.unique(steps['y'], return_inverse=True)
+    direction = np.where(rank % 2 == 0, 1, -1)
+    return np.lexsort((steps['x'] * direction, steps['y']))
+
+def order_skip_empty(steps:np.ndarray, cost:'PathCost'=None):
+    """
+    Visit only the exposed span of non-empty rows, entering from the nearer end.
+    Returns:
+        order : np.ndarray : indices of steps in scan order
+    """
+
+    order = order_raster(steps)
+    if len(order) == 0:
+        return order
+    columns = steps['x'][order]
+    starts = np.flatnonzero(np.diff(steps['y'][order], prepend=-1) != 0)
+    ends = np.append(starts[1:], len(order))
+    pieces = []
+    current = 0
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        first = columns[start]
+        last = columns[end-1]
+        if abs(current - first) <= abs(current - last):
+            pieces.append(order[start:end])
+            current = last
+        else:
+            pieces.append(order[start:end][::-1])
+            current = first
+    return np.concatenate(pieces)
+
+def order_path_optimized(steps:np.ndarray, cost:'PathCost'):
+    """
+    Order exposures by nearest neighbour then 2-opt, within the cost's budget.
+    Returns:
+        order : np.ndarray : indices of steps in scan order
+    """
+
+    deadline = time.perf_counter() + cost.budget
+    order = nearest_neighbour(steps, cost, deadline)
+    return two_opt(steps, order, cost, deadline)
+
+def nearest_neighbour(steps:np.ndarray, cost:'PathCost', deadline:float):
+    """
+    Greedy tour from home over a grid of cells, the rest serpentine on timeout.
+    Returns:
+        order : np.ndarray : indices of steps in visiting order
+    """
+
+    count = len(steps)
+    if count == 0:
+        return np.zeros(0, dtype=np.intp)
+    xs = steps['x'].tolist()
+    ys = steps['y'].tolist()
+    #About two exposures per cell.
+    width = max(xs) + 1
+    height = max(ys) + 1
+    size = max(1, int(np.sqrt(width * height * 2 / count)))
+    cells = {}
+    for index, (x, y) in enumerate(zip(xs, ys)):
+        cells.setdefault((x // size, y // size), []).append(index)
+    cells_x = (width - 1) // size + 1
+    cells_y = (height - 1) // size + 1
+    visited = bytearray(count)
+    order = []
+    x, y = 0, 0
+    while len(order) < count:
+        if len(order) % 256 == 0 and time.perf_counter() > deadline:
+            break
+        cell_x, cell_y = x // size, y // size
+        best = None
+        best_cost = None
+        ring = 0
+        while True:
+            #Every point in this ring moves at least this far on one axis.
+            reach = max(0, (ring - 1) * size + 1)
+            if best is not None and cost.lower_bound(reach) >= best_cost:
+                break
+            if (ring > cell_x and ring > cell_y and ring >= cells_x - cell_x 
+                    and ring >= cells_y - cell_y):
+                break
+            for key in ring_cells(cell_x, cell_y, ring):
+                members = cells.get(key)
+                if members is None:
+                    continue
+                #Drop visited points from the cell as they are seen.
+                members[:] = [m for m in members if not visited[m]]
+                if not members:
+                    del cells[key]
+                    continue
+                for m in members:
+                    c = cost.step(abs(xs[m] - x), abs(ys[m] - y))
+                    if best is None or c < best_cost:
+                        best, best_cost = m, c
+            ring += 1
+        visited[best] = 1
+        order.append(best)
+        x, y = xs[best], ys[best]
+    order = np.array(order, dtype=np.intp)
+    if len(order) < count:
+        #Out of time, finish the unvisited points in serpentine order.
+        rest = np.flatnonzero(np.frombuffer(bytes(visited), dtype=np.uint8) == 0)
+        rest = rest[order_serpentine(steps[rest])]
+        order = np.concatenate((order, rest))
+    return order
+
+def ring_cells(cell_x:int, cell_y:int, ring:int):
+    """
+    Cells at a Chebyshev distance of ring from a cell.
+    Returns:
+        cells : list : (x, y) keys of the ring
+    """
+
+    if ring == 0:
+        return [(cell_x, cell_y)]
+    cells = []
+    for x in range(cell_x - ring, cell_x + ring + 1):
+        cells.append((x, cell_y - ring))
+        cells.append((x, cell_y + ring))
+    for y in range(cell_y - ring + 1, cell_y + ring):
+        cells.append((cell_x - ring, y))
+        cells.append((cell_x + ring, y))
+    return cells
+
+def two_opt(steps:np.ndarray, order:np.ndarray, cost:'PathCost', 
+    deadline:float, window:int=64):
+    """
+    Reverse segments of up to window exposures while that shortens the tour.
+    Returns:
+        order : np.ndarray : improved visiting order
+    """
+
+    #Home is node 0 and stays first, the tour is open at its end.
+    order = np.asarray(order)
+    xs = np.concatenate(([0], steps['x'][order])).astype(np.int64)
+    ys = np.concatenate(([0], steps['y'][order])).astype(np.int64)
+    nodes = np.concatenate(([-1], order))
+    count = len(nodes)
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(1, count - 1):
+            if i % 256 == 0 and time.perf_counter() > deadline:
+                break
+            #Replace edges (i-1, i) and (j, j+1) with (i-1, j) and (i, j+1).
+            j = np.arange(i + 1, min(i + window, count))
+            after = np.minimum(j + 1, count - 1)
+            at_end = j == count - 1
+            old = (cost.between(xs[i-1], ys[i-1], xs[i], ys[i]) 
+                + np.where(at_end, 0, cost.between(xs[j], ys[j], xs[after], 
+                    ys[after])))
+            new = (cost.between(xs[i-1], ys[i-1], xs[j], ys[j])
+                + np.where(at_end, 0, cost.between(xs[i], ys[i], xs[after],
+                    ys[after])))
+            gain = old - new
+            best = int(np.argmax(gain))
+            if gain[best] > 1e-9:
+                j = int(j[best])
+                xs[i:j+1] = xs[i:j+1][::-1].copy()
+                ys[i:j+1] = ys[i:j+1][::-1].copy()
+                nodes[i:j+1] = nodes[i:j+1][::-1].copy()
+                improved = True
+    return nodes[1:]
+
+def order_power_grouped(steps:np.ndarray, cost:'PathCost'=None, 
+    serpentine:bool=True):
+    """
+    One pass per laser power, lowest first, each pass serpentine or raster.
+    Returns:
+        order : np.ndarray : indices of steps in scan order
+    """
+
+    powers, passes = np.unique(steps['power'], return_inverse=True)
+    order_pass = order_serpentine if serpentine else order_raster
+    pieces = []
+    for index in range(len(powers)):
+        members = np.flatnonzero(passes == index)
+        pieces.append(members[order_pass(steps[members])])
+    if len(pieces) == 0:
+        return np.zeros(0, dtype=np.intp)
+    return np.concatenate(pieces)
+
+def order_power_grouped_raster(steps:np.ndarray, cost:'PathCost'=None):
+    """
+    One raster pass per laser power, lowest first.
+    Returns:
+        order : np.ndarray : indices of steps in scan order
+    """
+
+    return order_power_grouped(steps, cost, False)
+
+def order_auto(steps:np.ndarray, cost:'PathCost'):
+    """
+    Pick power grouped or spatial ordering, whichever the cost model says is
+    faster for the laser pauses and stage speed.
+    Returns:
+        order : np.ndarray : indices of steps in scan order
+    """
+
+    best = None
+    for name in AUTO_CANDIDATES:
+        order = SCAN_STRATEGIES[name](steps, cost)
+        seconds = cost.tour(steps, order)
+        if best is None or seconds < best[0]:
+            best = (seconds, name, order)
+    cost.chosen = best[1]
+    return best[2]
+
+#Scan strategies by the name shown in the main window.
+SCAN_STRATEGIES = {
+    'Raster':order_raster,
+    'Serpentine':order_serpentine,
+    'Skip Empty':order_skip_empty,
+    'Path Optimized':order_path_optimized,
+    'Power Grouped':order_power_grouped,
+    'Power Grouped Raster':order_power_grouped_raster,
+    'Auto':order_auto
+}
+
+#Orderings compared by Auto, each takes at most milliseconds.
+AUTO_CANDIDATES = ('Raster', 'Serpentine', 'Skip Empty', 'Power Grouped',
+    'Power Grouped Raster')
+
+class PathCost:
+    """
+    Seconds to move between two pixels, both axes started together.
+    """
+
+    def __init__(self, model:'MotionModel', delta_x:float, delta_y:float,
+        size:tuple, budget:float=10):
+        """
+        Tabulate the move time of every single axis pixel distance up to size.
+        """
+
+        self.model = model
+        self.step_x = delta_x * 1000
+        self.step_y = delta_y * 1000
+        #A distance of zero means the axis is not commanded.
+        self.array_x = model.step_time(np.arange(size[0] + 1) * self.step_x, 0)
+        self.array_y = model.step_time(0, np.arange(size[1] + 1) * self.step_y)
+        self.table_x = self.array_x.tolist()
+        self.table_y = self.array_y.tolist()
+        self.pairs = {}
+        self.power_time = model.power_time()
+        self.budget = budget
+        #Strategy picked by Auto, if it was used.
+        self.chosen = None
+
+    def between(self, x1, y1, x2, y2):
+        """
+        Cost of moving from pixel (x1, y1) to (x2, y2).
+        Returns:
+            cost : np.ndarray : seconds of the move
+        """
+
+        dx = np.abs(x2 - x1)
+        dy = np.abs(y2 - y1)
+        if self.model.interpolation == 'Group':
+            return self.model.step_time(dx * self.step_x, dy * self.step_y)
+        #Waiting is monotonic, the slower axis alone sets the time.
+        both = (dx != 0) & (dy != 0)
+        return (np.maximum(self.array_x[dx], self.array_y[dy]) 
+            + np.where(both, ACKNOWLEDGE_TIME, 0))
+
+    def step(self, dx:int, dy:int):
+        """
+        Cost of a move of dx and dy pixels, remembered for the next time.
+        Returns:
+            cost : float : seconds of the move
+        """
+
+        if dy == 0:
+            return self.table_x[dx]
+        if dx == 0:
+            return self.table_y[dy]
+        cost = self.pairs.get((dx, dy))
+        if cost is None:
+            cost = float(self.model.step_time(dx * self.step_x, 
+                dy * self.step_y))
+            self.pairs[(dx, dy)] = cost
+        return cost
+
+    def tour(self, steps:np.ndarray, order:np.ndarray):
+        """
+        Cost of visiting the steps in order from home, moves and power changes.
+        Returns:
+            cost : float : seconds
+        """
+
+        xs = np.concatenate(([0], steps['x'][order]))
+        ys = np.concatenate(([0], steps['y'][order]))
+        moves = self.between(xs[:-1], ys[:-1], xs[1:], ys[1:])
+        #Power changes run while the step's move travels.
+        powers = steps['power'][order]
+        changes = np.abs(np.diff(powers, prepend=powers[:1])) >= .05
+        laser = np.where(changes, self.power_time, 0)
+        return float(moves.sum() + (laser - np.minimum(laser, moves)).sum())
+
+    def lower_bound(self, reach:int):
+        """
+        Least cost of a move that goes at least reach pixels on some axis.
+        Returns:
+            cost : float : seconds
+        """
+
+        if reach == 0:
+            return 0
+        return min(self.table_x[min(reach, len(self.table_x) - 1)], 
+            self.table_y[min(reach, len(self.table_y) - 1)])
+
+class MotionModel:
+    """
+    Timing of the motor, shutter and laser commands issued by an experiment.
+    """
+
+    def __init__(self, configs:dict=None):
+        """
+        Create a model from motor settings, optionally shutter and laser pauses.
+        """
+
+        configs = {} if configs is None else configs
+        try:
+            #Motor units are mm, mm/s and mm/s^2, as sent to the controller.
+            self.velocity = (float(configs['Velocity']) if 'Velocity'
+                in configs else 1)
+            self.acceleration = (float(configs['Acceleration']) if
+                'Acceleration' in configs else 4)
+            self.decceleration = (float(configs['Decceleration']) if
+                'Decceleration' in configs else 4)
+            self.command_pause = (float(configs['Command Pause']) if
+                'Command Pause' in configs else .1)
+            #Motor.wait_motion_done sleeps until margin before a move should
+            #end, then sleeps the poll period between motion done queries.
+            self.poll_period = (float(configs['Poll Period']) if 'Poll Period'
+                in configs else .01)
+            self.poll_margin = (float(configs['Poll Margin']) if 'Poll Margin'
+                in configs else .05)
+            self.shutter_pause = (float(configs['Shutter Command Pause']) if
+                'Shutter Command Pause' in configs else .1)
+            self.laser_pause = (float(configs['Laser Command Pause']) if
+                'Laser Command Pause' in configs else .1)
+            self.power_change_pause = (float(configs['Power Change Pause']) if
+                'Power Change Pause' in configs else 0)
+            #Two axis moves start together, or follow a straight line.
+            self.interpolation = (configs['Interpolation'].strip() if 
+                'Interpolation' in configs else 'None')
+            #Acknowledged commands take a round trip instead of the pause.
+            for key, attribute in (('Transport', 'command_pause'), 
+                    ('Shutter Transport', 'shutter_pause'), 
+                    ('Laser Transport', 'laser_pause')):
+                if key in configs and configs[key].strip() not in ('', 'Pause'):
+                    setattr(self, attribute, ACKNOWLEDGE_TIME)
+        except ValueError as e:
+            message = 'The equipment settings must be floating points.'
+            advice = 'Check the motor, shutter and laser settings.'
+            raise InputError(message, e, advice)
+        if self.velocity <= 0 or self.acceleration <= 0 or self.decceleration <= 0:
+            message = 'The motor velocity and accelerations must be positive.'
+            advice = 'Check the motor settings.'
+            raise InputError(message, None, advice)
+
+    def move_time(self, distance):
+        """
+        Time the stage spends moving, trapezoid or triangle velocity profile.
+        Returns:
+            move_time : np.ndarray : seconds for each distance in mm
+        """
+
+        distance = np.abs(np.asarray(distance, dtype=float))
+        v, a, d = self.velocity, self.acceleration, self.decceleration
+        #Distance needed to reach full velocity and stop again.
+        ramp = v**2 / (2*a) + v**2 / (2*d)
+        trapezoid = v/a + v/d + (distance - ramp) / v
+        peak = np.sqrt(2 * distance * a * d / (a + d))
+        triangle = peak/a + peak/d
+        return np.where(distance >= ramp, trapezoid, triangle)
+
+    def wait_time(self, move_time):
+        """
+        Time from a move's command until its motion done is seen.
+        Returns:
+            wait_time : np.ndarray : seconds for each move time
+        """
+
+        #Motion done is first queried margin before the move should end, but
+        #never before the command's pause, then every cycle. Queries do not
+        #pause, each is one round trip.
+        cycle = ACKNOWLEDGE_TIME + self.poll_period
+        first = np.maximum(move_time - self.poll_margin, self.command_pause)
+        late = np.maximum(move_time - first, 0)
+        polls = np.ceil(np.round(late / cycle, 9))
+        return first + polls*cycle + ACKNOWLEDGE_TIME
+
+    def step_time(self, distance_x, distance_y, moved_x=None, moved_y=None):
+        """
+        Time of Motor.move_xy, both axes started together and waited for. An 
+        axis moves if its distance is not zero, unless moved says otherwise.
+        Returns:
+            step_time : np.ndarray : seconds for each pair of distances in mm
+        """
+
+        distance_x = np.abs(np.asarray(distance_x, dtype=float))
+        distance_y = np.abs(np.asarray(distance_y, dtype=float))
+        moved_x = distance_x != 0 if moved_x is None else moved_x
+        moved_y = distance_y != 0 if moved_y is None else moved_y
+        both = moved_x & moved_y
+        move_time = np.maximum(np.where(moved_x, self.move_time(distance_x), 0),
+            np.where(moved_y, self.move_time(distance_y), 0))
+        if self.interpolation == 'Group':
+            #A linear group move travels the diagonal at the group velocity.
+            vector = self.move_time(np.hypot(distance_x, distance_y))
+            move_time = np.where(both, vector, move_time)
+        #The second axis is asked for motion done once more, a round trip.
+        step_time = self.wait_time(move_time) + np.where(both, 
+            ACKNOWLEDGE_TIME, 0)
+        return np.where(moved_x | moved_y, step_time, 0)
+
+    def exposure_time(self, exposure):
+        """
+        Time of Shutter.toggle, two commands around the exposure.
+        Returns:
+            toggle_time : np.ndarray : seconds for each exposure
+        """
+
+        return 2*self.shutter_pause + np.asarray(exposure, dtype=float)
+
+    def power_time(self):
+        """
+        Time of Laser.change_power.
+        Returns:
+            power_time : float : seconds per power change
+        """
+
+        return self.laser_pause + self.power_change_pause
+
+    def estimate_plan(self, plan):
+        """
+        Estimate an exposure plan, in whatever order its steps are.
+        Returns:
+            estimate : dict : seconds of Exposure, Shutter, Laser, Travel, Total
+        """
+
+        steps = plan.steps
+        estimate = {'Exposure':0.0, 'Shutter':0.0, 'Laser':0.0, 'Travel':0.0}
+        if len(steps) == 0:
+            estimate['Total'] = 0.0
+            return estimate
+        estimate['Exposure'] = float(steps['duration'].sum())
+        estimate['Shutter'] = 2 * self.shutter_pause * len(steps)
+        #Each axis moves on the first step and whenever its position changes.
+        moves_x = np.diff(steps['x'], prepend=0)
+        moves_y = np.diff(steps['y'], prepend=0)
+        first = np.arange(len(steps)) == 0
+        move_times = self.step_time(moves_x * plan.delta_x * 1000, 
+            moves_y * plan.delta_y * 1000, (moves_x != 0) | first, 
+            (moves_y != 0) | first)
+        estimate['Travel'] = float(move_times.sum())
+        #Power changes run while the step's move travels.
+        changes = np.abs(np.diff(steps['power'], prepend=steps['power'][0])) >= .05
+        laser = np.where(changes, self.power_time(), 0)
+        estimate['Laser'] = float((laser - np.minimum(laser, move_times)).sum())
+        estimate['Total'] = sum(estimate.values())
+        return estimate
+
+class ExposurePlan:
+    """
+    Every exposure of an experiment, in the order the runner makes them.
+    """
+
+    def __init__(self, steps:np.ndarray, delta_x:float, delta_y:float):
+        """
+        Create a plan from steps of PLAN_DTYPE and the pixel pitch in meters.
+        """
+
+        self.steps = steps
+        self.delta_x = delta_x
+        self.delta_y = delta_y
+        #Scan strategy the steps are ordered by, compiled plans are raster.
+        self.strategy = 'Raster'
+
+    def __len__(self):
+        return len(self.steps)
+
+    @classmethod
+    def compile(cls, image_array:np.ndarray, map_timing, map_laser_power,
+        delta_x:float, delta_y:float, item_array:np.ndarray=None):
+        """
+        Compile a row by row plan from an image and its mappings.
+        Returns:
+            plan : ExposurePlan : one step per exposed pixel
+        """
+
+        map_timing = np.asarray(map_timing, dtype=float)
+        map_laser_power = np.asarray(map_laser_power, dtype=float)
+        #Levels are exposed when their time, negatives as zero, is at least .05.
+        exposed_level = map_timing >= .05
+        rows, columns = np.nonzero(np.take(exposed_level, image_array))
+        steps = np.zeros(len(rows), dtype=PLAN_DTYPE)
+        steps['x'] = columns
+        steps['y'] = rows
+        levels = image_array[rows, columns]
+        steps['pixel'] = levels
+        steps['power'] = np.take(map_laser_power, levels)
+        steps['duration'] = np.take(map_timing, levels)
+        if item_array is not None:
+            steps['item'] = item_array[rows, columns]
+        return cls(steps, delta_x, delta_y)
+
+    @classmethod
+    def compile_items(cls, image_arrays:list, maps_timing:list, 
+        maps_laser_power:list, delta_x:float, delta_y:float, 
+        item_array:np.ndarray):
+        """
+        Compile a row by row plan where every pixel comes from the image, and
+        mappings, of the item chosen for it by item_array.
+        Returns:
+            plan : ExposurePlan : one step per exposed pixel
+        """
+
+        if any(np.shape(image) != np.shape(item_array) for image in image_arrays):
+            message = 'Every item image must be the size of the grating map.'
+            advice = 'Use the same pixels and cropping for every item.'
+            raise InputError(message, None, advice)
+        if len(set(len(mapping) for mapping in maps_timing)) > 1:
+            message = 'Every item image must have the same bit depth.'
+            raise InputError(message)
+        #Each pixel's level in its own item's image.
+        stack = np.stack(image_arrays)
+        item_array = np.asarray(item_array, dtype=np.intp)
+        levels = np.take_along_axis(stack, item_array[np.newaxis], 0)[0]
+        #Item and level index one long table of every item's mappings.
+        gradient_range = len(maps_timing[0])
+        timing = np.concatenate([np.asarray(m, dtype=float) for m in maps_timing])
+        power = np.concatenate([np.asarray(m, dtype=float) for m in 
+            maps_laser_power])
+        combined = item_array * gradient_range + levels
+        rows, columns = np.nonzero(np.take(timing >= .05, combined))
+        steps = np.zeros(len(rows), dtype=PLAN_DTYPE)
+        steps['x'] = columns
+        steps['y'] = rows
+        steps['pixel'] = levels[rows, columns]
+        steps['power'] = np.take(power, combined[rows, columns])
+        steps['duration'] = np.take(timing, combined[rows, columns])
+        steps['item'] = item_array[rows, columns]
+        return cls(steps, delta_x, delta_y)
+
+    def positions(self):
+        """
+        Get the motor positions of every step.
+        Returns:
+            positions : tuple : x and y arrays in mm, as sent to the motor
+        """
+
+        return (self.steps['x'] * self.delta_x * 1000, 
+            self.steps['y'] * self.delta_y * 1000)
+
+    def ordered(self, strategy:str, model:MotionModel=None, budget:float=10):
+        """
+        Reorder the plan with one of the SCAN_STRATEGIES, costing moves with
+        the model and spending at most budget seconds optimizing.
+        Returns:
+            plan : ExposurePlan : the same exposures in the strategy's order
+        """
+
+        if strategy not in SCAN_STRATEGIES:
+            message = 'Unknown scan strategy: ' + str(strategy)
+            advice = 'Use one of: ' + ', '.join(SCAN_STRATEGIES.keys())
+            raise InputError(message, None, advice)
+        model = MotionModel() if model is None else model
+        size = ((int(self.steps['x'].max()) + 1, int(self.steps['y'].max()) + 1)
+            if len(self.steps) > 0 else (1, 1))
+        cost = PathCost(model, self.delta_x, self.delta_y, size, budget)
+        order = SCAN_STRATEGIES[strategy](self.steps, cost)
+        plan = ExposurePlan(self.steps[order], self.delta_x, self.delta_y)
+        plan.strategy = strategy if cost.chosen is None else cost.chosen
+        return plan
+
+    def travel(self):
+        """
+        Distance each axis travels executing the plan from home.
+        Returns:
+            travel : tuple : x and y distances in mm
+        """
+
+        x, y = self.positions()
+        return (float(np.abs(np.diff(x, prepend=0)).sum()), 
+            float(np.abs(np.diff(y, prepend=0)).sum()))
+
+    def estimate(self, model:MotionModel):
+        """
+        Estimate the plan with a motion model.
+        Returns:
+            estimate : dict : seconds of Exposure, Shutter, Laser, Travel, Total
+        """
+
+        return model.estimate_plan(self)
+
+    def save(self, file_name:str):
+        """
+        Write the plan to a .npz file.
+        """
+
+        try:
+            with open(file_name, 'wb') as file:
+                np.savez(file, steps=self.steps, 
+                    delta=np.array([self.delta_x, self.delta_y]))
+        except OSError as e:
+            message = 'The exposure plan could not be written:\n\t' + file_name
+            raise NoFileError(message, e)
+
+    @classmethod
+    def load(cls, file_name:str):
+        """
+        Read a plan written by save.
+        Returns:
+            plan : ExposurePlan : plan in the file
+        """
+
+        try:
+            with np.load(file_name) as data:
+                steps = data['steps']
+                delta = data['delta']
+        except OSError as e:
+            message = 'The exposure plan could not be found:\n\t' + file_name
+            raise NoFileError(message, e)
+        except (KeyError, ValueError) as e:
+            message = 'The exposure plan could not be read:\n\t' + file_name
+            raise FileFormatError(message, e)
+        if steps.dtype != PLAN_DTYPE:
+            message = 'The exposure plan has unknown fields:\n\t' + file_name
+            raise FileFormatError(message)
+        return cls(steps, float(delta[0]), float(delta[1]))
+
+    def diff(self, other:'ExposurePlan'):
+        """
+        Compare the exposures of two plans by pixel position.
+        Returns:
+            diff : dict : positions Added, Removed and Changed in other
+        """
+
+        def by_position(steps):
+            return {(int(x), int(y)):index for index, (x, y) in 
+                enumerate(zip(steps['x'], steps['y']))}
+
+        mine = by_position(self.steps)
+        theirs = by_position(other.steps)
+        changed = []
+        for position in mine.keys() & theirs.keys():
+            a = self.steps[mine[position]]
+            b = other.steps[theirs[position]]
+            if (a['pixel'] != b['pixel'] or a['item'] != b['item'] 
+                    or abs(a['power'] - b['power']) >= .05
+                    or abs(a['duration'] - b['duration']) >= .05):
+                changed.append(position)
+        #Same exposures visited in a different order.
+        common = [position for position in map(tuple, 
+            zip(self.steps['x'].tolist(), self.steps['y'].tolist()))
+            if position in theirs]
+        reordered = common != sorted(common, key=lambda p: theirs[p])
+        return {
+            'Added':sorted(theirs.keys() - mine.keys()),
+            'Removed':sorted(mine.keys() - theirs.keys()),
+            'Changed':sorted(changed),
+            'Reordered':reordered
+        }
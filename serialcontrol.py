@@ -10,13 +10,51 @@ Special thanks to Daniel Stolz, Matthew Van Soelen, and Dr. David McGee.
 Read the Program Guide for detailed information about this program.
 """
 
+from contextlib import contextmanager
 import serial
 import time
 
 from exceptions import EquipmentError
+from exceptions import InputError
 from exceptions import ShutterError
 from exceptions import MotorError
 from exceptions import LaserError
+from motionplanning import MotionModel
+from serialsimulator import SIMULATED_PORT
+from serialsimulator import SimulatedPort
+from serialsimulator import VirtualClock
+from serialsimulator import SimulatedDevice
+from serialsimulator import SimulatedMotor
+from serialsimulator import SimulatedShutter
+from serialsimulator import SimulatedLaser
+
+#Ways to know a device has taken a command, see Equipment.wait_ready.
+TRANSPORTS = ('Pause', 'Echo', 'Query')
+#The motor controller does not echo commands.
+MOTOR_TRANSPORTS = ('Pause', 'Query')
+#Ways two axes move together, see Motor.move_xy.
+INTERPOLATIONS = ('None', 'Group')
+
+class SystemClock:
+    """
+    Wall clock used by equipment, a simulator swaps in a virtual one.
+    """
+
+    def now(self):
+        """
+        Read the clock.
+        Returns:
+            now : float : seconds, only differences are meaningful
+        """
+
+        return time.perf_counter()
+
+    def sleep(self, seconds:float):
+        """
+        Halt the program for some seconds.
+        """
+
+        time.sleep(seconds)
 
 class Equipment:
     """
@@ -29,11 +67,28 @@ class Equipment:
         """
 
         #Create a serial object, configure its serial connection and settings.
-        self.ser = serial.Serial()
+        #The simulator port runs a fake device, on the clock in configs if any,
+        #otherwise on a clock of its own.
+        if 'Port' in configs and configs['Port'] == SIMULATED_PORT:
+            self.ser = SimulatedPort(self.simulated_device(), 
+                configs['Clock'] if 'Clock' in configs else VirtualClock())
+            self.clock = self.ser.clock
+        else:
+            self.ser = serial.Serial()
+            self.clock = SystemClock()
         self.configure_serial_port(configs)
         self.default_settings()
         self.configure_settings(configs)
 
+    def simulated_device(self):
+        """
+        Create the device simulated on the simulator port, child should overload.
+        Returns:
+            device : SimulatedDevice : device that ignores every command
+        """
+
+        return SimulatedDevice()
+
     def configure_serial_port(self, configs:dict):
         """
         Set up the configurations of serial port.
@@ -55,6 +110,14 @@ class Equipment:
         """
 
         self.command_pause = .1
+        #How to know a command was taken: a fixed pause, the device's echo of
+        #the command, or the reply to an acknowledge query.
+        self.transport = 'Pause'
+        self.acknowledge_query = None
+        self.acknowledge_timeout = 1.0
+        #Commands collected by batch, None when not batching.
+        self.batched = None
+        self.batch_length = 80
 
     def configure_settings(self, configs:dict):
         """
@@ -64,12 +127,35 @@ class Equipment:
         #Set a pause period after every command is written to prevent errors.
         if 'Command Pause' in configs:
             self.command_pause = float(configs['Command Pause'])
+        if 'Transport' in configs and configs['Transport'].strip() != '':
+            self.transport = configs['Transport'].strip()
+        if ('Acknowledge Query' in configs 
+                and configs['Acknowledge Query'].strip() != ''):
+            self.acknowledge_query = configs['Acknowledge Query'].strip()
+        if 'Acknowledge Timeout' in configs:
+            self.acknowledge_timeout = float(configs['Acknowledge Timeout'])
+        if 'Batch Length' in configs:
+            self.batch_length = int(configs['Batch Length'])
+        if self.transport not in TRANSPORTS:
+            message = 'Unknown serial transport: ' + self.transport
+            advice = 'Use one of: ' + ', '.join(TRANSPORTS)
+            raise EquipmentError(message, None, advice)
+        if self.transport == 'Query' and self.acknowledge_query is None:
+            message = 'The Query transport needs an acknowledge query.'
+            advice = 'Set the Acknowledge Query, or use the Pause transport.'
+            raise EquipmentError(message, None, advice)
 
     def write_command(self, command:str, close_after=False):
         """
         Write a command with/without carriage return and opening of port.
         """
 
+        #Inside batch, hold commands until the block ends, queries flush.
+        if self.batched is not None:
+            if not command.strip().endswith('?'):
+                self.batched.append(command.strip())
+                return
+            self.flush_batch()
         #Check if port is open.
         if not self.ser.is_open:
             self.ser.open()
@@ -83,11 +169,114 @@ class Equipment:
             message = ('Could not write this command to serial device:\n\t'
                 + command)
             raise EquipmentError(message, e)
-        time.sleep(self.command_pause)
+        self.wait_ready(command.strip())
         #Close the port if needed.
         if close_after:
             self.ser.close()
 
+    @contextmanager
+    def batch(self):
+        """
+        Collect the commands written in a with block, then send them joined by
+        ';' in as few lines as the device's line length allows.
+        """
+
+        #Nested batches join the outermost one.
+        if self.batched is not None:
+            yield self
+            return
+        self.batched = []
+        try:
+            yield self
+        except Exception as e:
+            self.batched = None
+            raise e
+        self.flush_batch()
+        self.batched = None
+
+    def flush_batch(self):
+        """
+        Send the commands collected so far by batch.
+        """
+
+        commands = self.batched
+        self.batched = None
+        line = ''
+        for command in commands:
+            if line != '' and len(line) + 1 + len(command) > self.batch_length:
+                self.write_command(line)
+                line = ''
+            line = command if line == '' else line + ';' + command
+        if line != '':
+            self.write_command(line)
+        self.batched = []
+
+    def wait_ready(self, command:str):
+        """
+        Return once the device has taken a command, as set by the transport.
+        """
+
+        if self.transport == 'Pause':
+            #A query returns once its reply is read, within the read timeout.
+            if not command.endswith('?'):
+                self.clock.sleep(self.command_pause)
+        elif self.transport == 'Echo':
+            self.read_echo(command)
+        elif self.transport == 'Query' and not command.endswith('?'):
+            #A query's own reply is its acknowledgement, read by the caller.
+            self.ser.write((self.acknowledge_query + '\r').encode())
+            reply = self.read_reply()
+            if reply == '':
+                message = ('No reply to the acknowledge query after:\n\t' 
+                    + command)
+                advice = 'Check the Acknowledge Query, or use Pause.'
+                raise EquipmentError(message, None, advice)
+            self.check_acknowledgement(command, reply)
+
+    def read_echo(self, command:str):
+        """
+        Read until the device has echoed a command back.
+        """
+
+        deadline = self.clock.now() + self.acknowledge_timeout
+        echoed = ''
+        while command not in echoed:
+            if self.clock.now() > deadline:
+                message = 'The device did not echo this command:\n\t' + command
+                advice = 'Use the Pause transport if the device has no echo.'
+                raise EquipmentError(message, None, advice)
+            echoed += self.ser.read_until(b'\r').decode(errors='replace')
+
+    def read_reply(self):
+        """
+        Read one line replied by the device.
+        Returns:
+            reply : str : the line without its terminator, '' on timeout
+        """
+
+        deadline = self.clock.now() + self.acknowledge_timeout
+        reply = b''
+        while not reply.endswith(b'\n') and self.clock.now() < deadline:
+            reply += self.ser.read_until(b'\n')
+        return reply.decode(errors='replace').strip()
+
+    def check_acknowledgement(self, command:str, reply:str):
+        """
+        Check an acknowledge query's reply, child may overload to find errors.
+        """
+
+        pass
+
+    def query(self, command:str):
+        """
+        Write a query and read its reply.
+        Returns:
+            reply : str : the line replied by the device
+        """
+
+        self.write_command(command)
+        return self.read_reply()
+
 class Shutter(Equipment):
     """
     Control the shutter.
@@ -104,6 +293,15 @@ class Shutter(Equipment):
             advice = 'Ensure the correct serial info was supplied to Shutter.'
             raise ShutterError(e.message, e.exception, advice)
 
+    def simulated_device(self):
+        """
+        Create a simulated shutter.
+        Returns:
+            device : SimulatedShutter : device run on the simulator port
+        """
+
+        return SimulatedShutter()
+
     def default_settings(self):
         """
         Assign default settings for the shutter.
@@ -139,7 +337,7 @@ class Shutter(Equipment):
         """
 
         self.write_command('ens')
-        time.sleep(pause)
+        self.clock.sleep(pause)
         self.write_command('ens')
 
 class Motor(Equipment):
@@ -158,12 +356,34 @@ class Motor(Equipment):
             advice = 'Ensure the correct serial info was supplied to Motor.'
             raise MotorError(e.message, e.exception, advice)
 
+    def simulated_device(self):
+        """
+        Create a simulated motor.
+        Returns:
+            device : SimulatedMotor : device run on the simulator port
+        """
+
+        return SimulatedMotor()
+
     def default_settings(self):
         """
         Assign default settings for the motor.
         """
 
         super().default_settings()
+        #The error buffer query replies once earlier commands are processed.
+        self.acknowledge_query = 'TB?'
+        #Last commanded position of every axis, unknown until moved or homed.
+        self.positions = {}
+        #Tight polling once a move should be about done.
+        self.poll_period = .01
+        self.poll_margin = .05
+        self.model = MotionModel()
+        self.motion_stats = {}
+        #Axes moved by move_xy, and the controller group that joins them.
+        self.xy_axes = (1, 2)
+        self.interpolation = 'None'
+        self.group = 1
 
     def configure_settings(self, configs:dict):
         """
@@ -172,20 +392,60 @@ class Motor(Equipment):
 
         #Call to parent settings configuration.
         super().configure_settings(configs)
+        if self.transport not in MOTOR_TRANSPORTS:
+            message = 'The motor controller does not echo commands.'
+            advice = 'Use one of: ' + ', '.join(MOTOR_TRANSPORTS)
+            raise InputError(message, None, advice)
+        #Moves are predicted from the same velocity and accelerations.
+        try:
+            self.model = MotionModel(configs)
+            if 'Poll Period' in configs:
+                self.poll_period = float(configs['Poll Period'])
+            if 'Poll Margin' in configs:
+                self.poll_margin = float(configs['Poll Margin'])
+        except InputError as e:
+            raise MotorError(e.message, e.exception, e.advice)
+        except ValueError as e:
+            message = 'The motor poll period and margin must be floating points.'
+            raise MotorError(message, e)
         #Configure for every axis provided inthe tuple of axes.
         if 'Axes' not in configs:
             message = 'Axes were not specified in the configurations for motor.'
             advice = 'Specify the axes: ex (1,2)'
             raise EquipmentError(message, None, advice)
-        for axis in configs['Axes']:
-            #Set the configurations for the motor.
-            self.write_command(str(axis)+'MO')
-            if 'Velocity' in configs:
-                self.write_command(str(axis)+'VA'+str(configs['Velocity']))
-            if 'Acceleration' in configs:
-                self.write_command(str(axis)+'AC'+str(configs['Acceleration']))
-            if 'Decceleration' in configs:
-                self.write_command(str(axis)+'AG'+str(configs['Decceleration']))
+        if 'Interpolation' in configs:
+            self.interpolation = configs['Interpolation'].strip()
+        if self.interpolation not in INTERPOLATIONS:
+            message = 'The motor interpolation is unknown: ' + self.interpolation
+            advice = 'Use one of: ' + ', '.join(INTERPOLATIONS)
+            raise MotorError(message, None, advice)
+        with self.batch():
+            for axis in configs['Axes']:
+                #Set the configurations for the motor.
+                self.write_command(str(axis)+'MO')
+                if 'Velocity' in configs:
+                    self.write_command(str(axis)+'VA'+str(configs['Velocity']))
+                if 'Acceleration' in configs:
+                    self.write_command(str(axis)+'AC'+str(configs['Acceleration']))
+                if 'Decceleration' in configs:
+                    self.write_command(str(axis)+'AG'+str(configs['Decceleration']))
+            if self.interpolation == 'Group':
+                self.configure_group(configs)
+
+    def configure_group(self, configs:dict):
+        """
+        Join the x and y axes in a controller group for linear moves.
+        """
+
+        group = str(self.group)
+        self.write_command(group+'HN'+','.join(str(a) for a in self.xy_axes))
+        if 'Velocity' in configs:
+            self.write_command(group+'HV'+str(configs['Velocity']))
+        if 'Acceleration' in configs:
+            self.write_command(group+'HA'+str(configs['Acceleration']))
+        if 'Decceleration' in configs:
+            self.write_command(group+'HD'+str(configs['Decceleration']))
+        self.write_command(group+'HO')
                     
     def write_command(self, command:str, close_after=False):
         """
@@ -198,39 +458,204 @@ class Motor(Equipment):
             advice = 'Read the manual for the Motor.'
             raise MotorError(e.message, e.exception, advice)
 
-    def wait_motion_done(self, axis:int):
+    def check_acknowledgement(self, command:str, reply:str):
         """
-        Halt the program until all motion is complete, checking every WAIT.
+        Raise the controller's error, if the error buffer reported one.
+        """
+
+        code = reply.split(',')[0].strip()
+        if code.isdigit() and int(code) != 0:
+            message = ('The motor controller reported an error after:\n\t'
+                + command + '\n\t' + reply)
+            raise MotorError(message, None, 'Read the manual for the Motor.')
+
+    def motion_done(self, axis:int):
+        """
+        Ask the controller once whether an axis has stopped.
+        Returns:
+            done : bool : True if the axis reported motion done
+        """
+
+        return '1' in self.query(str(axis)+'MD?')
+
+    def wait_motion_done(self, axis:int, predicted:float=None, 
+        started:float=None):
+        """
+        Halt the program until all motion is complete. Without a prediction 
+        check every WAIT, otherwise sleep until just before the move should end 
+        and then check every poll period.
         """
 
         WAIT = .25
-        while True:
-            self.write_command(str(axis)+'MD?')
-            byte_info = self.ser.read(4)
-            try:
-                str_info = str(byte_info.decode())
-                if '1' in str_info:
-                    return
-                else:
-                    time.sleep(WAIT)
-            except Exception:
-                pass
+        if predicted is None or started is None:
+            while not self.motion_done(axis):
+                self.clock.sleep(WAIT)
+            return
+        expected = predicted * self.motion_correction(axis)
+        remaining = started + expected - self.poll_margin - self.clock.now()
+        if remaining > 0:
+            self.clock.sleep(remaining)
+        while not self.motion_done(axis):
+            self.clock.sleep(self.poll_period)
+        actual = self.clock.now() - started
+        self.record_motion(axis, predicted, actual)
+
+    def motion_correction(self, axis:int):
+        """
+        Ratio of actual to predicted move time seen so far on an axis.
+        Returns:
+            correction : float : 1 until moves have been recorded
+        """
+
+        if axis not in self.motion_stats:
+            return 1.0
+        return self.motion_stats[axis]['Correction']
+
+    def record_motion(self, axis:int, predicted:float, actual:float):
+        """
+        Add a finished move to the statistics of its axis.
+        """
+
+        stats = self.motion_stats.setdefault(axis, {'Moves':0, 
+            'Predicted':0.0, 'Actual':0.0, 'Correction':1.0})
+        stats['Moves'] += 1
+        stats['Predicted'] += predicted
+        stats['Actual'] += actual
+        #Very short moves say little about the ratio.
+        if predicted > self.poll_period:
+            ratio = max(actual, 0) / predicted
+            stats['Correction'] = .8 * stats['Correction'] + .2 * ratio
 
     def move_absolute(self, axis:int, go_to_position:float):
         """
         Move any axis to an absolute position.
         """
 
-        self.write_command(str(axis)+'PA'+str(go_to_position))
-        self.wait_motion_done(axis)
+        self.move_absolute_async(axis, go_to_position).wait()
+
+    def move_absolute_async(self, axis:int, go_to_position:float):
+        """
+        Start moving any axis to an absolute position without waiting.
+        Returns:
+            handle : MotionHandle : wait on it before relying on the position
+        """
+
+        return self.move_absolute_batch({axis:go_to_position})[0]
+
+    def move_absolute_batch(self, positions:dict):
+        """
+        Start moving several axes to absolute positions with one write.
+        Returns:
+            handles : list : a MotionHandle for every axis, in order
+        """
+
+        handles = []
+        started = self.clock.now()
+        with self.batch():
+            for axis, go_to_position in positions.items():
+                predicted = None
+                if axis in self.positions:
+                    distance = abs(go_to_position - self.positions[axis])
+                    predicted = float(self.model.move_time(distance))
+                self.write_command(str(axis)+'PA'+str(go_to_position))
+                self.positions[axis] = go_to_position
+                handles.append(MotionHandle(self, axis, predicted, started))
+        return handles
+
+    def move_xy(self, x_position:float=None, y_position:float=None):
+        """
+        Move the x and y axes together, an axis given None stays put.
+        """
+
+        for handle in self.move_xy_async(x_position, y_position):
+            handle.wait()
+
+    def move_xy_async(self, x_position:float=None, y_position:float=None):
+        """
+        Start the x and y axes together without waiting, as one linear group 
+        move if the controller group is on.
+        Returns:
+            handles : list : a MotionHandle for every axis that moves
+        """
+
+        axis_x, axis_y = self.xy_axes
+        if x_position is None or y_position is None or self.interpolation != 'Group':
+            positions = {}
+            if x_position is not None:
+                positions[axis_x] = x_position
+            if y_position is not None:
+                positions[axis_y] = y_position
+            return self.move_absolute_batch(positions)
+        #The group moves along the diagonal, both axes end together.
+        predicted = None
+        if axis_x in self.positions and axis_y in self.positions:
+            distance = ((x_position - self.positions[axis_x])**2 
+                + (y_position - self.positions[axis_y])**2)**.5
+            predicted = float(self.model.move_time(distance))
+        started = self.clock.now()
+        self.write_command(str(self.group)+'HL'+str(x_position)+','
+            +str(y_position))
+        self.positions[axis_x] = x_position
+        self.positions[axis_y] = y_position
+        return [MotionHandle(self, axis_x, predicted, started), 
+            MotionHandle(self, axis_y, predicted, started)]
 
     def move_home(self, axis:int):
         """
         Move the motor to the home position.
         """
 
-        self.write_command(str(axis)+'OR0')
-        self.wait_motion_done(axis)
+        self.move_home_all((axis,))
+
+    def move_home_all(self, axes:tuple):
+        """
+        Home several axes together with one write.
+        """
+
+        with self.batch():
+            for axis in axes:
+                self.write_command(str(axis)+'OR0')
+        for axis in axes:
+            self.wait_motion_done(axis)
+            self.positions[axis] = 0
+
+class MotionHandle:
+    """
+    Motion of one axis started by Motor.move_absolute_async or move_xy_async.
+    """
+
+    def __init__(self, motor:Motor, axis:int, predicted:float=None, 
+        started:float=None):
+        """
+        Create a handle on motion that has already been commanded.
+        """
+
+        self.motor = motor
+        self.axis = axis
+        self.predicted = predicted
+        self.started = started
+        self.done = False
+
+    def is_done(self):
+        """
+        Check, without waiting, whether the motion has finished.
+        Returns:
+            done : bool : True once the axis reported motion done
+        """
+
+        if not self.done:
+            self.done = self.motor.motion_done(self.axis)
+        return self.done
+
+    def wait(self):
+        """
+        Halt the program until the motion has finished.
+        """
+
+        if not self.done:
+            self.motor.wait_motion_done(self.axis, self.predicted, 
+                self.started)
+            self.done = True
 
 class Laser(Equipment):
     """
@@ -248,6 +673,15 @@ class Laser(Equipment):
             advice = 'Ensure the correct serial info was supplied to Shutter.'
             raise LaserError(e.message, e.exception, advice)
 
+    def simulated_device(self):
+        """
+        Create a simulated laser.
+        Returns:
+            device : SimulatedLaser : device run on the simulator port
+        """
+
+        return SimulatedLaser()
+
     def default_settings(self):
         """
         Assign default settings for the laser.
@@ -303,7 +737,7 @@ class Laser(Equipment):
             raise LaserError(message)
         else:
             self.write_command('P='+str(new_power))
-        time.sleep(self.power_change_pause)
+        self.clock.sleep(self.power_change_pause)
 
 
 
@@ -0,0 +1,410 @@
+"""
+Simulate the motor, shutter and laser serial devices without the bench.
+
+@author: agent
+@date: October 2026
+@copyright: Copyright 2020, Luke Kurlandski, all rights reserved
+
+Special thanks to Daniel Stolz, Luke Kurlandski, Matthew Van Soelen, and Dr. David McGee.
+
+Read the Program Guide for detailed information about this program.
+"""
+
+from motionplanning import MotionModel
+
+#Serial port name that swaps a simulated device in for the real one.
+SIMULATED_PORT = 'Simulator'
+
+class VirtualClock:
+    """
+    Clock that only advances when slept on, so runs take no real time.
+    """
+
+    def __init__(self, start:float=0.0):
+        """
+        Create a clock reading start seconds.
+        """
+
+        self.elapsed = start
+
+    def now(self):
+        """
+        Read the clock.
+        Returns:
+            now : float : seconds since the clock started
+        """
+
+        return self.elapsed
+
+    def sleep(self, seconds:float):
+        """
+        Advance the clock, negative sleeps are ignored like time.sleep's zero.
+        """
+
+        if seconds > 0:
+            self.elapsed += seconds
+
+class SimulatedPort:
+    """
+    Stand in for serial.Serial, feeding written lines to a simulated device.
+    """
+
+    def __init__(self, device:'SimulatedDevice', clock:VirtualClock):
+        """
+        Create a closed port on a device, settings are set like serial.Serial.
+        Devices of one run should share a clock so they stay in step.
+        """
+
+        self.device = device
+        self.clock = clock
+        self.device.clock = self.clock
+        self.port = SIMULATED_PORT
+        self.baudrate = 19200
+        self.timeout = .1
+        self.stopbits = 1
+        self.bytesize = 8
+        self.parity = 'N'
+        self.is_open = False
+        self.buffer = b''
+        #Every line written, for inspecting a run afterwards.
+        self.written = []
+
+    def open(self):
+        """
+        Open the port.
+        """
+
+        self.is_open = True
+
+    def close(self):
+        """
+        Close the port.
+        """
+
+        self.is_open = False
+
+    def transfer_time(self, count:int):
+        """
+        Time to send bytes at the port's baudrate, with start and stop bits.
+        Returns:
+            seconds : float : time on the wire
+        """
+
+        return count * (float(self.bytesize) + 1 + float(self.stopbits)) / float(
+            self.baudrate)
+
+    def write(self, data:bytes):
+        """
+        Send a line to the device, commands joined by ';' run in order.
+        Returns:
+            count : int : bytes written
+        """
+
+        if not self.is_open:
+            raise IOError('Attempting to write to a closed simulated port.')
+        self.clock.sleep(self.transfer_time(len(data)))
+        line = data.decode(errors='replace').strip()
+        self.written.append(line)
+        if self.device.echo:
+            self.buffer += (line + '\r').encode()
+        for command in line.split(';'):
+            if command.strip() == '':
+                continue
+            reply = self.device.handle(command.strip())
+            if reply is not None:
+                self.buffer += (reply + '\r\n').encode()
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        """
+        Bytes replied by the device and not read yet.
+        """
+
+        return len(self.buffer)
+
+    def read_until(self, expected:bytes=b'\n', size:int=None):
+        """
+        Read through expected, or what there is after waiting the timeout.
+        Returns:
+            data : bytes : data read, b'' if the device replied nothing
+        """
+
+        end = self.buffer.find(expected)
+        if end == -1:
+            #Nothing more is coming, the read times out.
+            self.clock.sleep(self.timeout)
+            data, self.buffer = self.buffer, b''
+        else:
+            end += len(expected)
+            data, self.buffer = self.buffer[:end], self.buffer[end:]
+        self.clock.sleep(self.transfer_time(len(data)))
+        return data
+
+    def reset_input_buffer(self):
+        """
+        Drop replies that were not read.
+        """
+
+        self.buffer = b''
+
+class SimulatedDevice:
+    """
+    Device behind a SimulatedPort, child should overload handle.
+    """
+
+    #Whether the device writes each command back before any reply.
+    echo = False
+
+    def __init__(self):
+        """
+        Create a device, its clock is set by the port it is attached to.
+        """
+
+        self.clock = None
+        #Every command handled, with the time it was handled at.
+        self.log = []
+
+    def handle(self, command:str):
+        """
+        Run one command.
+        Returns:
+            reply : str : line to reply with, None for no reply
+        """
+
+        self.log.append((self.clock.now(), command))
+        return None
+
+class SimulatedAxis:
+    """
+    One motor axis, moving with a trapezoid profile from its own settings.
+    """
+
+    def __init__(self):
+        """
+        Create an axis resting at zero.
+        """
+
+        self.configs = {}
+        self.model = MotionModel()
+        self.origin = 0.0
+        self.target = 0.0
+        self.start = 0.0
+        self.end = 0.0
+        self.powered = False
+
+    def set(self, key:str, value:str):
+        """
+        Change the velocity, acceleration or decceleration of later moves.
+        """
+
+        self.configs[key] = value
+        self.model = MotionModel(self.configs)
+
+    def move(self, now:float, target:float, duration:float=None):
+        """
+        Start a move from where the axis is now, a duration overrides the profile.
+        """
+
+        self.origin = self.where(now)
+        self.target = target
+        self.start = now
+        if duration is None:
+            duration = float(self.model.move_time(target - self.origin))
+        self.end = now + duration
+
+    def where(self, now:float):
+        """
+        Position of the axis, interpolated during a move.
+        Returns:
+            position : float : mm
+        """
+
+        if now >= self.end:
+            return self.target
+        fraction = (now - self.start) / (self.end - self.start)
+        return self.origin + (self.target - self.origin) * fraction
+
+class SimulatedMotor(SimulatedDevice):
+    """
+    Motion controller answering MD?, TP? and TB?, moving on PA, OR and HL.
+    """
+
+    #Seconds an axis spends finding its home switch after reaching zero.
+    HOME_SEARCH = .5
+
+    def __init__(self, axes:tuple=(1, 2, 3)):
+        """
+        Create a controller with powered off axes and an empty error buffer.
+        """
+
+        super().__init__()
+        self.axes = {axis:SimulatedAxis() for axis in axes}
+        self.errors = []
+        self.groups = {}
+
+    def handle(self, command:str):
+        """
+        Run one controller command of the form <axis><code><value>.
+        Returns:
+            reply : str : line to reply with, None for no reply
+        """
+
+        super().handle(command)
+        now = self.clock.now()
+        digits = 0
+        while digits < len(command) and command[digits].isdigit():
+            digits += 1
+        code = command[digits:digits+2].upper()
+        value = command[digits+2:].strip()
+        if code == 'TB':
+            if len(self.errors) == 0:
+                return '0, ' + str(int(now*1000)) + ', NO ERROR DETECTED'
+            return self.errors.pop(0)
+        try:
+            number = int(command[:digits]) if digits > 0 else 0
+            if code.startswith('H'):
+                return self.handle_group(number, code, value, now)
+            axis = self.axes[number]
+            if code == 'MD' and value == '?':
+                return '1' if now >= axis.end else '0'
+            if code == 'TP' and value == '?':
+                return '%.6f' % axis.where(now)
+            if code == 'MO':
+                axis.powered = True
+            elif code == 'MF':
+                axis.powered = False
+            elif code == 'VA':
+                axis.set('Velocity', value)
+            elif code == 'AC':
+                axis.set('Acceleration', value)
+            elif code == 'AG':
+                axis.set('Decceleration', value)
+            elif code == 'PA':
+                axis.move(now, float(value))
+            elif code == 'PR':
+                axis.move(now, axis.where(now) + float(value))
+            elif code == 'OR':
+                moving = float(axis.model.move_time(axis.where(now)))
+                axis.move(now, 0.0, moving + self.HOME_SEARCH)
+            else:
+                self.add_error(number, 6, 'COMMAND DOES NOT EXIST')
+        except (KeyError, ValueError):
+            self.add_error(number, 7, 'PARAMETER OUT OF RANGE')
+        return None
+
+    def handle_group(self, group:int, code:str, value:str, now:float):
+        """
+        Run a group command: HN create, HV/HA/HD settings, HO on, HL line.
+        Returns:
+            reply : str : always None, group commands do not reply
+        """
+
+        if code == 'HN':
+            axes = tuple(int(axis) for axis in value.split(','))
+            if any(axis not in self.axes for axis in axes):
+                raise KeyError(value)
+            self.groups[group] = {'Axes':axes, 'Configs':{}, 'On':False}
+            return None
+        settings = self.groups[group]
+        if code in ('HV', 'HA', 'HD'):
+            key = {'HV':'Velocity', 'HA':'Acceleration',
+                'HD':'Decceleration'}[code]
+            settings['Configs'][key] = value
+        elif code == 'HO':
+            settings['On'] = True
+        elif code == 'HF':
+            settings['On'] = False
+        elif code == 'HL' and settings['On']:
+            targets = [float(target) for target in value.split(',')]
+            axes = [self.axes[axis] for axis in settings['Axes']]
+            distance = sum((target - axis.where(now))**2
+                for axis, target in zip(axes, targets))**.5
+            duration = float(MotionModel(settings['Configs']).move_time(distance))
+            #Every axis of the line starts and stops together.
+            for axis, target in zip(axes, targets):
+                axis.move(now, target, duration)
+        else:
+            self.add_error(group, 6, 'COMMAND DOES NOT EXIST')
+        return None
+
+    def add_error(self, axis:int, code:int, text:str):
+        """
+        Queue an error for TB?, codes are offset by 100 per axis.
+        """
+
+        self.errors.append(str(axis*100 + code) + ', '
+            + str(int(self.clock.now()*1000)) + ', ' + text)
+
+class SimulatedShutter(SimulatedDevice):
+    """
+    Shutter controller that opens and closes on ens and echoes commands.
+    """
+
+    echo = True
+
+    def __init__(self):
+        """
+        Create a closed shutter.
+        """
+
+        super().__init__()
+        self.open = False
+        self.opened_at = None
+        self.mode = None
+        #Start and end of every exposure.
+        self.exposures = []
+
+    def handle(self, command:str):
+        """
+        Run one command, ens toggles the shutter.
+        Returns:
+            reply : str : always None
+        """
+
+        super().handle(command)
+        if command == 'ens':
+            now = self.clock.now()
+            if self.open:
+                self.exposures.append((self.opened_at, now))
+            else:
+                self.opened_at = now
+            self.open = not self.open
+        elif command.startswith('mode='):
+            self.mode = command[5:]
+        return None
+
+class SimulatedLaser(SimulatedDevice):
+    """
+    Laser that takes P= power and L= on/off commands and echoes commands.
+    """
+
+    echo = True
+
+    def __init__(self):
+        """
+        Create a laser that is off at zero power.
+        """
+
+        super().__init__()
+        self.on = False
+        self.power = 0.0
+        #Time and power of every power change.
+        self.powers = []
+
+    def handle(self, command:str):
+        """
+        Run one command.
+        Returns:
+            reply : str : the power for ?P, otherwise None
+        """
+
+        super().handle(command)
+        if command.startswith('P='):
+            self.power = float(command[2:])
+            self.powers.append((self.clock.now(), self.power))
+        elif command.startswith('L='):
+            self.on = command[2:].strip() == '1'
+        elif command == '?P':
+            return str(self.power)
+        return None
@@ -18,10 +18,12 @@ import time
 import threading
 import numpy as np
 import ntpath
+import os
 
 from serialcontrol import Motor
 from serialcontrol import Shutter
 from serialcontrol import Laser
+from serialsimulator import VirtualClock
 from exceptions import InputError
 from exceptions import FileFormatError
 from exceptions import NoFileError
@@ -31,7 +33,12 @@ from exceptions import EquipmentError
 from exceptions import UserInterruptError
 
 from hologramcreator import HologramCreator
+import experimentfile
+import mappings
 from imageprocessing import MyImage
+from motionplanning import MotionModel
+from motionplanning import SCAN_STRATEGIES
+from motionplanning import ExposurePlan
 
 class SingleImage(HologramCreator):
 
@@ -48,6 +55,8 @@ class SingleImage(HologramCreator):
             'Frames Horizontal':5
         }
         super().__init__(root, window_configs)
+        #Exposure plan, compiled by Process and Save.
+        self.plan = None
         #Apply some frame modifications for large wigits.
         self.frames[0][1].grid(row=0, column=1, pady=10, rowspan=200, columnspan=200, sticky='NW')
         self.frames[1][1].grid(row=1, column=1, pady=10, rowspan=200, columnspan=200, sticky='W')
@@ -85,7 +94,8 @@ class SingleImage(HologramCreator):
                 'Experiments/Previous Experiment.txt'),
             'Open Example':lambda:self.open_experiment(
                 'Experiments/Example Experiment.txt'),
-            'Clear Inputs':self.clear_experiment
+            'Clear Inputs':self.clear_experiment,
+            'Save Plan':self.save_plan
         }
         submenu_serial = {
             'Motor':lambda:self.set_serial_configs({'Serial Name':'Motor',
@@ -245,21 +255,7 @@ class SingleImage(HologramCreator):
         Get the equipment data from equipment files.
         """
         
-        settings = super().read_file('Equipment/'+equipment+' Settings.txt')
-        serial = super().read_file('Equipment/'+equipment+' Serial.txt')
-        configs_old = {**serial, **settings}
-        configs_new = {}
-        try:
-            for old_key in configs_old.keys():
-                new_key = old_key.replace(equipment, '').replace('Serial', '').lstrip()
-                configs_new[new_key] = configs_old[old_key]
-            return configs_new
-        except Exception as e:
-            message = ('An error occurred processing data from ' + equipment +
-                ' files:\n\tEquipment/' + equipment + ' Settings.txt\n\t'
-                    'Equipment/' + equipment + ' Motor Serial.txt')
-            advice = 'Delete these files.'
-            raise FileFormatError(message, e, advice)
+        return experimentfile.read_equipment_data(equipment)
 
     def collect_raw_data(self):
         """
@@ -309,6 +305,10 @@ class SingleImage(HologramCreator):
             message = 'Vertical Pixels must be an int.'
             raise InputError(message, e)
         self.cropping = self.entry_crop.get().strip()
+        self.scan_strategy = self.scan_var.get()
+        if self.scan_strategy not in SCAN_STRATEGIES:
+            message = 'Unknown scan strategy: ' + self.scan_strategy
+            raise InputError(message)
         self.strings_exposure = self.text_exposure.get(1.0, 'end-1c').strip()
         self.strings_ignore = self.text_ignore.get(1.0, 'end-1c').strip()
         self.strings_laser = self.text_laser.get(1.0, 'end-1c').strip()
@@ -330,6 +330,7 @@ class SingleImage(HologramCreator):
             'Pixels Horizontal':self.pixels_x, 
             'Pixels Vertical':self.pixels_y,
             'Cropping' :self.cropping,
+            'Scan Strategy':self.scan_strategy,
             'Strings Exposure':self.strings_exposure,
             'Strings Ignore':self.strings_ignore,
             'Strings Laser':self.strings_laser,
@@ -366,54 +367,71 @@ class SingleImage(HologramCreator):
         """
 
         #Modify the image and display.
-        self.image.downsize_image((self.pixels_x, self.pixels_y))
-        self.image.crop_image(self.cropping)
+        self.image.reset_transforms()
+        self.image.add_grayscale()
+        self.image.add_resize((self.pixels_x, self.pixels_y))
+        self.image.add_crop(self.cropping)
+        self.image.apply_transforms()
         super().insert_image_array(self.image, self.text_array)
         self.label_imagemod.configure(image=self.image.modified_tkinter)
         #Process other data into mappings of pixel values and delta distances.
+        gradient_range = mappings.gradient_range(self.image.array_view())
         configs_timing = {
             'Input Exposure':self.strings_exposure,
             'Input Ignore':self.strings_ignore,
-            'Gradient Range':256
+            'Gradient Range':gradient_range
         }
         configs_laser = {
             'Input Laser':self.strings_laser,
-            'Gradient Range':256
+            'Gradient Range':gradient_range
         }
         self.map_timing = super().map_timing(configs_timing)
         self.map_laser_power = super().map_laser_power(configs_laser)
         self.delta_x = self.hologram_width / self.pixels_x
         self.delta_y = self.hologram_height / self.pixels_y
+        #Compile every exposure up front, the runner only executes the plan.
+        self.plan = super().order_plan(ExposurePlan.compile(
+            self.image.array_view(), self.map_timing, self.map_laser_power, 
+            self.delta_x, self.delta_y))
         dpi = self.image.modified_PIL.width / (39.37 * self.hologram_width)
         self.label_dpi.configure(text='Image Resolution (dpi): '+str(int(dpi)))
     
+    def save_plan(self):
+        """
+        Save the compiled exposure plan, offered next to the experiment file.
+        """
+
+        if self.plan is None:
+            message = 'There is no exposure plan to save.'
+            advice = 'Process and Save the experiment first.'
+            super().error_window(MissingDataError(message, None, advice))
+            return
+        base = os.path.splitext(self.file_experiment)[0]
+        file_name = filedialog.asksaveasfilename(defaultextension='.npz',
+            initialdir=os.path.dirname(base), 
+                initialfile=os.path.basename(base) + ' Plan.npz',
+                    title='Save Exposure Plan', 
+                        filetypes=(("npz files","*.npz"),("All Files","*.*")))
+        if not file_name:
+            return
+        try:
+            self.plan.save(file_name)
+        except NoFileError as e:
+            super().error_window(e)
+
     def run_time(self):
         """
-        Generate a rough runtime estimation and display on window.
+        Estimate the runtime with the motion model and display on window.
         """
         
-        run_time = 0
-        y_after_crop = self.image.modified_PIL.height
-        x_after_crop = self.image.modified_PIL.width
-        image_as_array = np.transpose(self.image.modified_array)
-        #Loop through every potential grating on hologram
-        for i in range (0, y_after_crop):
-            visited_row = False
-            farthest_x = 0
-            #Calculate exposure time
-            for j in range (0, x_after_crop):
-                add = self.map_timing[image_as_array[j][i]]
-                if add != 0:
-                    visited_row = True
-                    farthest_x = j
-                    run_time += add
-            #Calculate travel time in x direction
-            if visited_row == True:
-                run_time += ((farthest_x / x_after_crop) * self.hologram_width / .001)
-        #Calculate travel time in y direction
-        run_time += self.hologram_height / .001
+        try:
+            model = MotionModel(super().collect_motion_configs())
+        except InputError as e:
+            super().error_window(e)
+            return
+        estimate = self.plan.estimate(model)
         #Print on Main Window.
-        end_time = (datetime.now() + timedelta(seconds=run_time)).strftime('%H:%M:%S -- %d/%m/%Y')
+        end_time = (datetime.now() + timedelta(seconds=estimate['Total'])).strftime('%H:%M:%S -- %d/%m/%Y')
         self.label_est_time.configure(text='End Time Estimate: '+end_time)
     
     def generate_plot(self):
@@ -505,15 +523,16 @@ class SingleImage(HologramCreator):
         
         #Create the objects amd store in a list.
         self.equipment = []
-        self.motor = Motor({**self.equipment_configs_motor,**{'Axes':(1,2)}})
+        #Simulated equipment of one run shares a virtual clock.
+        clock = {'Clock':VirtualClock()}
+        self.motor = Motor({**self.equipment_configs_motor,**{'Axes':(1,2)},**clock})
         self.equipment.append(self.motor)
-        self.shutter = Shutter(self.equipment_configs_shutter)
+        self.shutter = Shutter({**self.equipment_configs_shutter,**clock})
         self.equipment.append(self.shutter)
-        self.laser = Laser(self.equipment_configs_laser)
+        self.laser = Laser({**self.equipment_configs_laser,**clock})
         self.equipment.append(self.laser)
         #Initialize to start positions.
-        self.motor.move_home(1) 
-        self.motor.move_home(2) 
+        self.motor.move_home_all((1,2)) 
         self.laser.turn_on_off(True)
 
     def movement(self):
@@ -521,35 +540,29 @@ class SingleImage(HologramCreator):
         Conduct the physical movement of machinery and such.
         """
 
-        #Move through the image array, expose according to mappings.
-        prev_pix = None
+        #Execute the compiled plan, moving an axis only when it changes.
+        prev_x = None
+        prev_y = None
         prev_powr = None
-        y_after_crop = self.image.modified_PIL.height
-        x_after_crop = self.image.modified_PIL.width
-        image_as_array = np.transpose(self.image.modified_array)
-        for i in range(0, y_after_crop):
-            on_this_row = False 
-            for j in range(0, x_after_crop):
-                self.check_pause_abort()
-                pix = image_as_array[j][i]
-                time = self.map_timing[pix]
-                powr = self.map_laser_power[pix]
-                #Enter conditional if the current pixel should be exposed.
-                if not super().compare_floats(time, 0):
-                    self.update_progress(pix,time,powr,i,j)
-                    #Change the laser's power if the pixel value has changed.
-                    if prev_pix is not None and prev_powr is not None:
-                        if not super().compare_floats(powr, prev_powr):
-                            self.laser.change_power(powr)
-                    #Move motors to the correct positions and open shutter.
-                    if not on_this_row:
-                        self.motor.move_absolute(2, i*self.delta_y*1000) 
-                        on_this_row = True
-                    self.motor.move_absolute(1, j*self.delta_x*1000) 
-                    self.shutter.toggle(time)
-                    #Update previous pixel info to current pixel info
-                    prev_pix = pix
-                    prev_powr = powr
+        for x, y, pix, powr, time, item in self.plan.steps.tolist():
+            self.check_pause_abort()
+            #Start both axes together, then set up the exposure while they travel.
+            handles = self.motor.move_xy_async(
+                x*self.delta_x*1000 if x != prev_x else None,
+                y*self.delta_y*1000 if y != prev_y else None)
+            self.update_progress(pix,time,powr,y,x)
+            #Change the laser's power if it differs from the last exposure.
+            if prev_powr is not None:
+                if not super().compare_floats(powr, prev_powr):
+                    self.laser.change_power(powr)
+            #Finish moving the motors, only then open the shutter.
+            for handle in handles:
+                handle.wait()
+            self.shutter.toggle(time)
+            #Update previous exposure info to current exposure info
+            prev_x = x
+            prev_y = y
+            prev_powr = powr
 
     def check_pause_abort(self):
         """
@@ -635,6 +648,7 @@ class SingleImage(HologramCreator):
             self.text_ignore,
             self.text_laser
         ]
+        self.scan_var.set('Raster')
         super().clear_wigits(wigits)
         
     def populate_main(self, datas:dict):
@@ -655,6 +669,8 @@ class SingleImage(HologramCreator):
             self.entry_pixel_y.insert(1, datas['Pixels Vertical'])
         if 'Cropping' in datas:
             self.entry_crop.insert(1, datas['Cropping'])
+        if 'Scan Strategy' in datas:
+            self.scan_var.set(datas['Scan Strategy'])
         if 'Strings Exposure' in datas:
             self.text_exposure.insert(1.0, datas['Strings Exposure'])
         if 'Strings Ignore' in datas:
@@ -0,0 +1,166 @@
+"""
+Describe the spatial light modulator that gratings are displayed on.
+
+@author: agent
+@date: October 2026
+@copyright: Copyright 2020, Luke Kurlandski, all rights reserved
+
+Special thanks to Daniel Stolz, Luke Kurlandski, Matthew Van Soelen, and Dr. David McGee.
+
+Read the Program Guide for detailed information about this program.
+"""
+
+from PIL import Image
+import hashlib
+import numpy as np
+
+from exceptions import InputError
+from exceptions import NoFileError
+from exceptions import FileFormatError
+
+#How levels above 8 bits are sent to the SLM monitor, see display_image.
+DISPLAY_ENCODINGS = ('Gray', 'Packed')
+
+class SLMProfile:
+    """
+    Resolution, bit depth and phase LUT of an SLM, shared by gratings and the 
+    SLM window.
+    """
+
+    def __init__(self, configs:dict=None):
+        """
+        Create a profile, defaults describe the original 1920x1152 8 bit SLM.
+        """
+
+        configs = {} if configs is None else configs
+        try:
+            self.width = int(configs['Width']) if 'Width' in configs else 1920
+            self.height = int(configs['Height']) if 'Height' in configs else 1152
+            self.bit_depth = (int(configs['Bit Depth']) if 'Bit Depth'
+                in configs else 8)
+        except ValueError as e:
+            message = 'SLM width, height and bit depth must be ints.'
+            raise InputError(message, e)
+        if self.width <= 0 or self.height <= 0 or not 1 <= self.bit_depth <= 16:
+            message = 'The SLM resolution or bit depth is invalid.'
+            advice = 'Use a positive resolution and a bit depth from 1 to 16.'
+            raise InputError(message, None, advice)
+        #High bit depths are shown as the top 8 bits, or packed into red/green.
+        self.display_encoding = (configs['Display Encoding'].strip() if
+            'Display Encoding' in configs else '')
+        if self.display_encoding == '':
+            self.display_encoding = 'Gray'
+        if self.display_encoding not in DISPLAY_ENCODINGS:
+            message = 'Unknown SLM display encoding: ' + self.display_encoding
+            advice = 'Use one of: ' + ', '.join(DISPLAY_ENCODINGS)
+            raise InputError(message, None, advice)
+        self.max_level = 2**self.bit_depth - 1
+        self.dtype = np.uint8 if self.bit_depth <= 8 else np.uint16
+        #Wavelength specific gray level to phase correction, None is identity.
+        self.lut = None
+        self.lut_digest = None
+        if 'LUT File' in configs and configs['LUT File'].strip() != '':
+            self.load_lut(configs['LUT File'].strip())
+
+    def key(self):
+        """
+        Describe everything about the profile that changes a grating's pixels.
+        Returns:
+            key : tuple : hashable description of the profile
+        """
+
+        return (self.width, self.height, self.bit_depth)
+
+    def load_lut(self, file_name:str):
+        """
+        Load a phase LUT of 256 or 1024 entries from a .npy or text file.
+        """
+
+        #Text files hold one value per line, or 'index value' pairs.
+        try:
+            if file_name.endswith('.npy'):
+                values = np.load(file_name).ravel()
+            else:
+                with open(file_name, 'r') as file:
+                    rows = [line.replace(',', ' ').split() for line in file
+                        if line.strip() != '']
+                values = np.array([float(row[-1]) for row in rows])
+        except (FileNotFoundError, IOError) as e:
+            message = 'The phase LUT could not be found:\n\t' + file_name
+            raise NoFileError(message, e)
+        except ValueError as e:
+            message = 'The phase LUT could not be read:\n\t' + file_name
+            advice = 'Write one value, or an index and a value, per line.'
+            raise FileFormatError(message, e, advice)
+        if len(values) not in (256, 1024, 2**self.bit_depth):
+            message = ('The phase LUT has ' + str(len(values)) 
+                + ' entries:\n\t' + file_name)
+            advice = 'Use 256 or 1024 entries, or one per SLM level.'
+            raise FileFormatError(message, None, advice)
+        if values.min() < 0 or values.max() > self.max_level:
+            message = 'The phase LUT has levels the SLM cannot show.'
+            advice = 'Keep values from 0 to ' + str(self.max_level) + '.'
+            raise FileFormatError(message, None, advice)
+        self.lut = np.round(values).astype(self.dtype)
+        self.lut.setflags(write=False)
+        self.lut_digest = hashlib.sha1(self.lut.tobytes()).hexdigest()
+
+    def apply_lut(self, frame:np.ndarray):
+        """
+        Correct a grating to phase with one lookup, levels past the end clip.
+        A LUT of another size than the SLM's levels spans the same range.
+        Returns:
+            frame : np.ndarray : calibrated frame, the same one without a LUT
+        """
+
+        if self.lut is None or frame.ndim != 2:
+            return frame
+        if len(self.lut) != self.max_level + 1:
+            frame = (frame.astype(np.int64) * len(self.lut) 
+                // (self.max_level + 1))
+        return np.take(self.lut, frame, mode='clip')
+
+    def allocate(self):
+        """
+        Allocate a blank frame at exactly the SLM size and depth.
+        Returns:
+            frame : np.ndarray : zeros of shape (height, width)
+        """
+
+        return np.zeros((self.height, self.width), dtype=self.dtype)
+
+    def to_image(self, frame:np.ndarray):
+        """
+        Wrap a frame in a PIL image without changing its levels.
+        Returns:
+            image : Image.Image : 'L' up to 8 bits, 'I;16' above
+        """
+
+        return Image.fromarray(np.ascontiguousarray(frame, dtype=self.dtype))
+
+    def display_image(self, frame:np.ndarray):
+        """
+        Get a frame in a mode tkinter can show on the SLM monitor.
+        Returns:
+            image : Image.Image : 'L', or 'RGB' when packing high bit depths
+        """
+
+        if self.dtype == np.uint8:
+            return Image.fromarray(np.ascontiguousarray(frame, dtype=np.uint8))
+        frame = np.asarray(frame, dtype=np.uint16)
+        if self.display_encoding == 'Packed':
+            #High byte on red, low byte on green, as read by the SLM driver.
+            packed = np.zeros(frame.shape + (3,), dtype=np.uint8)
+            packed[..., 0] = frame >> 8
+            packed[..., 1] = frame & 0xFF
+            return Image.fromarray(packed)
+        return Image.fromarray((frame >> (self.bit_depth - 8)).astype(np.uint8))
+
+    def blank_image(self):
+        """
+        Get the blank frame shown before any grating.
+        Returns:
+            image : Image.Image : display ready black frame
+        """
+
+        return self.display_image(self.allocate())
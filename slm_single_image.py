@@ -30,6 +30,7 @@ import numpy as np
 from serialcontrol import Motor
 from serialcontrol import Shutter
 from serialcontrol import Laser
+from serialsimulator import VirtualClock
 from exceptions import InputError
 from exceptions import FileFormatError
 from exceptions import NoFileError
@@ -39,10 +40,18 @@ from exceptions import EquipmentError
 from exceptions import UserInterruptError
 
 from hologramcreator import HologramCreator
+import experimentfile
+import mappings
 from imageprocessing import MyImage
+from motionplanning import MotionModel
+from motionplanning import SCAN_STRATEGIES
+from motionplanning import ExposurePlan
 from grating_processing import MyGrating
+from grating_processing import read_grating_configs
+from grating_cache import GratingCache
 from list_item import ListItem
 from slm_window import SLM_window
+from slm_window import SLMFrameManager
 import pdb
 
 class SLM_Single_Image(HologramCreator):
@@ -61,10 +70,15 @@ class SLM_Single_Image(HologramCreator):
         }
         super().__init__(root, window_configs)
         self.item_list = []
+        self.plan = None
         self.list_box = None
         self.slm = None
+        self.slm_frames = None
         self.grating_name = None
         self.grating_file_path = None
+        #Gratings are reused across items and restarts when configs match.
+        self.grating_cache = GratingCache({'Directory':'Temp/Gratings'})
+        self.slm_profile = self.read_slm_profile()
         
         #Apply some frame modifications for large wigits.
         self.frames[1][2].grid(row=1, column=2, pady=10, rowspan=200,  sticky='NW')
@@ -128,7 +142,9 @@ class SLM_Single_Image(HologramCreator):
             'Shutter':lambda:self.set_equipment_settings(
                 'Equipment/Shutter Settings.txt', 'Shutter'),
             'Laser':lambda:self.set_equipment_settings(
-                'Equipment/Laser Settings.txt', 'Laser')
+                'Equipment/Laser Settings.txt', 'Laser'),
+            'SLM':lambda:self.set_equipment_settings(
+                'Equipment/SLM Settings.txt', 'SLM')
         }
         submenu_view = {
             'Image as Array':lambda:self.display_image_array(self.image),
@@ -200,7 +216,10 @@ class SLM_Single_Image(HologramCreator):
             'y_max' : 255,
             'y_min' : 0,
             'period' : 100,
-            'reverse' : 0
+            'reverse' : 0,
+            'ring_period' : 100,
+            'center_x' : 0,
+            'center_y' : 0
         }
         grating_preview_configs = {
             'max_display_x':200,
@@ -234,9 +253,12 @@ class SLM_Single_Image(HologramCreator):
             'map_timing': self.map_timing,
             'map_laser_power': self.map_laser_power
             })
-        self.grating = MyGrating(self.grating_configs)
+        self.grating = MyGrating(self.grating_configs, self.grating_cache,
+            self.slm_profile)
         item = self.grating
         self.item_list.append(item)
+        #The plan is compiled again once the items are final.
+        self.plan = None
         self.update_list()
         
             
@@ -249,10 +271,12 @@ class SLM_Single_Image(HologramCreator):
         
             self.list_box.delete(index)
             del self.item_list[index]
+            self.plan = None
     
     def clear_items(self):
         self.list_box.delete(0, tk.END)
         self.item_list.clear()
+        self.plan = None
     
     def fill_item_deatils(self,item):
         
@@ -309,6 +333,9 @@ class SLM_Single_Image(HologramCreator):
         self.clear_list_button = tk.Button(frame, text = 'Clear List', command = self.clear_items)
         self.clear_list_button.grid(row = 1, column = 2)
 
+        self.label_slm_frames = tk.Label(frame, text='SLM Frames: ')
+        self.label_slm_frames.grid(row = 2, column = 0, columnspan=3)
+
         self.list_select = self.list_box.bind('<<ListboxSelect>>', lambda event: self.onselect(event))
     
     def grating_select(self, file_path=None):
@@ -406,6 +433,16 @@ class SLM_Single_Image(HologramCreator):
             return
         #Further processing of data into mappings, and modifify to images.
         self.modify_and_map()
+        #Map gratings and plan only now that every item exists.
+        try:
+            self.plan_experiment()
+        except InputError as e:
+            super().error_window(e)
+            return
+        #Every grating is rendered up front, the run only switches frames.
+        self.slm_frames = SLMFrameManager(list(self.item_list))
+        self.label_slm_frames.configure(text='SLM Frames: %d'
+            %(len(self.slm_frames.frames)))
         #Generate a time estimation
         self.run_time()
 
@@ -418,21 +455,7 @@ class SLM_Single_Image(HologramCreator):
         Get the equipment data from equipment files.
         """
         
-        settings = super().read_file('Equipment/'+equipment+' Settings.txt')
-        serial = super().read_file('Equipment/'+equipment+' Serial.txt')
-        configs_old = {**serial, **settings}
-        configs_new = {}
-        try:
-            for old_key in configs_old.keys():
-                new_key = old_key.replace(equipment, '').replace('Serial', '').lstrip()
-                configs_new[new_key] = configs_old[old_key]
-            return configs_new
-        except Exception as e:
-            message = ('An error occurred processing data from ' + equipment +
-                ' files:\n\tEquipment/' + equipment + ' Settings.txt\n\t'
-                    'Equipment/' + equipment + ' Motor Serial.txt')
-            advice = 'Delete these files.'
-            raise FileFormatError(message, e, advice)
+        return experimentfile.read_equipment_data(equipment)
 
     def collect_raw_data(self):
         """
@@ -481,75 +504,33 @@ class SLM_Single_Image(HologramCreator):
             message = 'Vertical Pixels must be an int.'
             raise InputError(message, e)
             
-        #Grating Type
-        try:
-            val = self.type_var.get().strip()
-            if val != '':
-                self.grating_configs['g_type'] = str(val)
-            else:
-                self.grating_configs['g_type'] = 'SawTooth'
-        except ValueError as e:
-            message = 'Grating type must be a string'
-            raise InputError(message, e)
-        
-        if self.grating_configs['g_type'] == 'Custom':
-            self.grating_configs['max_display_x'] = 1920
-            self.grating_configs['max_display_x'] = 1152
-            self.grating_configs['grating_name'] = self.grating_name
-            self.grating_configs['file_path'] = self.grating_file_path
-        else:
-            #Rotation Angle
-            try:
-                #pdb.set_trace()
-                val = self.entry_angle.get().strip()
-                if val != '':
-                    self.grating_configs['g_angle'] = int(val)
-                else:
-                    self.grating_configs['g_angle'] = 0
-                    #pdb.set_trace()
-            except ValueError as e:
-                message = 'Rotation angle must be an int'
-                raise InputError(message, e)
-
-            #Ymin
-            try:
-                val = self.entry_ymin.get().strip()
-                if val != '':
-                    self.grating_configs['y_min'] = int(val)
-                else:
-                    self.grating_configs['y_min'] = 0
-            except ValueError as e:
-                message = 'Y min must be an int'
-                raise InputError(message, e)
-
-            #Ymax
-            try:
-                val = self.entry_ymax.get().strip()
-                if val != '':
-                    self.grating_configs['y_max'] = int(val)
-                else:
-                    self.grating_configs['y_max'] = 0
-            except ValueError as e:
-                message = 'Y max must be an int'
-                raise InputError(message, e)
-
-            #Period
-            try:
-                val = self.entry_period.get().strip()
-                if val != '' or val > 0:
-                    self.grating_configs['period'] = int(val)
-                else:
-                    self.grating_configs['period'] = 100
-            except ValueError as e:
-                message = 'Period width (pixels) must be an int greater than 0'
-                raise InputError(message, e)
-            self.grating_configs['reverse'] = self.g_reverse.get()
+        #Grating type, angle, colors, periods and circle center.
+        read_grating_configs({
+            'g_type':self.type_var.get(),
+            'grating_name':self.grating_name,
+            'file_path':self.grating_file_path,
+            'g_angle':self.entry_angle.get(),
+            'y_min':self.entry_ymin.get(),
+            'y_max':self.entry_ymax.get(),
+            'period':self.entry_period.get(),
+            'reverse':self.g_reverse.get(),
+            'ring_period':self.entry_ring_period.get(),
+            'center':self.entry_center.get()
+        }, self.grating_configs)
             
         self.cropping = self.entry_crop.get().strip()
+        self.scan_strategy = self.scan_var.get()
+        if self.scan_strategy not in SCAN_STRATEGIES:
+            message = 'Unknown scan strategy: ' + self.scan_strategy
+            raise InputError(message)
         self.strings_exposure = self.text_exposure.get(1.0, 'end-1c').strip()
         self.strings_ignore = self.text_ignore.get(1.0, 'end-1c').strip()
         self.strings_laser = self.text_laser.get(1.0, 'end-1c').strip()
         self.strings_grating_color = self.text_grating_color.get(1.0, 'end-1c').strip()
+        self.grating_tiling = self.tiling_var.get()
+        if self.grating_tiling not in mappings.TILINGS:
+            message = 'Unknown grating tiling: ' + self.grating_tiling
+            raise InputError(message)
 
         self.item_details = {
             'strings_exposure':self.strings_exposure,
@@ -575,6 +556,8 @@ class SLM_Single_Image(HologramCreator):
             'Pixels Horizontal':self.pixels_x, 
             'Pixels Vertical':self.pixels_y,
             'Cropping' :self.cropping,
+            'Scan Strategy':self.scan_strategy,
+            'Grating Tiling':self.grating_tiling,
             'Strings Exposure':self.strings_exposure,
             'Strings Ignore':self.strings_ignore,
             'Strings Laser':self.strings_laser,
@@ -595,7 +578,10 @@ class SLM_Single_Image(HologramCreator):
                     'y_min %d'%index: item.configs['y_min'],
                     'y_max %d'%index: item.configs['y_max'],
                     'period %d'%index: item.configs['period'],
-                    'reverse %d'%index: item.configs['reverse']
+                    'reverse %d'%index: item.configs['reverse'],
+                    'ring_period %d'%index: item.configs['ring_period'],
+                    'center_offset %d'%index: '(%d,%d)'%(item.configs['center_x'],
+                        item.configs['center_y'])
                     })
             print(item_dict)
             datas.update(item_dict)
@@ -633,59 +619,70 @@ class SLM_Single_Image(HologramCreator):
         """
 
         #Modify the image and display.
-        self.image.downsize_image((self.pixels_x, self.pixels_y))
-        self.image.crop_image(self.cropping)
+        self.image.reset_transforms()
+        self.image.add_grayscale()
+        self.image.add_resize((self.pixels_x, self.pixels_y))
+        self.image.add_crop(self.cropping)
+        self.image.apply_transforms()
         super().insert_image_array(self.image, self.text_array)
         self.label_imagemod.configure(image=self.image.modified_tkinter)
         #Process other data into mappings of pixel values and delta distances.
+        gradient_range = mappings.gradient_range(self.image.array_view())
         configs_timing = {
             'Input Exposure':self.strings_exposure,
             'Input Ignore':self.strings_ignore,
-            'Gradient Range':256
+            'Gradient Range':gradient_range
         }
         configs_laser = {
             'Input Laser':self.strings_laser,
-            'Gradient Range':256
-        }
-        configs_grating_color = {
-            'Input Grating Color':self.strings_grating_color,
-            'Gradient Range':256
+            'Gradient Range':gradient_range
         }
         self.map_timing = super().map_timing(configs_timing)
         self.map_laser_power = super().map_laser_power(configs_laser)
-        self.grating_map = super().map_gratings(configs_grating_color)
         self.delta_x = self.hologram_width / self.pixels_x
         self.delta_y = self.hologram_height / self.pixels_y
         dpi = self.image.modified_PIL.width / (39.37 * self.hologram_width)
         self.label_dpi.configure(text='Image Resolution (dpi): '+str(int(dpi)))
+
+    def plan_experiment(self):
+        """
+        Map every pixel to its grating item and compile the ordered plan, once 
+        every item has been added. Without items there is no plan.
+        """
+
+        self.plan = None
+        if len(self.item_list) == 0:
+            return
+        configs_grating_color = {
+            'Input Grating Color':self.strings_grating_color,
+            'Gradient Range':mappings.gradient_range(self.image.array_view()),
+            'Tiling':self.grating_tiling
+        }
+        self.grating_map = super().map_gratings(configs_grating_color)
+        #Compile every exposure up front, with the grating item of each.
+        self.plan = super().order_plan(ExposurePlan.compile(
+            self.image.array_view(), self.map_timing, self.map_laser_power, 
+            self.delta_x, self.delta_y, self.grating_map))
     
     def run_time(self):
         """
-        Generate a rough runtime estimation and display on window.
+        Estimate the runtime with the motion model and display on window.
         """
         
-        run_time = 0
-        y_after_crop = self.image.modified_PIL.height
-        x_after_crop = self.image.modified_PIL.width
-        image_as_array = np.transpose(self.image.modified_array)
-        #Loop through every potential grating on hologram
-        for i in range (0, y_after_crop):
-            visited_row = False
-            farthest_x = 0
-            #Calculate exposure time
-            for j in range (0, x_after_crop):
-                add = self.map_timing[image_as_array[j][i]]
-                if add != 0:
-                    visited_row = True
-                    farthest_x = j
-                    run_time += add
-            #Calculate travel time in x direction
-            if visited_row == True:
-                run_time += ((farthest_x / x_after_crop) * self.hologram_width / .001)
-        #Calculate travel time in y direction
-        run_time += self.hologram_height / .001
+        try:
+            model = MotionModel(super().collect_motion_configs())
+        except InputError as e:
+            super().error_window(e)
+            return
+        if self.plan is not None:
+            estimate = self.plan.estimate(model)
+        else:
+            #No items yet, estimate the image on its own as a raster plan.
+            estimate = ExposurePlan.compile(self.image.array_view(), 
+                self.map_timing, self.map_laser_power, self.delta_x, 
+                    self.delta_y).estimate(model)
         #Print on Main Window.
-        end_time = (datetime.now() + timedelta(seconds=run_time)).strftime('%H:%M:%S -- %d/%m/%Y')
+        end_time = (datetime.now() + timedelta(seconds=estimate['Total'])).strftime('%H:%M:%S -- %d/%m/%Y')
         self.label_est_time.configure(text='End Time Estimate: '+end_time)
     
     def generate_plot(self, item):
@@ -784,70 +781,59 @@ class SLM_Single_Image(HologramCreator):
         #Create the objects amd store in a list.
         self.equipment = []
         #pdb.set_trace()
-        self.motor = Motor({**self.equipment_configs_motor,**{'Axes':(1,2)}})
+        #Simulated equipment of one run shares a virtual clock.
+        clock = {'Clock':VirtualClock()}
+        self.motor = Motor({**self.equipment_configs_motor,**{'Axes':(1,2)},**clock})
         #pdb.set_trace()
         self.equipment.append(self.motor)
-        self.shutter = Shutter(self.equipment_configs_shutter)
+        self.shutter = Shutter({**self.equipment_configs_shutter,**clock})
         self.equipment.append(self.shutter)
-        self.laser = Laser(self.equipment_configs_laser)
+        self.laser = Laser({**self.equipment_configs_laser,**clock})
         self.equipment.append(self.laser)
         
         #Initialize to start positions.
-        self.motor.move_home(1) 
-        self.motor.move_home(2) 
+        self.motor.move_home_all((1,2)) 
         self.laser.turn_on_off(True)
 
     def create_SLM_window(self):
-        self.slm = SLM_window(self.root)
+        self.slm = SLM_window(self.root, profile=self.slm_profile)
+        self.slm_frames.attach(self.slm)
 
     def movement(self):
         """
         Conduct the physical movement of machinery and such.
         """
+        if self.plan is None:
+            message = 'There is no plan to run, the experiment was not processed.'
+            advice = 'Add items, then Process and Save.'
+            raise MissingDataError(message, None, advice)
         # Create SLM Window
         self.create_SLM_window()
         
-        #Move through the image array, expose according to mappings.
-        prev_pix = None
+        #Execute the compiled plan, moving an axis only when it changes.
+        prev_x = None
+        prev_y = None
         prev_powr = None
-        y_after_crop = self.image.modified_PIL.height
-        x_after_crop = self.image.modified_PIL.width
-        image_as_array = np.transpose(self.image.modified_array)
-        
-        for i in range(0, y_after_crop):
-            on_this_row = False 
-            for j in range(0, x_after_crop):
-                self.check_pause_abort()
-                cur_item = self.item_list[self.grating_map[j, i]]
-                pix = image_as_array[j][i]
-                e_time = self.map_timing[pix]
-                powr = self.map_laser_power[pix]
-                if e_time < 0:
-                    e_time = 0
-                
-                #Enter conditional if the current pixel should be exposed.
-                if not super().compare_floats(e_time, 0):
-                    print(cur_item)
-                    self.slm.display(cur_item.grating_tk)
-                    self.update_progress(pix,e_time,powr,i,j)
-                    #Change the laser's power if the pixel value has changed.
-                    
-                    if prev_pix is not None and prev_powr is not None:
-                        if not super().compare_floats(powr, prev_powr):
-                            self.laser.change_power(powr)
-                    
-                    #Move motors to the correct positions and open shutter.
-                    if not on_this_row:
-                        self.motor.move_absolute(2, i*self.delta_y*1000) 
-                        on_this_row = True
-                    self.motor.move_absolute(1, j*self.delta_x*1000) 
-                    self.shutter.toggle(e_time)
-                    #Update previous pixel info to current pixel info
-                    
-                    prev_pix = pix
-                    prev_powr = powr
-
-    
+        for x, y, pix, powr, e_time, item in self.plan.steps.tolist():
+            self.check_pause_abort()
+            #Start both axes together, then set up the exposure while they travel.
+            handles = self.motor.move_xy_async(
+                x*self.delta_x*1000 if x != prev_x else None,
+                y*self.delta_y*1000 if y != prev_y else None)
+            self.slm_frames.show(item)
+            self.update_progress(pix,e_time,powr,y,x)
+            #Change the laser's power if it differs from the last exposure.
+            if prev_powr is not None:
+                if not super().compare_floats(powr, prev_powr):
+                    self.laser.change_power(powr)
+            #Finish moving the motors, only then open the shutter.
+            for handle in handles:
+                handle.wait()
+            self.shutter.toggle(e_time)
+            #Update previous exposure info to current exposure info
+            prev_x = x
+            prev_y = y
+            prev_powr = powr
 
     def check_pause_abort(self):
         """
@@ -888,6 +874,8 @@ class SLM_Single_Image(HologramCreator):
         super().close_ports(self.equipment)
         end = datetime.now().strftime('%H:%M:%S -- %d/%m/%Y')
         self.label_end_time.configure(text='True Experiment End Time: '+end)
+        if self.slm_frames is not None:
+            self.label_slm_frames.configure(text=self.slm_frames.report())
         #screenshot = super().screenshot()
         #screenshot.save(self.file_experiment.replace('.txt','.png'))
 
@@ -933,6 +921,8 @@ class SLM_Single_Image(HologramCreator):
             self.entry_ymin,
             self.entry_ymax,
             self.entry_period,
+            self.entry_ring_period,
+            self.entry_center,
             self.text_exposure,
             self.text_ignore,
             self.text_laser,
@@ -940,6 +930,8 @@ class SLM_Single_Image(HologramCreator):
         ]
         self.clear_items()
         self.g_reverse.set('0')
+        self.scan_var.set('Raster')
+        self.tiling_var.set('Color')
         super().clear_wigits(wigits)
         
     def populate_main(self, datas:dict):
@@ -960,6 +952,10 @@ class SLM_Single_Image(HologramCreator):
             self.entry_pixel_y.insert(1, datas['Pixels Vertical'])
         if 'Cropping' in datas:
             self.entry_crop.insert(1, datas['Cropping'])
+        if 'Scan Strategy' in datas:
+            self.scan_var.set(datas['Scan Strategy'])
+        if 'Grating Tiling' in datas:
+            self.tiling_var.set(datas['Grating Tiling'])
         if 'Strings Exposure' in datas:
             self.text_exposure.insert(1.0, datas['Strings Exposure'])
         if 'Strings Ignore' in datas:
@@ -995,6 +991,12 @@ class SLM_Single_Image(HologramCreator):
                 self.entry_period.insert(0, datas['period %d' %(i)])
             if 'reverse %d' %(i) in datas:
                 self.g_reverse.set(datas['reverse %d' %(i)])
+            if 'ring_period %d' %(i) in datas:
+                self.entry_ring_period.delete(0,tk.END)
+                self.entry_ring_period.insert(0, datas['ring_period %d' %(i)])
+            if 'center_offset %d' %(i) in datas:
+                self.entry_center.delete(0,tk.END)
+                self.entry_center.insert(0, datas['center_offset %d' %(i)])
             self.add_item()
         
     def overwrite_settings_serials(self, datas):
@@ -6,11 +6,15 @@ from tkinter import Toplevel, Tk, Label # Graphical User Interface (GUI) package
 from PIL import Image, ImageTk # Python Imaging Librarier (PIL) package
 # Processing packages
 import re # Regular Expression (re) is a package to check, if a string contains the specified search pattern.
+import hashlib # Digests to find gratings with identical pixels
+import time # Timing of frame switches
 import numpy as np # Scientific computing package (NumPy)
+# Project packages
+from slm_profile import SLMProfile # Resolution and bit depth of the SLM
 
 class SLM_window():
 
-    def __init__(self, master, grating = None):
+    def __init__(self, master, grating = None, profile = None):
         ### Monitor controlling 
         # Finds the resolution of all monitors that are connected.
         active_monitors = get_monitors() # "monitor(screenwidth x screenheight + startpixel x + startpixel y)"
@@ -25,14 +29,13 @@ class SLM_window():
         begin_slm_horizontal = active_monitors[1].x
         begin_slm_vertical = active_monitors[1].y
 
-        width = 1920
-        height = 1152
+        # Resolution and bit depth of the SLM
+        self.profile = SLMProfile() if profile is None else profile
+        width = self.profile.width
+        height = self.profile.height
 
         if not grating:
-            array = np.zeros((height, width), dtype = np.uint16)
-            image = Image.fromarray(array)
-            image = image.convert('L')
-            grating = ImageTk.PhotoImage(image)
+            grating = ImageTk.PhotoImage(self.profile.blank_image())
 
         # self.image_window = Tk()
         self.image_window = master
@@ -58,7 +61,6 @@ class SLM_window():
     def display(self,grating):
         self.window_slm_label.config(image=grating)
         self.window_slm_label.image = grating
-        print("display")
         
     def change_text(self, words):
         self.window_slm_label.config(text=words)
@@ -69,5 +71,72 @@ class SLM_window():
         self.window_slm.update()
 
 
+class SLMFrameManager():
+    """
+    Display ready frames of every item's grating, switched only on change.
+    """
 
+    def __init__(self, gratings:list, slm=None):
+        """
+        Render each grating once, items with identical pixels share a frame.
+        Build it before the run, the SLM window is attached once it opens.
+        """
 
+        self.frames = []
+        #Frame shown for every item index.
+        self.item_frames = []
+        digests = {}
+        for grating in gratings:
+            image = grating.grating_image
+            digest = hashlib.sha1(image.tobytes()).hexdigest() + image.mode
+            if digest not in digests:
+                digests[digest] = len(self.frames)
+                self.frames.append(ImageTk.PhotoImage(grating.display_image()))
+            self.item_frames.append(digests[digest])
+        self.attach(slm)
+
+    def attach(self, slm):
+        """
+        Show the frames on an SLM window, counting switches from none.
+        """
+
+        self.slm = slm
+        self.current = None
+        self.switches = 0
+        self.requests = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def show(self, item:int):
+        """
+        Show an item's grating, nothing is sent if its frame is already up.
+        Returns:
+            switched : bool : True if the SLM was sent a new frame
+        """
+
+        self.requests += 1
+        frame = self.item_frames[item]
+        if frame == self.current:
+            return False
+        start = time.perf_counter()
+        self.slm.display(self.frames[frame])
+        #The switch is done once Tk has repainted the SLM window.
+        self.slm.window_slm.update_idletasks()
+        latency = time.perf_counter() - start
+        self.current = frame
+        self.switches += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        return True
+
+    def report(self):
+        """
+        Summarize the frame switches of the run.
+        Returns:
+            report : str : frames, switches and their mean and max latency
+        """
+
+        mean = self.total_latency / self.switches if self.switches else 0.0
+        return ('SLM frames: %d, switches: %d of %d exposures, latency mean '
+            '%.2f ms, max %.2f ms'%(len(self.frames), self.switches,
+                self.requests, mean*1000, self.max_latency*1000))
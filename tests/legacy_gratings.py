@@ -0,0 +1,56 @@
+"""
+Grating generation as it was before it was vectorized, kept to check the 
+current output against.
+"""
+
+import numpy as np
+
+def legacy_pattern_array(height_array, width_array, configs: dict):
+    """
+    Fill the pattern one column, or one ring, at a time.
+    Returns:
+        grating_array : np.ndarray : uint16 pattern
+    """
+
+    grating_array = np.zeros((height_array, width_array), dtype = np.uint16)
+    
+    reverse = 0
+    if(configs['reverse'] == 0):
+        reverse = 1
+        y_intercept = configs['y_min']
+    else:
+        reverse = -1
+        y_intercept = configs['y_max']
+
+    if(configs['g_type'] == 'SawTooth'):
+        slope = (configs['y_max'] - configs['y_min'])/configs['period']
+        for i in range(width_array):
+            color = slope * reverse * (i % configs['period']) + y_intercept
+            grating_array[:, i] = color
+
+    elif(configs['g_type'] == 'Triangle'):
+        period_counter = 0
+        period = (configs['period'] / 2)
+        slope = (configs['y_max'] - configs['y_min'])/period
+        for i in range(width_array):
+            if(i % period == 0):
+                period_counter += 1
+
+            if(period_counter % 2 == configs['reverse']):
+                color = slope * -1 * (i % period) + configs['y_max']
+            else:
+                color = slope * (i % period) + configs['y_min']
+            grating_array[:, i] = color
+    
+    elif(configs['g_type'] == 'Circle'):
+        cx, cy = width_array //2, height_array //2
+        radius = cy
+        slope = (configs['y_max'] - configs['y_min'])/configs['period']
+        for i in range(width_array):
+            color = slope * reverse * (i % configs['period']) + y_intercept
+            x, y = np.ogrid[-radius: radius, -radius: radius]
+            index = x**2 + y**2 <= radius**2
+            grating_array[cy-radius:cy+radius, cx-radius:cx+radius][index] = color
+            radius -= 1
+            
+    return grating_array
@@ -0,0 +1,90 @@
+"""
+User string mappings and grating choices as they were before they were
+compiled to arrays, kept to check the current output against.
+"""
+
+import numpy as np
+
+def legacy_process_user_string(user_lines:str, configs:dict):
+    """
+    Fill the data one pixel level at a time, line by line.
+    Returns:
+        data : list[float]
+    """
+
+    gradient_range = (configs['Gradient Range'] if 'Gradient Range'
+        in configs else 256)
+    data = [-1] * gradient_range
+    for line in user_lines.splitlines():
+        comma = line.find(',')
+        bracket = line.find(']')
+        start = int(line[1:comma])
+        end = int(line[comma+1:bracket])
+        x = line.find('x')
+        if x >= 0:
+            factor = float(line[bracket+2:x])
+            for i in range(start,end):
+                data[i] = round(factor*i,2)
+        elif x == -1:
+            if ':' in line:
+                value = float(line[bracket+2:len(line)])
+            else:
+                value = 0
+            for i in range(start, end):
+                data[i] = value
+    return data
+
+def legacy_map_timing(configs:dict):
+    """
+    Exposure times with the ignored levels overridden one at a time.
+    Returns:
+        map_timing : list[float]
+    """
+
+    gradient_range = (configs['Gradient Range'] if 'Gradient Range'
+        in configs else 256)
+    map_timing = legacy_process_user_string(configs['Input Exposure'],
+        {'Gradient Range':gradient_range})
+    ignore_override = legacy_process_user_string(configs['Input Ignore'],
+        {'Gradient Range':gradient_range})
+    for i in range(0, gradient_range):
+        if ignore_override[i] == 0:
+            map_timing[i] = 0
+    return map_timing
+
+def legacy_cycle_image(j, i):
+    """
+    Item of column j, row i in the 2x2 tile.
+    """
+
+    if j % 2 == 0 and i % 2 == 0:
+        return 0
+    elif j % 2 == 0 and i % 2 == 1:
+        return 1
+    elif j % 2 == 1 and i % 2 == 0:
+        return 2
+    elif j % 2 == 1 and i % 2 == 1:
+        return 3
+    else:
+        return -1
+
+def legacy_color_map(image_array:np.ndarray, grating_color_map):
+    """
+    Choose the item of every pixel by its level, one pixel at a time.
+    Returns:
+        grating_map : np.ndarray : item index of every pixel, [column, row]
+    """
+
+    y_after_crop, x_after_crop = image_array.shape[:2]
+    grating_map = np.zeros((y_after_crop,x_after_crop), dtype=np.uint16)
+    grating_map = np.transpose(grating_map)
+    temp_image_array = np.transpose(image_array)
+    for i in range(0, y_after_crop):
+        for j in range(0, x_after_crop):
+            current_color = temp_image_array[j][i]
+            grating_option = grating_color_map[current_color]
+            if grating_option != -1:
+                grating_map[j][i]= grating_option
+            else:
+                grating_map[j][i]= 0
+    return grating_map
@@ -0,0 +1,138 @@
+"""
+Cache gratings in memory within a budget and on disk.
+"""
+
+import os
+
+import numpy as np
+
+import grating_cache
+import grating_processing
+from grating_cache import GratingCache
+from grating_processing import MyGrating
+from slm_profile import SLMProfile
+
+CONFIGS = {'g_type':'SawTooth', 'g_angle':30, 'y_min':0, 'y_max':255,
+    'period':37, 'reverse':0}
+
+def test_equal_numbers_share_a_key():
+    cache = GratingCache()
+    key = cache.make_key(CONFIGS)
+    assert cache.make_key({**CONFIGS, 'g_angle':30.0}) == key
+    assert cache.make_key({**CONFIGS, 'g_angle':np.float64(30)}) == key
+    assert cache.make_key({**CONFIGS, 'g_angle':30.5}) != key
+    #Configs that do not change the pixels are not part of the key.
+    assert cache.make_key({**CONFIGS, 'grating_name':'other'}) == key
+
+def test_render_version_changes_the_key(monkeypatch):
+    cache = GratingCache()
+    key = cache.make_key(CONFIGS)
+    monkeypatch.setattr(grating_cache, 'RENDER_VERSION', 
+        grating_cache.RENDER_VERSION + 1)
+    assert cache.make_key(CONFIGS) != key
+
+def test_least_recently_used_is_evicted():
+    cache = GratingCache({'Max Bytes':'300'})
+    arrays = {key:np.full(100, i, dtype=np.uint8) for i, key 
+        in enumerate('abcd')}
+    for key in 'abc':
+        cache.put(key, arrays[key])
+    assert cache.get('a') is not None
+    cache.put('d', arrays['d'])
+    #'b' was used least recently once 'a' was read again.
+    assert list(cache.entries.keys()) == ['c', 'a', 'd']
+    assert cache.current_bytes == 300
+    assert cache.get('b') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    #An array larger than the whole budget is not kept.
+    cache.put('e', np.zeros(301, dtype=np.uint8))
+    assert 'e' not in cache.entries and cache.current_bytes == 300
+
+def test_entries_are_read_only_copies():
+    cache = GratingCache()
+    array = np.arange(10, dtype=np.uint8)
+    cache.put('a', array)
+    array[0] = 9
+    cached = cache.get('a')
+    assert cached[0] == 0
+    assert not cached.flags.writeable
+
+def test_reload_from_disk(tmp_path):
+    directory = str(tmp_path / 'gratings')
+    array = np.arange(12, dtype=np.uint16).reshape(3, 4)
+    GratingCache({'Directory':directory}).put('a', array)
+    assert os.listdir(directory) == ['a.npy']
+    cache = GratingCache({'Directory':directory})
+    loaded = cache.get('a')
+    np.testing.assert_array_equal(loaded, array)
+    assert loaded.dtype == array.dtype
+    assert 'a' in cache.entries and cache.hits == 1
+    #A damaged file is a miss, not an error.
+    with open(os.path.join(directory, 'b.npy'), 'wb') as file:
+        file.write(b'not a grating')
+    assert cache.get('b') is None
+
+def test_disk_write_is_atomic(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    replaced = []
+    def replace(source, destination):
+        #The whole array is in the temporary file before it is renamed.
+        assert np.array_equal(np.load(source), np.ones(5))
+        assert not os.path.exists(destination)
+        replaced.append((source, destination))
+        real_replace(source, destination)
+    real_replace = os.replace
+    monkeypatch.setattr(os, 'replace', replace)
+    cache = GratingCache({'Directory':directory})
+    cache.put('a', np.ones(5))
+    assert replaced == [(os.path.join(directory, 'a.npy.tmp'), 
+        os.path.join(directory, 'a.npy'))]
+    assert os.listdir(directory) == ['a.npy']
+    #A failed rename leaves no final file, the grating stays in memory.
+    def fail(source, destination):
+        raise OSError('disk full')
+    monkeypatch.setattr(os, 'replace', fail)
+    cache.put('b', np.ones(5))
+    assert os.listdir(directory) == ['a.npy']
+    assert cache.get('b') is not None
+
+def test_profile_and_lut_change_the_key():
+    cache = GratingCache()
+    profile = SLMProfile()
+    raw_key = cache.make_key(CONFIGS, profile)
+    assert cache.make_key(CONFIGS, profile, None) == raw_key
+    assert cache.make_key(CONFIGS, profile, 'a') != raw_key
+    assert cache.make_key(CONFIGS, profile, 'a') != cache.make_key(CONFIGS, 
+        profile, 'b')
+    assert cache.make_key(CONFIGS, SLMProfile({'Bit Depth':'10'})) != raw_key
+
+def test_changing_lut_reuses_the_raw_grating(tmp_path, monkeypatch):
+    #Gratings are built without tkinter, their images stay PIL images.
+    monkeypatch.setattr(grating_processing.ImageTk, 'PhotoImage', 
+        lambda image: image)
+    rendered = []
+    render = MyGrating.render_grating_image
+    def counting_render(self, configs):
+        rendered.append(configs['g_type'])
+        return render(self, configs)
+    monkeypatch.setattr(MyGrating, 'render_grating_image', counting_render)
+    cache = GratingCache()
+    configs = {**CONFIGS, 'center_x':0, 'center_y':0}
+    profiles = []
+    for name, lut in (('invert', 255 - np.arange(256)), ('half', 
+        np.arange(256) // 2)):
+        np.save(str(tmp_path / name) + '.npy', lut)
+        profiles.append(SLMProfile({'Width':'40', 'Height':'30', 
+            'LUT File':str(tmp_path / name) + '.npy'}))
+    plain = MyGrating(configs, cache, SLMProfile({'Width':'40', 'Height':'30'}))
+    inverted = MyGrating(configs, cache, profiles[0])
+    halved = MyGrating(configs, cache, profiles[1])
+    again = MyGrating(configs, cache, profiles[0])
+    #Only the first grating is generated, the others are lookups.
+    assert rendered == ['SawTooth']
+    raw = np.asarray(plain.grating_image)
+    np.testing.assert_array_equal(np.asarray(inverted.grating_image), 255 - raw)
+    np.testing.assert_array_equal(np.asarray(halved.grating_image), raw // 2)
+    np.testing.assert_array_equal(np.asarray(again.grating_image), 255 - raw)
+    #One raw and two calibrated gratings are cached.
+    assert len(cache.entries) == 3
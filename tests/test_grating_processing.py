@@ -0,0 +1,185 @@
+"""
+Check generated gratings against the per-column loop they replaced.
+"""
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from exceptions import InputError
+from grating_processing import MyGrating
+from grating_processing import read_grating_configs
+from slm_profile import SLMProfile
+from legacy_gratings import legacy_pattern_array
+
+def make_grating(profile:SLMProfile=None):
+    """
+    MyGrating without its images, so no tkinter window is needed.
+    """
+
+    grating = MyGrating.__new__(MyGrating)
+    grating.profile = SLMProfile() if profile is None else profile
+    return grating
+
+def grating_configs(g_type, period, reverse, y_min, y_max, **extra):
+    return {'g_type':g_type, 'period':period, 'reverse':reverse,
+        'y_min':y_min, 'y_max':y_max, 'g_angle':0, **extra}
+
+PERIODS = (1, 2, 7, 36, 37, 64, 100, 255)
+COLORS = ((0, 255), (20, 200), (0, 128))
+
+@pytest.mark.parametrize('g_type', ('SawTooth', 'Triangle'))
+@pytest.mark.parametrize('period', PERIODS)
+@pytest.mark.parametrize('reverse', (0, 1))
+@pytest.mark.parametrize('y_min, y_max', COLORS)
+def test_columns_match_loop(g_type, period, reverse, y_min, y_max):
+    configs = grating_configs(g_type, period, reverse, y_min, y_max)
+    #Rows are all the same, a few of them at the full canvas width will do.
+    expected = legacy_pattern_array(3, 2260, configs)
+    actual = make_grating().generate_pattern_array(3, 2260, configs)
+    assert actual.dtype == expected.dtype
+    np.testing.assert_array_equal(actual, expected)
+
+@pytest.mark.parametrize('period', (1, 5, 16, 37))
+@pytest.mark.parametrize('reverse', (0, 1))
+@pytest.mark.parametrize('size', ((120, 120), (101, 101), (80, 130)))
+def test_circle_matches_loop(period, reverse, size):
+    configs = grating_configs('Circle', period, reverse, 0, 255)
+    expected = legacy_pattern_array(size[0], size[1], configs)
+    actual = make_grating().generate_pattern_array(size[0], size[1], configs)
+    np.testing.assert_array_equal(actual, expected)
+
+def entry_values(**changes):
+    values = {'g_type':'Circle', 'grating_name':None, 'file_path':None,
+        'g_angle':'', 'y_min':'0', 'y_max':'255', 'period':'37', 'reverse':0,
+        'ring_period':'', 'center':''}
+    values.update(changes)
+    return values
+
+def test_read_grating_configs_defaults():
+    configs = read_grating_configs(entry_values(center='(5,-3)'), {})
+    assert configs['g_angle'] == 0
+    assert configs['ring_period'] == 37
+    assert (configs['center_x'], configs['center_y']) == (5, -3)
+
+def test_read_grating_configs_custom():
+    configs = read_grating_configs(entry_values(g_type='Custom', 
+        grating_name='a.png', file_path='Images/a.png'), {})
+    assert (configs['max_display_x'], configs['max_display_y']) == (1920, 1152)
+    assert configs['file_path'] == 'Images/a.png'
+    assert 'g_angle' not in configs
+
+@pytest.mark.parametrize('changes', ({'ring_period':'0'}, 
+    {'ring_period':'-4'}, {'ring_period':'wide'}, {'period':'0'},
+    {'center':'(1,2,3)'}))
+def test_read_grating_configs_rejects(changes):
+    with pytest.raises(InputError):
+        read_grating_configs(entry_values(**changes), {})
+
+def test_custom_palette_grating_uses_gray_levels(tmp_path):
+    #Palette index i is the gray level 16*i, so indices and levels differ.
+    indices = np.tile(np.arange(16, dtype=np.uint8), (4, 1))
+    levels = indices * 16
+    palette_image = Image.fromarray(indices, 'P')
+    palette_image.putpalette([16*(i//3) for i in range(48)])
+    file_path = str(tmp_path / 'palette.png')
+    palette_image.save(file_path)
+    grating = make_grating()
+    grating.file_path = file_path
+    image, cacheable = grating.render_grating_image({'g_type':'Custom'})
+    assert cacheable
+    np.testing.assert_array_equal(np.asarray(image), levels)
+
+def canvas_grating(grating, configs):
+    """
+    Draw, rotate and crop the oversized canvas as create_grating_image did.
+    """
+
+    width = grating.profile.width
+    height = grating.profile.height
+    canvas = int(np.ceil(np.sqrt(width**2 + height**2)))
+    image = Image.fromarray(legacy_pattern_array(canvas, canvas, configs)
+        if configs['g_type'] != 'Circle' else
+            grating.generate_pattern_array(canvas, canvas, configs))
+    image = image.convert('L').rotate(configs['g_angle'])
+    return np.asarray(grating.center_crop(image, canvas, canvas, width, height))
+
+#A small SLM keeps the canvas quick to draw, odd sizes give an odd canvas.
+SMALL_PROFILES = ({'Width':'320', 'Height':'200'}, 
+    {'Width':'300', 'Height':'211'})
+
+@pytest.mark.parametrize('profile', SMALL_PROFILES)
+@pytest.mark.parametrize('g_type', ('SawTooth', 'Triangle', 'Circle'))
+@pytest.mark.parametrize('period', (5, 37, 64))
+@pytest.mark.parametrize('angle', (0, 90, 180, 270, 30, 45.5, -12.25, 123))
+def test_canvas_render_matches_canvas(profile, g_type, period, angle):
+    grating = make_grating(SLMProfile(profile))
+    configs = grating_configs(g_type, period, 0, 10, 240, ring_period=period+3,
+        center_x=7, center_y=-4)
+    configs['g_angle'] = angle
+    np.testing.assert_array_equal(grating.generate_canvas_array(configs),
+        canvas_grating(grating, configs))
+
+@pytest.mark.parametrize('g_type', ('SawTooth', 'Triangle'))
+@pytest.mark.parametrize('angle', (0, 30))
+def test_canvas_render_matches_canvas_full_size(g_type, angle):
+    grating = make_grating()
+    configs = grating_configs(g_type, 37, 1, 0, 255, g_render='Canvas')
+    configs['g_angle'] = angle
+    image, cacheable = grating.render_grating_image(configs)
+    assert cacheable
+    np.testing.assert_array_equal(np.asarray(image), 
+        canvas_grating(grating, configs))
+
+@pytest.mark.parametrize('profile', SMALL_PROFILES)
+@pytest.mark.parametrize('g_type, period', (('SawTooth', 5), ('SawTooth', 37),
+    ('Triangle', 64), ('Circle', 5), ('Circle', 37)))
+@pytest.mark.parametrize('angle', (0, 90, 180, 270, -90))
+def test_rotated_matches_canvas_on_quarter_turns(profile, g_type, period, 
+    angle):
+    #Quarter turns land on whole canvas pixels, so nothing is resampled.
+    grating = make_grating(SLMProfile(profile))
+    configs = grating_configs(g_type, period, 1, 10, 240, ring_period=period+3,
+        center_x=7, center_y=-4)
+    configs['g_angle'] = angle
+    np.testing.assert_array_equal(grating.generate_rotated_array(configs),
+        canvas_grating(grating, configs))
+
+@pytest.mark.parametrize('angle', (30, 45.5, -12.25, 123, .3))
+@pytest.mark.parametrize('reverse', (0, 1))
+def test_rotated_sawtooth_is_continuous(angle, reverse):
+    profile = SLMProfile(SMALL_PROFILES[1])
+    grating = make_grating(profile)
+    configs = grating_configs('SawTooth', 37, reverse, 10, 240, g_angle=angle)
+    actual = grating.generate_rotated_array(configs)
+    #Every pixel takes the pattern at its own rotated position, x cos - y sin.
+    canvas = int(np.ceil(np.hypot(profile.width, profile.height)))
+    theta = np.radians(angle)
+    x = np.arange(profile.width) + (canvas - profile.width) //2 + .5 - canvas / 2
+    y = np.arange(profile.height) + (canvas - profile.height) //2 + .5 - canvas / 2
+    column = (x[np.newaxis, :] * np.cos(theta) - y[:, np.newaxis] * np.sin(theta)
+        + canvas / 2 - .5)
+    slope = 230 / 37
+    expected = (slope * (column % 37) + 10 if reverse == 0 
+        else -slope * (column % 37) + 240)
+    #Levels truncate, so a rounding error may tip a value down one level.
+    assert np.abs(actual - expected.astype(int)).max() <= 1
+    assert np.mean(actual == expected.astype(int)) > .999
+
+@pytest.mark.parametrize('g_type', ('SawTooth', 'Triangle', 'Circle'))
+def test_rotated_stays_close_to_canvas(g_type):
+    grating = make_grating(SLMProfile(SMALL_PROFILES[0]))
+    configs = grating_configs(g_type, 64, 0, 0, 255, g_angle=30, center_x=7,
+        center_y=-4)
+    difference = np.abs(grating.generate_rotated_array(configs).astype(int)
+        - canvas_grating(grating, configs))
+    #Only nearest neighbour rounding differs, and pixels on a wrap edge.
+    assert np.mean(difference <= 4) > .95
+
+def test_rotated_fractional_angles_are_not_stepped():
+    #The canvas only has one level per column of a period, evaluation has a 
+    #level for every position in between.
+    grating = make_grating(SLMProfile(SMALL_PROFILES[0]))
+    configs = grating_configs('SawTooth', 16, 0, 0, 255, g_angle=30)
+    assert len(np.unique(canvas_grating(grating, configs))) <= 16
+    assert len(np.unique(grating.generate_rotated_array(configs))) > 200
@@ -0,0 +1,39 @@
+"""
+Prepare experiments headless, one bad file must not stop the rest.
+"""
+
+import csv
+
+import headless
+from headless import HeadlessExperiment
+
+def test_unexpected_error_is_recorded(monkeypatch):
+    def run(self):
+        raise ValueError('bad\npixel')
+    monkeypatch.setattr(HeadlessExperiment, 'run', run)
+    summary = headless.prepare_file({'File Experiment':'broken.txt'})
+    assert summary == {'File':'broken.txt', 'Error':'ValueError: bad pixel'}
+
+def test_batch_records_every_error(tmp_path):
+    files = [str(tmp_path / 'missing 1.txt'), str(tmp_path / 'missing 2.txt')]
+    summaries = headless.prepare_batch([{'File Experiment':file} 
+        for file in files], jobs=2, tasks_per_child=1)
+    assert [summary['File'] for summary in summaries] == files
+    assert all(summary['Error'] != '' for summary in summaries)
+    file_summary = str(tmp_path / 'summary.csv')
+    headless.write_summary(file_summary, summaries)
+    with open(file_summary, newline='') as file:
+        rows = list(csv.DictReader(file))
+    assert [row['Error'] for row in rows] == [summary['Error'] 
+        for summary in summaries]
+
+def test_jobs_default_to_one_per_core(monkeypatch):
+    calls = []
+    def prepare_batch(configs_list, jobs=None, tasks_per_child=4):
+        calls.append(jobs)
+        return [{'File':configs['File Experiment'], 'Error':'missing'} 
+            for configs in configs_list]
+    monkeypatch.setattr(headless, 'prepare_batch', prepare_batch)
+    assert headless.main(['a.txt', 'b.txt']) == 1
+    assert headless.main(['a.txt', '--jobs', '1']) == 1
+    assert calls == [None, 1]
@@ -0,0 +1,51 @@
+"""
+Check the recorded image transforms against applying each step in turn.
+"""
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from exceptions import InputError
+from imageprocessing import MyImage
+
+def make_image(tmp_path, array:np.ndarray):
+    file_image = str(tmp_path / 'image.png')
+    Image.fromarray(array).save(file_image)
+    return MyImage({'file_image':file_image})
+
+@pytest.mark.parametrize('seed', range(30))
+def test_transforms_match_steps(tmp_path, seed):
+    random = np.random.default_rng(seed)
+    height, width = random.integers(20, 120, size=2)
+    array = random.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    image = make_image(tmp_path, array)
+    new_xy = (int(random.integers(5, width + 1)), int(random.integers(5,
+        height + 1)))
+    x1, x2 = sorted(random.integers(0, new_xy[0] + 1, size=2).tolist())
+    y1, y2 = sorted(random.integers(0, new_xy[1] + 1, size=2).tolist())
+    cropping = '(%d,%d),(%d,%d)'%(x1, y1, x2, y2)
+    image.add_grayscale()
+    image.add_resize(new_xy)
+    image.add_crop(cropping)
+    #Downsize then crop, as modify_and_map did one step at a time.
+    expected = image.original_PIL.convert('L').resize(new_xy).crop((x1, y1,
+        x2, y2))
+    np.testing.assert_array_equal(np.asarray(image.apply_transforms()),
+        np.asarray(expected))
+    np.testing.assert_array_equal(image.array_view(), np.asarray(expected))
+
+def test_preview_fits_window(tmp_path):
+    array = np.arange(400*300, dtype=np.uint32).reshape(300, 400) % 256
+    image = make_image(tmp_path, array.astype(np.uint8))
+    image.add_grayscale()
+    image.add_resize((400, 300))
+    image.add_crop('(0,0),(400,100)')
+    preview = image.render_transforms(True)
+    assert preview.size == (200, 50)
+
+def test_upsize_is_rejected(tmp_path):
+    image = make_image(tmp_path, np.zeros((10, 10), dtype=np.uint8))
+    image.add_resize((20, 10))
+    with pytest.raises(InputError):
+        image.apply_transforms()
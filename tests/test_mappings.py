@@ -0,0 +1,210 @@
+"""
+Check compiled user strings against the per-level loop they replaced.
+"""
+
+import glob
+import os
+
+import numpy as np
+import pytest
+
+import experimentfile
+import mappings
+from exceptions import InputError
+from legacy_mappings import legacy_color_map
+from legacy_mappings import legacy_cycle_image
+from legacy_mappings import legacy_map_timing
+from legacy_mappings import legacy_process_user_string
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def experiment_strings():
+    """
+    Every exposure, ignore and laser string of the saved experiments.
+    """
+
+    strings = set()
+    for file_name in glob.glob(os.path.join(REPO, 'Experiments', '*.txt')):
+        datas = experimentfile.read_file(file_name)
+        for key, value in datas.items():
+            if key.startswith('Strings') and value.strip() != '':
+                strings.add(value.strip())
+    return sorted(strings)
+
+def assert_same(actual, expected):
+    assert len(actual) == len(expected)
+    #Exact equality, rounding ties must land where round() puts them.
+    assert actual.tolist() == [float(value) for value in expected]
+
+def test_experiment_strings_exist():
+    assert len(experiment_strings()) > 3
+
+@pytest.mark.parametrize('user_lines', experiment_strings())
+def test_experiment_strings_match_loop(user_lines):
+    configs = {'Gradient Range':256}
+    assert_same(mappings.process_user_string(user_lines, configs),
+        legacy_process_user_string(user_lines, configs))
+
+#Factors whose products land on, or one ulp beside, a hundredths tie.
+FACTORS = ('.005', '.015', '.025', '.125', '.0125', '1.005', '2.675', '.01',
+    '.02', '.333', '-.005', '0.5')
+
+@pytest.mark.parametrize('factor', FACTORS)
+def test_factor_ties_match_round(factor):
+    user_lines = '[0,256]:%sx'%(factor)
+    configs = {'Gradient Range':256}
+    assert_same(mappings.process_user_string(user_lines, configs),
+        legacy_process_user_string(user_lines, configs))
+
+@pytest.mark.parametrize('factor', FACTORS)
+def test_round_hundredths_matches_round(factor):
+    values = float(factor) * np.arange(65536, dtype=float)
+    expected = [round(value, 2) for value in values.tolist()]
+    assert mappings.round_hundredths(values).tolist() == expected
+
+def test_later_lines_override_earlier():
+    user_lines = '[0,100]:.01x\n[50,60]:3\n[55,200]:.02x\n[199,200]'
+    configs = {'Gradient Range':256}
+    assert_same(mappings.process_user_string(user_lines, configs),
+        legacy_process_user_string(user_lines, configs))
+
+def test_sixteen_bit_range_matches_loop():
+    user_lines = '[0,65536]:.001x\n[100,200]:5\n[60000,65536]:.005x'
+    configs = {'Gradient Range':65536}
+    actual = mappings.process_user_string(user_lines, configs)
+    assert actual.shape == (65536,)
+    assert_same(actual, legacy_process_user_string(user_lines, configs))
+
+def test_uncovered_levels_are_unmapped():
+    actual = mappings.process_user_string('[10,20]:4', {})
+    assert actual.shape == (256,)
+    assert (actual[:10] == mappings.UNMAPPED).all()
+    assert (actual[20:] == mappings.UNMAPPED).all()
+
+IGNORES = ('[250,251]', '[10,20]\n[250,251]', '[0,256]:1\n[5,6]:0',
+    '[0,1]', '[0,256]:2', '[100,101]:0\n[100,101]:1')
+
+@pytest.mark.parametrize('input_ignore', IGNORES)
+@pytest.mark.parametrize('input_exposure', ('[0,100]:10\n[100,101]:5',
+    '[0,100]:.01x\n[100,101]:5\n[101,256]:.02x', '[0,256]:6.72'))
+def test_ignore_overrides_match_loop(input_exposure, input_ignore):
+    configs = {'Input Exposure':input_exposure, 'Input Ignore':input_ignore,
+        'Gradient Range':256}
+    assert_same(mappings.map_timing(configs), legacy_map_timing(configs))
+
+def test_default_timing_exposes_every_level():
+    assert mappings.map_timing({}).tolist() == [1.0] * 256
+    assert mappings.map_laser_power({}).tolist() == [0.0] * 256
+
+def test_compiled_strings_are_reused():
+    user_lines = '[0,256]:.0123x\n[3,7]:9'
+    before = mappings.compile_mapping.cache_info().hits
+    first = mappings.compile_mapping(user_lines, 256)
+    second = mappings.compile_mapping(user_lines, 256)
+    assert second is first
+    assert mappings.compile_mapping.cache_info().hits == before + 1
+    #A different range is a different mapping.
+    assert mappings.compile_mapping(user_lines, 512) is not first
+    assert first.segments == [(0, 256, .0123, None), (3, 7, None, 9.0)]
+
+def test_cached_arrays_are_read_only():
+    configs = {'Input Exposure':'[0,256]:.0321x', 'Input Ignore':'[4,5]',
+        'Gradient Range':256}
+    timing = mappings.map_timing(configs)
+    assert mappings.map_timing(configs) is timing
+    with pytest.raises(ValueError):
+        timing[0] = 100
+    data = mappings.process_user_string('[0,256]:.0321x', configs)
+    with pytest.raises(ValueError):
+        data[0] = 100
+    #Zeroing the ignored level did not write through to the exposure string.
+    assert data[4] == .13 and timing[4] == 0
+    assert_same(mappings.map_timing(configs), legacy_map_timing(configs))
+
+#Where the loop failed or misbehaved, the compiled strings differ on purpose.
+
+def test_blank_lines_are_skipped():
+    configs = {'Gradient Range':256}
+    with pytest.raises(ValueError):
+        legacy_process_user_string('[0,10]:1\n\n[10,20]:2\n', configs)
+    assert_same(mappings.process_user_string('[0,10]:1\n\n [10,20]:2 \n',
+        configs), legacy_process_user_string('[0,10]:1\n[10,20]:2', configs))
+
+@pytest.mark.parametrize('user_lines', ('[0,257]:1', '[-5,10]:1',
+    '[250,300]:.01x'))
+def test_out_of_range_lines_raise(user_lines):
+    with pytest.raises(InputError):
+        mappings.process_user_string(user_lines, {'Gradient Range':256})
+
+def test_negative_start_no_longer_wraps():
+    #The loop wrote levels -5 to -1 as the top five levels.
+    legacy = legacy_process_user_string('[-5,0]:1', {'Gradient Range':256})
+    assert legacy[-5:] == [1.0] * 5
+    with pytest.raises(InputError):
+        mappings.process_user_string('[-5,0]:1', {'Gradient Range':256})
+
+@pytest.mark.parametrize('user_lines', ('0,10]:1', '[a,10]:1', '[0,10]:b',
+    '[0,10]:.0ax'))
+def test_malformed_lines_raise(user_lines):
+    with pytest.raises(InputError):
+        mappings.process_user_string(user_lines, {})
+
+def test_timing_errors_name_the_string():
+    configs = {'Input Exposure':'[0,300]:1', 'Input Ignore':''}
+    with pytest.raises(InputError) as info:
+        mappings.map_timing(configs)
+    assert 'exposure or ignore string' in info.value.message
+
+#Grating items of every pixel, by level or by tiling.
+
+def test_gratings_by_color_match_loop():
+    image = np.random.default_rng(3).integers(0, 256, (23, 31), dtype=np.uint8)
+    color_map = mappings.process_user_string('[0,100]:1\n[100,200]:2\n'
+        '[250,256]:3', {'Gradient Range':256})
+    actual = mappings.map_gratings(image, color_map, 'Color', 4)
+    #The loop indexed its map [column, row].
+    expected = legacy_color_map(image, color_map).T
+    assert actual.shape == image.shape
+    assert actual.tolist() == expected.tolist()
+
+def test_gratings_by_color_reject_missing_items():
+    image = np.array([[0, 10], [20, 30]], dtype=np.uint8)
+    color_map = mappings.process_user_string('[0,20]:1\n[20,31]:2', {})
+    assert mappings.map_gratings(image, color_map, 'Color', 3).tolist() == [
+        [1, 1], [2, 2]]
+    with pytest.raises(InputError):
+        mappings.map_gratings(image, color_map, 'Color', 2)
+
+def test_cycle_matches_loop():
+    image = np.zeros((7, 9), dtype=np.uint8)
+    actual = mappings.map_gratings(image, None, 'Cycle', 4)
+    for i in range(7):
+        for j in range(9):
+            assert actual[i, j] == legacy_cycle_image(j, i)
+
+def test_cycle_repeats_over_fewer_items():
+    image = np.zeros((4, 4), dtype=np.uint8)
+    actual = mappings.map_gratings(image, None, 'Cycle', 3)
+    assert actual.tolist() == [[legacy_cycle_image(j, i) % 3 for j in
+        range(4)] for i in range(4)]
+
+def test_checkerboard_alternates_neighbours():
+    actual = mappings.map_gratings(np.zeros((5, 6), dtype=np.uint8), None,
+        'Checkerboard', 2)
+    assert actual.tolist() == [[(i + j) % 2 for j in range(6)] for i in range(5)]
+    assert (actual[:, 1:] != actual[:, :-1]).all()
+    assert (actual[1:] != actual[:-1]).all()
+
+def test_stripes_follow_columns():
+    actual = mappings.map_gratings(np.zeros((3, 8), dtype=np.uint8), None,
+        'Stripes', 3)
+    assert actual.tolist() == [[j % 3 for j in range(8)]] * 3
+
+def test_single_item_tilings_choose_it_everywhere():
+    image = np.zeros((4, 5), dtype=np.uint8)
+    for tiling in ('Checkerboard', 'Stripes', 'Cycle'):
+        assert (mappings.map_gratings(image, None, tiling, 1) == 0).all()
+
+def test_unknown_tiling_raises():
+    with pytest.raises(InputError):
+        mappings.map_gratings(np.zeros((2, 2), dtype=np.uint8), None, 'Spiral')
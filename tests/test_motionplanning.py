@@ -0,0 +1,240 @@
+"""
+Check the motion model's estimates of exposure plans.
+"""
+
+import time
+
+import numpy as np
+import pytest
+
+from exceptions import InputError
+from motionplanning import ACKNOWLEDGE_TIME
+from motionplanning import MotionModel
+from motionplanning import ExposurePlan
+from motionplanning import PathCost
+from motionplanning import SCAN_STRATEGIES
+from motionplanning import nearest_neighbour
+from motionplanning import order_path_optimized
+from motionplanning import order_raster
+from motionplanning import order_serpentine
+from motionplanning import order_skip_empty
+from motionplanning import two_opt
+
+def make_model(**configs):
+    defaults = {'Velocity':'1', 'Acceleration':'4', 'Decceleration':'4',
+        'Command Pause':'.1', 'Power Change Pause':'.3'}
+    return MotionModel({**defaults, **configs})
+
+def test_power_change_overlaps_move():
+    #Two exposures 5 mm apart at different powers, the change hides in the move.
+    image = np.array([[200, 0, 0, 0, 0, 250]], dtype=np.uint8)
+    timing = np.where(np.arange(256) > 100, .2, 0.)
+    power = np.where(np.arange(256) > 220, 5., 3.)
+    plan = ExposurePlan.compile(image, timing, power, 1e-3, 1e-3)
+    estimate = plan.estimate(make_model())
+    assert len(plan) == 2
+    assert estimate['Laser'] == 0
+    assert np.isclose(estimate['Exposure'], .4)
+    assert np.isclose(estimate['Total'], estimate['Exposure'] 
+        + estimate['Shutter'] + estimate['Travel'])
+
+def test_power_change_without_move_is_counted():
+    #Neighbouring pixels 1 um apart, the move is too short to hide the change.
+    image = np.array([[200, 250]], dtype=np.uint8)
+    timing = np.where(np.arange(256) > 100, .2, 0.)
+    power = np.where(np.arange(256) > 220, 5., 3.)
+    model = make_model()
+    plan = ExposurePlan.compile(image, timing, power, 1e-6, 1e-6)
+    estimate = plan.estimate(model)
+    second_move = model.step_time(np.array([1e-3]), np.array([0.]),
+        np.array([True]), np.array([False]))[0]
+    assert np.isclose(estimate['Laser'], model.power_time() - second_move)
+
+def sparse_plan(seed:int=1, shape:tuple=(20, 30), fill:float=.3, 
+    delta:float=1e-4):
+    """
+    Random exposures at four laser powers.
+    """
+
+    rng = np.random.default_rng(seed)
+    image = ((rng.random(shape) < fill) * rng.integers(100, 255, shape))
+    image = image.astype(np.uint8)
+    timing = np.where(np.arange(256) > 50, .2, 0.)
+    power = np.round(np.arange(256) / 64)
+    return ExposurePlan.compile(image, timing, power, delta, delta)
+
+def test_path_cost_matches_estimate():
+    plan = sparse_plan()
+    model = make_model()
+    cost = PathCost(model, plan.delta_x, plan.delta_y, (30, 20))
+    for name in ('Raster', 'Serpentine', 'Power Grouped'):
+        order = SCAN_STRATEGIES[name](plan.steps, cost)
+        estimate = ExposurePlan(plan.steps[order], plan.delta_x, 
+            plan.delta_y).estimate(model)
+        #The estimate also asks the unmoved axis about the very first step.
+        assert cost.tour(plan.steps, order) == pytest.approx(
+            estimate['Travel'] + estimate['Laser'], abs=ACKNOWLEDGE_TIME + 1e-9)
+
+def is_permutation(order, count:int):
+    return np.array_equal(np.sort(np.asarray(order)), np.arange(count))
+
+def tour_cost(plan, strategy:str, model=None, budget:float=10):
+    model = make_model() if model is None else model
+    ordered = plan.ordered(strategy, model, budget)
+    size = (int(plan.steps['x'].max()) + 1, int(plan.steps['y'].max()) + 1)
+    cost = PathCost(model, plan.delta_x, plan.delta_y, size)
+    return cost.tour(ordered.steps, np.arange(len(ordered)))
+
+@pytest.mark.parametrize('strategy', ('Raster', 'Serpentine', 'Skip Empty'))
+@pytest.mark.parametrize('seed', (1, 2, 3))
+def test_spatial_orders_are_permutations(strategy, seed):
+    plan = sparse_plan(seed)
+    order = SCAN_STRATEGIES[strategy](plan.steps)
+    assert is_permutation(order, len(plan))
+    #Every row is finished before the next one starts.
+    assert np.all(np.diff(plan.steps['y'][order]) >= 0)
+
+def test_serpentine_alternates_rows():
+    plan = sparse_plan(fill=.5)
+    ordered = plan.ordered('Serpentine')
+    rows = np.unique(ordered.steps['y'])
+    for rank, row in enumerate(rows.tolist()):
+        columns = ordered.steps['x'][ordered.steps['y'] == row]
+        assert np.all(np.diff(columns) > 0 if rank % 2 == 0 
+            else np.diff(columns) < 0)
+
+def test_skip_empty_enters_rows_from_the_nearer_end():
+    #Exposures at the right of row 0 and the left of row 2, row 1 is empty.
+    image = np.zeros((3, 10), dtype=np.uint8)
+    image[0, 6:9] = image[2, 1:4] = 200
+    plan = ExposurePlan.compile(image, np.where(np.arange(256) > 100, .2, 0.),
+        np.ones(256), 1e-3, 1e-3)
+    ordered = plan.ordered('Skip Empty')
+    assert ordered.steps['x'].tolist() == [6, 7, 8, 3, 2, 1]
+    assert ordered.travel() == pytest.approx((8 + 7, 2))
+
+@pytest.mark.parametrize('seed', (1, 2, 3))
+def test_spatial_orders_save_travel(seed):
+    plan = sparse_plan(seed, (30, 60), .05)
+    raster = tour_cost(plan, 'Raster')
+    serpentine = tour_cost(plan, 'Serpentine')
+    skip_empty = tour_cost(plan, 'Skip Empty')
+    assert serpentine < raster
+    assert skip_empty < raster
+    assert sum(plan.ordered('Skip Empty').travel()) < sum(
+        plan.ordered('Raster').travel())
+
+def path_cost(plan, model=None, budget:float=10):
+    model = make_model() if model is None else model
+    size = (int(plan.steps['x'].max()) + 1, int(plan.steps['y'].max()) + 1)
+    return PathCost(model, plan.delta_x, plan.delta_y, size, budget)
+
+@pytest.mark.parametrize('seed', (1, 2, 3))
+def test_path_optimized_is_a_shorter_permutation(seed):
+    plan = sparse_plan(seed, (40, 60), .03)
+    cost = path_cost(plan, budget=2)
+    order = order_path_optimized(plan.steps, cost)
+    assert is_permutation(order, len(plan))
+    assert cost.tour(plan.steps, order) < cost.tour(plan.steps, 
+        order_skip_empty(plan.steps))
+
+@pytest.mark.parametrize('seed', (1, 2, 3))
+def test_two_opt_never_adds_cost(seed):
+    plan = sparse_plan(seed, (30, 30), .1)
+    cost = path_cost(plan)
+    rng = np.random.default_rng(seed)
+    for start in (rng.permutation(len(plan)), order_raster(plan.steps),
+        nearest_neighbour(plan.steps, cost, time.perf_counter() + 10)):
+        improved = two_opt(plan.steps, start, cost, time.perf_counter() + 10)
+        assert is_permutation(improved, len(plan))
+        assert (cost.tour(plan.steps, improved) 
+            <= cost.tour(plan.steps, start) + 1e-9)
+
+def test_path_optimized_stays_within_budget():
+    #About 100k exposures, far more than the budget allows to optimize fully.
+    plan = sparse_plan(4, (400, 500), .5)
+    cost = path_cost(plan, budget=.5)
+    start = time.perf_counter()
+    order = order_path_optimized(plan.steps, cost)
+    elapsed = time.perf_counter() - start
+    assert is_permutation(order, len(plan))
+    #Checks of the deadline are a few hundred points apart.
+    assert elapsed < cost.budget + .5
+
+def test_path_optimized_without_budget_falls_back_to_serpentine():
+    plan = sparse_plan(5)
+    cost = path_cost(plan, budget=0)
+    order = order_path_optimized(plan.steps, cost)
+    np.testing.assert_array_equal(order, order_serpentine(plan.steps))
+
+@pytest.mark.parametrize('strategy', ('Power Grouped', 'Power Grouped Raster'))
+def test_power_grouped_passes(strategy):
+    plan = sparse_plan(6, fill=.5)
+    order = SCAN_STRATEGIES[strategy](plan.steps)
+    assert is_permutation(order, len(plan))
+    powers = plan.steps['power'][order]
+    #One pass per power, lowest first, so the laser changes least.
+    assert np.all(np.diff(powers) >= 0)
+    assert np.count_nonzero(np.diff(powers)) == len(np.unique(powers)) - 1
+    for power in np.unique(powers).tolist():
+        members = plan.steps[order][powers == power]
+        expected = (order_serpentine if strategy == 'Power Grouped' 
+            else order_raster)(members)
+        np.testing.assert_array_equal(np.arange(len(members)), expected)
+
+def test_auto_groups_by_power_when_pauses_dominate():
+    plan = sparse_plan(7, fill=.5)
+    slow_laser = make_model(**{'Power Change Pause':'30'})
+    ordered = plan.ordered('Auto', slow_laser)
+    assert ordered.strategy in ('Power Grouped', 'Power Grouped Raster')
+    assert tour_cost(plan, ordered.strategy, slow_laser) < tour_cost(plan, 
+        'Skip Empty', slow_laser)
+    #Without a laser pause, travel decides and a spatial order wins.
+    no_pause = make_model(**{'Power Change Pause':'0', 
+        'Laser Command Pause':'0'})
+    assert plan.ordered('Auto', no_pause).strategy in ('Raster', 'Serpentine',
+        'Skip Empty')
+
+def test_compile_items_takes_each_pixel_from_its_item():
+    rng = np.random.default_rng(8)
+    images = [rng.integers(0, 256, (9, 11), dtype=np.uint8) for _ in range(3)]
+    maps_timing = [np.full(256, 1.0), np.linspace(0, 2, 256), np.full(256, .5)]
+    maps_laser_power = [np.full(256, 10.0), np.full(256, 20.0), 
+        np.arange(256, dtype=float)]
+    #Level 7 is never exposed by the first item.
+    maps_timing[0][7] = 0
+    item_array = rng.integers(0, 3, (9, 11))
+    plan = ExposurePlan.compile_items(images, maps_timing, maps_laser_power, 
+        .1, .1, item_array)
+    expected = []
+    for y in range(9):
+        for x in range(11):
+            item = item_array[y, x]
+            level = images[item][y, x]
+            if maps_timing[item][level] >= .05:
+                expected.append((x, y, level, maps_laser_power[item][level], 
+                    maps_timing[item][level], item))
+    assert [(int(s['x']), int(s['y']), int(s['pixel']), float(s['power']), 
+        float(s['duration']), int(s['item'])) for s in plan.steps] == expected
+
+def test_compile_items_with_one_item_matches_compile():
+    image = np.random.default_rng(9).integers(0, 256, (20, 30), dtype=np.uint8)
+    timing = np.linspace(0, 1, 256)
+    power = np.linspace(5, 50, 256)
+    single = ExposurePlan.compile(image, timing, power, .1, .1, 
+        np.zeros((20, 30), dtype=np.intp))
+    items = ExposurePlan.compile_items([image], [timing], [power], .1, .1, 
+        np.zeros((20, 30), dtype=np.intp))
+    assert len(items) == len(single) > 0
+    np.testing.assert_array_equal(items.steps, single.steps)
+
+def test_compile_items_rejects_mismatched_items():
+    image = np.zeros((4, 5), dtype=np.uint8)
+    item_array = np.zeros((4, 5), dtype=np.intp)
+    with pytest.raises(InputError):
+        ExposurePlan.compile_items([image, np.zeros((5, 4), dtype=np.uint8)],
+            [np.ones(256)] * 2, [np.zeros(256)] * 2, .1, .1, item_array)
+    with pytest.raises(InputError):
+        ExposurePlan.compile_items([image, image.astype(np.uint16)],
+            [np.ones(256), np.ones(65536)], [np.zeros(256), np.zeros(65536)],
+            .1, .1, item_array)
@@ -0,0 +1,160 @@
+"""
+Drive the equipment classes against the serial simulator.
+"""
+
+import numpy as np
+import pytest
+
+from exceptions import InputError
+from exceptions import MotorError
+from motionplanning import ExposurePlan
+from motionplanning import MotionModel
+from serialcontrol import Motor
+from serialcontrol import Shutter
+from serialsimulator import SIMULATED_PORT
+from serialsimulator import VirtualClock
+from singleimage import SingleImage
+
+MOTOR_CONFIGS = {'Port':SIMULATED_PORT, 'Axes':(1, 2), 'Velocity':'1',
+    'Acceleration':'4', 'Decceleration':'4', 'Command Pause':'.1'}
+
+def make_motor(**configs):
+    return Motor({**MOTOR_CONFIGS, 'Clock':VirtualClock(), **configs})
+
+def test_motion_done_polls_without_pause():
+    motor = make_motor()
+    motor.move_home_all((1, 2))
+    start = motor.clock.now()
+    motor.move_absolute(1, 5.0)
+    elapsed = motor.clock.now() - start
+    model = MotionModel(MOTOR_CONFIGS)
+    move = float(model.move_time(5.0))
+    #Done is seen within a poll and a round trip, not a command pause.
+    assert move <= elapsed < move + motor.poll_period + .02
+    assert elapsed == pytest.approx(float(model.wait_time(move)), abs=.03)
+
+def test_home_waits_for_motion_done():
+    motor = make_motor()
+    motor.move_absolute(1, 2.0)
+    start = motor.clock.now()
+    motor.move_home_all((1, 2))
+    device = motor.ser.device
+    assert motor.positions == {1:0, 2:0}
+    assert all(motor.clock.now() >= axis.end for axis in device.axes.values())
+    #Neither move had a prediction, so neither counts toward the corrections.
+    assert motor.motion_stats == {}
+    assert motor.clock.now() - start > device.HOME_SEARCH
+
+def test_batch_moves_write_one_line():
+    motor = make_motor()
+    motor.move_home_all((1, 2))
+    handles = motor.move_absolute_batch({1:1.5, 2:3.0})
+    assert motor.ser.written[-1] == '1PA1.5;2PA3.0'
+    assert [handle.axis for handle in handles] == [1, 2]
+    assert not any(handle.is_done() for handle in handles)
+    for handle in handles:
+        handle.wait()
+    assert all(handle.is_done() for handle in handles)
+    assert motor.query('1TP?').strip() == '1.500000'
+    assert motor.query('2TP?').strip() == '3.000000'
+
+def test_async_moves_overlap():
+    motor = make_motor()
+    motor.move_home_all((1, 2))
+    model = MotionModel(MOTOR_CONFIGS)
+    start = motor.clock.now()
+    handles = motor.move_xy_async(2.0, 4.0)
+    for handle in handles:
+        handle.wait()
+    elapsed = motor.clock.now() - start
+    #Both axes travel at once, the longer move sets the time.
+    assert elapsed < float(model.move_time(2.0) + model.move_time(4.0))
+    assert elapsed == pytest.approx(float(model.step_time(2.0, 4.0)), abs=.05)
+    handles = motor.move_xy_async(None, 1.0)
+    assert [handle.axis for handle in handles] == [2]
+    assert motor.ser.written[-1] == '2PA1.0'
+    handles[0].wait()
+    assert motor.positions == {1:2.0, 2:1.0}
+
+def test_group_moves_follow_the_line():
+    motor = make_motor(Interpolation='Group')
+    assert ['1HN1,2', '1HO'] == [command for command in 
+        ';'.join(motor.ser.written).split(';') if command in ('1HN1,2', '1HO')]
+    motor.move_home_all((1, 2))
+    start = motor.clock.now()
+    handles = motor.move_xy_async(3.0, 4.0)
+    assert motor.ser.written[-1] == '1HL3.0,4.0'
+    device = motor.ser.device
+    assert device.axes[1].end == device.axes[2].end
+    model = MotionModel(MOTOR_CONFIGS)
+    assert device.axes[1].end - device.axes[1].start == pytest.approx(
+        float(model.move_time(5.0)))
+    for handle in handles:
+        handle.wait()
+    assert motor.clock.now() - start >= float(model.move_time(5.0))
+    assert motor.positions == {1:3.0, 2:4.0}
+
+def test_echo_transport_rejected_for_motor():
+    with pytest.raises(InputError):
+        make_motor(Transport='Echo')
+    shutter = Shutter({'Port':SIMULATED_PORT, 'Transport':'Echo', 
+        'Clock':VirtualClock()})
+    shutter.toggle(1.0)
+    exposures = shutter.ser.device.exposures
+    assert len(exposures) == 1
+    assert exposures[0][1] - exposures[0][0] >= 1.0
+
+def test_equipment_clocks_are_independent():
+    first = make_motor()
+    first.move_home_all((1, 2))
+    first.move_absolute(1, 5.0)
+    second = Motor({**MOTOR_CONFIGS})
+    assert second.clock is not first.clock
+    assert second.clock.now() < first.clock.now()
+    assert second.ser.device.clock is second.clock
+
+def test_query_transport_raises_controller_error():
+    motor = make_motor(Transport='Query')
+    with pytest.raises(MotorError):
+        motor.write_command('1XX')
+    motor.move_absolute(2, 1.0)
+    with pytest.raises(MotorError):
+        motor.write_command('9PA1')
+
+class QuietSingleImage(SingleImage):
+    """
+    Runner without a window, for driving movement against the simulator.
+    """
+
+    def check_pause_abort(self):
+        pass
+
+    def update_progress(self, pix, time, powr, i, j):
+        pass
+
+def test_movement_follows_plan():
+    runner = QuietSingleImage.__new__(QuietSingleImage)
+    runner.equipment_configs_motor = {**MOTOR_CONFIGS}
+    del runner.equipment_configs_motor['Axes']
+    runner.equipment_configs_shutter = {'Port':SIMULATED_PORT, 
+        'Command Pause':'.1'}
+    runner.equipment_configs_laser = {'Port':SIMULATED_PORT, 
+        'Command Pause':'.1', 'Max Power':'5', 'Power Change Pause':'.5'}
+    runner.delta_x = runner.delta_y = .001
+    image = np.array([[0, 1, 2], [2, 0, 1], [1, 1, 0]])
+    runner.plan = ExposurePlan.compile(image, [0, .5, 1.5], [1, 1, 2], 
+        runner.delta_x, runner.delta_y)
+    runner.initialize_equipment()
+    assert runner.shutter.clock is runner.motor.clock is runner.laser.clock
+    start = runner.motor.clock.now()
+    runner.movement()
+    elapsed = runner.motor.clock.now() - start
+    exposures = runner.shutter.ser.device.exposures
+    durations = [end - begin for begin, end in exposures]
+    assert durations == pytest.approx(
+        list(runner.plan.steps['duration'] + .1), abs=.01)
+    assert [power for _, power in runner.laser.ser.device.powers] == [2.0, 1.0]
+    model = MotionModel({**runner.equipment_configs_motor, 
+        'Power Change Pause':'.5'})
+    assert elapsed == pytest.approx(runner.plan.estimate(model)['Total'], 
+        rel=.02)
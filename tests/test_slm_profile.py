@@ -0,0 +1,55 @@
+"""
+Describe the SLM: resolution, bit depth, display encoding and phase LUT.
+"""
+
+import numpy as np
+import pytest
+
+from exceptions import InputError
+from slm_profile import SLMProfile
+
+@pytest.mark.parametrize('encoding, expected', (('Gray', 'Gray'), 
+    ('Packed', 'Packed'), (' Packed ', 'Packed'), ('', 'Gray')))
+def test_display_encodings(encoding, expected):
+    profile = SLMProfile({'Bit Depth':'10', 'Display Encoding':encoding})
+    assert profile.display_encoding == expected
+
+@pytest.mark.parametrize('encoding', ('packed', 'Pakced', 'RGB'))
+def test_unknown_display_encoding_is_rejected(encoding):
+    with pytest.raises(InputError):
+        SLMProfile({'Bit Depth':'10', 'Display Encoding':encoding})
+
+def test_packed_display_keeps_every_bit():
+    profile = SLMProfile({'Bit Depth':'10', 'Display Encoding':'Packed'})
+    frame = np.array([[0, 255, 256, 1023]], dtype=np.uint16)
+    packed = np.asarray(profile.display_image(frame)).astype(int)
+    np.testing.assert_array_equal(packed[..., 0] * 256 + packed[..., 1], frame)
+    gray = SLMProfile({'Bit Depth':'10'}).display_image(frame)
+    np.testing.assert_array_equal(np.asarray(gray), [[0, 63, 64, 255]])
+
+def profile_with_lut(tmp_path, bit_depth:int, lut:np.ndarray, name='lut'):
+    file_name = str(tmp_path / (name + '.npy'))
+    np.save(file_name, lut)
+    return SLMProfile({'Width':'40', 'Height':'30', 'Bit Depth':str(bit_depth),
+        'LUT File':file_name})
+
+def test_short_lut_spans_every_level(tmp_path):
+    #256 entries on a 10 bit SLM, one entry for every 4 levels.
+    profile = profile_with_lut(tmp_path, 10, np.arange(256) * 4)
+    frame = np.array([[0, 255, 256, 512, 1023]], dtype=np.uint16)
+    np.testing.assert_array_equal(profile.apply_lut(frame), 
+        [[0, 252, 256, 512, 1020]])
+
+def test_long_lut_spans_every_level(tmp_path):
+    #1024 entries on an 8 bit SLM, every 4th entry is used.
+    profile = profile_with_lut(tmp_path, 8, np.arange(1024) // 4)
+    frame = np.array([[0, 1, 128, 255]], dtype=np.uint8)
+    np.testing.assert_array_equal(profile.apply_lut(frame), [[0, 1, 128, 255]])
+    assert profile.apply_lut(frame).dtype == np.uint8
+
+def test_matching_lut_is_one_lookup(tmp_path):
+    lut = 255 - np.arange(256)
+    profile = profile_with_lut(tmp_path, 8, lut)
+    frame = np.arange(256, dtype=np.uint8).reshape(16, 16)
+    np.testing.assert_array_equal(profile.apply_lut(frame), 255 - frame)
+    assert SLMProfile().apply_lut(frame) is frame
@@ -0,0 +1,108 @@
+"""
+Check the SLM frames are rendered once and switched only on change.
+"""
+
+import importlib
+import importlib.util
+import sys
+import types
+
+import pytest
+from PIL import Image
+
+class StubGrating:
+    """
+    Grating with only the images the frame manager reads.
+    """
+
+    def __init__(self, level:int, mode:str='L'):
+        self.grating_image = Image.new(mode, (4, 3), level)
+
+    def display_image(self):
+        return self.grating_image
+
+class StubSLM:
+    """
+    SLM window recording the frames it was sent.
+    """
+
+    def __init__(self):
+        self.shown = []
+        self.window_slm = self
+        self.repaints = 0
+
+    def display(self, frame):
+        self.shown.append(frame)
+
+    def update_idletasks(self):
+        self.repaints += 1
+
+@pytest.fixture
+def slm_window(monkeypatch):
+    """
+    The slm_window module, frames kept as PIL images so no Tk root is needed.
+    """
+
+    #Only SLM_window itself looks for monitors, the manager never does.
+    if importlib.util.find_spec('screeninfo') is None:
+        monkeypatch.setitem(sys.modules, 'screeninfo',
+            types.SimpleNamespace(get_monitors=list))
+    module = importlib.import_module('slm_window')
+    monkeypatch.setattr(module.ImageTk, 'PhotoImage', lambda image: image)
+    return module
+
+def test_identical_gratings_share_a_frame(slm_window):
+    gratings = [StubGrating(10), StubGrating(20), StubGrating(10),
+        StubGrating(20), StubGrating(30)]
+    frames = slm_window.SLMFrameManager(gratings)
+    assert len(frames.frames) == 3
+    assert frames.item_frames == [0, 1, 0, 1, 2]
+
+def test_same_pixels_in_another_mode_are_another_frame(slm_window):
+    #Level 10 in L and in P are the same bytes, shown differently.
+    gratings = [StubGrating(10, 'L'), StubGrating(10, 'P')]
+    assert gratings[0].grating_image.tobytes() == \
+        gratings[1].grating_image.tobytes()
+    frames = slm_window.SLMFrameManager(gratings)
+    assert len(frames.frames) == 2
+
+def test_frames_switch_only_on_change(slm_window):
+    frames = slm_window.SLMFrameManager([StubGrating(10), StubGrating(20),
+        StubGrating(10)])
+    slm = StubSLM()
+    frames.attach(slm)
+    shown = [frames.show(item) for item in (0, 0, 2, 1, 1, 0, 2)]
+    assert shown == [True, False, False, True, False, True, False]
+    assert slm.shown == [frames.frames[0], frames.frames[1], frames.frames[0]]
+    assert slm.repaints == 3
+    assert frames.switches == 3
+    assert frames.requests == 7
+
+def test_report_counts_the_run(slm_window):
+    frames = slm_window.SLMFrameManager([StubGrating(10), StubGrating(20)],
+        StubSLM())
+    assert frames.report().startswith('SLM frames: 2, switches: 0 of 0 '
+        'exposures, latency mean 0.00 ms')
+    for item in (0, 1, 1, 1):
+        frames.show(item)
+    report = frames.report()
+    assert report.startswith('SLM frames: 2, switches: 2 of 4 exposures')
+    assert frames.max_latency >= frames.total_latency / 2 >= 0
+
+def test_attach_starts_counting_again(slm_window):
+    frames = slm_window.SLMFrameManager([StubGrating(10), StubGrating(20)],
+        StubSLM())
+    frames.show(0)
+    frames.show(1)
+    slm = StubSLM()
+    frames.attach(slm)
+    assert (frames.switches, frames.requests, frames.current) == (0, 0, None)
+    assert frames.total_latency == frames.max_latency == 0.0
+    #A new window shows nothing yet, so the first item is sent again.
+    assert frames.show(1) is True
+    assert slm.shown == [frames.frames[1]]
+
+def test_no_gratings_no_frames(slm_window):
+    frames = slm_window.SLMFrameManager([])
+    assert frames.frames == [] and frames.item_frames == []
+    assert frames.report().startswith('SLM frames: 0, switches: 0 of 0')
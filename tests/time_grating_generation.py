@@ -0,0 +1,52 @@
+"""
+Time grating generation against the per-column loop it replaced.
+
+Run from the repository root: python tests/time_grating_generation.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from legacy_gratings import legacy_pattern_array
+from test_grating_processing import make_grating
+from test_grating_processing import grating_configs
+
+def best_time(function, repeats:int=3):
+    """
+    Fastest of several runs.
+    Returns:
+        seconds : float : best wall time
+    """
+
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    #The canvas the gratings are drawn on for a 1920x1152 SLM.
+    size = 2260
+    grating = make_grating()
+    print('%-10s %7s %10s %10s %8s'%('Type', 'Period', 'Loop ms', 'Numpy ms',
+        'Speedup'))
+    for g_type, period in (('SawTooth', 37), ('SawTooth', 100), 
+        ('Triangle', 37), ('Triangle', 100)):
+        configs = grating_configs(g_type, period, 0, 0, 255)
+        loop = best_time(lambda: legacy_pattern_array(size, size, configs))
+        vector = best_time(lambda: grating.generate_pattern_array(size, size,
+            configs))
+        assert np.array_equal(legacy_pattern_array(size, size, configs),
+            grating.generate_pattern_array(size, size, configs))
+        print('%-10s %7d %10.1f %10.1f %7.1fx'%(g_type, period, loop*1000,
+            vector*1000, loop/vector))
+
+if __name__ == '__main__':
+    main()